@@ -1,10 +1,25 @@
+import copy
 import time
+import threading
 import warnings
-import orjson
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from pathlib import Path
-from collections import Counter
+from aggregates import ReadingTrace, RunningMode
+from sample_writer import SampleWriter, read_records, write_json_file, write_json_array
+import ad_catalog
+import campaign_store
+import manifest
+import metrics
+import preflight
+from network_capture import NetworkCapture, enable_logging
+import browser_profile
+from browser_profile import dense_options
+from driver_pool import DriverPool
+import network_profiles
+import url_sources
+from waits import wait_for, wait_for_element
+from campaign_store import VideoRecorder
 
 # code to for emulating YouTube mobile on broswer (google chrome)
 # this gives us access to the https://m.youtube.com/
@@ -13,14 +28,81 @@ mobile_emulation = {
     "userAgent": "Mozilla/5.0 (Linux; Android 4.2.1; en-us; Nexus 5 Build/JOP40D) AppleWebKit/535.19 (KHTML, like Gecko) Chrome/18.0.1025.166 Mobile Safari/535.19",
 }
 
-# constant variables for network throttling
+# constant variables for network throttling, used by sessions created without a
+# profile of network_profiles.py
 latencyInMilliseconds = 5
 downloadLimitMbps = 9
 uploadLimitMbps = 9
 
-# this constant stores the time the script will be sleeping when
-# a call to time.sleep is made - usage is later in the script
-TIME_TO_SLEEP = float(2 / downloadLimitMbps)
+# timeouts (in seconds) of the waits on the page. the waits return as soon as their
+# condition holds, these only bound how long a slow page is given
+PAGE_READY_TIMEOUT = 20
+ELEMENT_TIMEOUT = 5
+PLAYBACK_START_TIMEOUT = 10
+VIDEO_TIME_TIMEOUT = 2
+# number of times the stats for nerds menu is gone through if it fails
+STATS_RETRIES = 2
+
+# constant variables for the in-page sampler. when it is used, buffer and resolution
+# samples are taken inside the page (at the rate of the sampling policy below) and kept
+# in a ring buffer of SAMPLER_CAPACITY entries, which python drains every DRAIN_INTERVAL
+# seconds (AD_DRAIN_INTERVAL while an ad is playing or around a transition) instead of
+# busy-polling
+USE_PAGE_SAMPLER = True
+SAMPLE_INTERVAL_MS = 250
+SAMPLER_CAPACITY = 4096
+DRAIN_INTERVAL = 2
+AD_DRAIN_INTERVAL = 0.5
+
+# the sampling policy (see SamplingPolicy): the player is sampled every SAMPLE_INTERVAL_MS
+# milliseconds for DENSE_WINDOW_MS after an ad starts or ends, the resolution changes or
+# playback stalls, and every STEADY_INTERVAL_MS milliseconds the rest of the time. with
+# ADAPTIVE_SAMPLING off it is sampled every SAMPLE_INTERVAL_MS milliseconds throughout
+ADAPTIVE_SAMPLING = True
+STEADY_INTERVAL_MS = 1000
+DENSE_WINDOW_MS = 3000
+
+# the accelerated mode, for studies that only measure ads. between ads the main video is
+# seeked to SEEK_LEAD seconds before its next mid-roll cue point (and to SEEK_LEAD seconds
+# before its end after the last one), or played PLAYBACK_RATE times faster when the page
+# does not list its cue points. ads always play at normal speed. the videos collected this
+# way are marked as accelerated, since their main video traces are not those of a viewer
+ACCELERATED_PLAYBACK = False
+PLAYBACK_RATE = 16
+SEEK_LEAD = 5
+
+# output formats of the buffer traces. the json files (buffer_details.txt and
+# AdvertBufferState.txt) and/or the columnar numpy files written by columnar.py,
+# which need numpy to be installed
+WRITE_JSON_TRACES = True
+WRITE_COLUMNAR_TRACES = False
+
+# when on, every media segment the player downloads (its itag, byte range, size and
+# timing) is recorded from the DevTools network events of the session, see network_capture.py.
+# reading the events is a WebDriver call of its own, made every CAPTURE_DRAIN_INTERVAL
+# seconds (and once the video ends) rather than on every tick
+CAPTURE_NETWORK = False
+CAPTURE_DRAIN_INTERVAL = 10
+
+# file the metrics of a campaign (see metrics.py) are written to after every video,
+# in the prometheus text format
+METRICS_FILE = "metrics.prom"
+
+# path of the sqlite database every video of a campaign is recorded into (see campaign_store.py)
+CAMPAIGN_STORE = "campaign.sqlite3"
+
+# path of the sqlite database every ad impression of every campaign is added to once its
+# video is over (see ad_catalog.py), None to keep no catalog
+AD_CATALOG = None
+
+# where the urls of a campaign come from (see url_sources.py): a file with one url, video
+# id or json object per line, or a directory that is watched for new such files while
+# the campaign runs. None collects the list_of_urls of driver_code instead
+URL_SOURCE = None
+# urls are taken from a source and pre-flighted into the manifest this many at a time
+FEED_BATCH = 500
+# seconds a worker with nothing to collect waits for a source to feed it more urls
+IDLE_POLL_INTERVAL = 5
 
 # to ignore any browser-specific Deprecation Warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -30,19 +112,14 @@ chrome_options.add_experimental_option("mobileEmulation", mobile_emulation)
 # chrome instances for all main video URLs were spawned without
 # the headless option being True
 chrome_options.headless = False
-# this list stores errors (of several types) reported by the script
-error_list = []
-# this toggles the auto-play button off
-auto_play_toggle = False
-
-
-def most_frequent(List):
-    '''
-    This function takes a list and returns count of the most occuring
-    element
-    '''
-    occurence_count = Counter(List)
-    return occurence_count.most_common(1)[0][0]
+# when on, the sessions are launched headless with the trimmed down options of
+# browser_profile.py so that more of them fit on a host. PROFILE_TEMPLATE is a chrome
+# profile directory every dense session starts from a copy of (None for a fresh one)
+DENSE_MODE = False
+PROFILE_TEMPLATE = None
+# this set stores the session ids of the chrome instances on which the auto-play
+# button has already been toggled off (it stays off for the rest of the session)
+auto_play_toggled_sessions = set()
 
 
 def to_seconds(timestr: str):
@@ -60,7 +137,13 @@ def to_seconds(timestr: str):
     return seconds
 
 
+@metrics.timed
 def enable_stats_for_nerds(driver: webdriver.Chrome):
+    # this is a generator (used with "yield from"): before every click it waits for the
+    # element to be rendered instead of failing and being retried from the start
+    yield from wait_for_element(
+        driver, "/html/body/ytm-app/ytm-mobile-topbar-renderer/header/div/ytm-menu/button", ELEMENT_TIMEOUT
+    )
     # finding the settings button on YouTube's video player
     settings = driver.find_element_by_xpath(
         "/html/body/ytm-app/ytm-mobile-topbar-renderer/header/div/ytm-menu/button"
@@ -68,6 +151,7 @@ def enable_stats_for_nerds(driver: webdriver.Chrome):
     # clicking the settings button
     settings.click()
 
+    yield from wait_for_element(driver, "/html/body/div[2]/div/ytm-menu-item[3]/button", ELEMENT_TIMEOUT)
     # locating the "Playback Settings" option on the pop-up
     playback_settings = driver.find_element_by_xpath(
         "/html/body/div[2]/div/ytm-menu-item[3]/button"
@@ -76,6 +160,7 @@ def enable_stats_for_nerds(driver: webdriver.Chrome):
     # clicking on it
     playback_settings.click()
 
+    yield from wait_for_element(driver, "/html/body/div[2]/dialog/div[2]/ytm-menu-item[2]/button", ELEMENT_TIMEOUT)
     try:
         # locating the stats for nerds option using the generated xml path
         stats_for_nerds = driver.find_element_by_xpath(
@@ -95,6 +180,9 @@ def enable_stats_for_nerds(driver: webdriver.Chrome):
             # catching the exception if any
             raise e
 
+    yield from wait_for_element(
+        driver, "/html/body/div[2]/dialog/div[3]/c3-material-button/button", ELEMENT_TIMEOUT
+    )
     # exiting the settings option to view the stats for nerds option clearly
     exit_dialog = driver.find_element_by_xpath(
         "/html/body/div[2]/dialog/div[3]/c3-material-button/button"
@@ -103,6 +191,541 @@ def enable_stats_for_nerds(driver: webdriver.Chrome):
     exit_dialog.click()
 
 
+# this JS snippet gathers everything the collector needs from the player in a single
+# execute_script call, so that one WebDriver round trip is made per tick instead of
+# one per field. every field is read inside its own try block so a single missing
+# panel row comes back as null instead of failing the whole probe
+SNAPSHOT_BODY = """
+var player = document.getElementById('movie_player');
+var video = document.getElementsByClassName('video-stream html5-main-video')[0];
+var panel = document.getElementsByClassName('html5-video-info-panel-content')[0];
+var snapshot = {
+    player_state: null,
+    ad_showing: document.getElementsByClassName('ad-showing').length,
+    player_time: null,
+    video_time: null,
+    duration: null,
+    resolution: null,
+    buffer: null,
+    video_id: null,
+    skip_text: null,
+    skip_button: document.getElementsByClassName('ytp-ad-skip-button-container').length
+};
+try { snapshot.player_state = player.getPlayerState(); } catch (e) {}
+try { snapshot.player_time = player.getCurrentTime(); } catch (e) {}
+try { snapshot.duration = player.getDuration(); } catch (e) {}
+try { snapshot.video_time = video.currentTime; } catch (e) {}
+try { snapshot.resolution = panel.children[2].children[1].textContent.replace(" ","").split("/")[0]; } catch (e) {}
+try { snapshot.buffer = panel.children[10].children[1].textContent.split(" ")[1]; } catch (e) {}
+try { snapshot.video_id = panel.children[0].children[1].textContent.replace(" ","").split("/")[0]; } catch (e) {}
+try { snapshot.skip_text = document.getElementsByClassName("ytp-ad-text ytp-ad-preview-text")[0].innerText; } catch (e) {}
+snapshot.ad_events = window.__adObserver ? window.__adObserver.drain() : [];
+"""
+SNAPSHOT_SCRIPT = SNAPSHOT_BODY + "return snapshot;"
+
+# this JS snippet installs the in-page sampler. it samples the player into a ring buffer
+# (oldest samples are dropped and counted when it is full) and also records the
+# waiting/playing/stalled events of the main video element, which mark the stalls that
+# polling from python misses. timeupdate events are used to keep track of when playback
+# last progressed. the sampling rate follows a SamplingPolicy: dense for a while after a
+# transition (the ad flag or the resolution changing between two samples, a stall event,
+# or the ad observer calling burst), steady otherwise. arguments[0] is the policy (see
+# SamplingPolicy.to_page) and arguments[1] the capacity of the ring buffer
+SAMPLER_SCRIPT = """
+var policy = arguments[0];
+var capacity = arguments[1];
+if (window.__collector) { clearTimeout(window.__collector.timer); }
+var collector = {
+    ring: new Array(capacity),
+    head: 0,
+    count: 0,
+    dropped: 0,
+    lastProgress: null,
+    timer: null,
+    // playback starting counts as a transition
+    lastChange: Date.now(),
+    lastAd: null,
+    lastResolution: null
+};
+collector.push = function (sample) {
+    collector.ring[(collector.head + collector.count) % capacity] = sample;
+    if (collector.count < capacity) {
+        collector.count += 1;
+    } else {
+        collector.head = (collector.head + 1) % capacity;
+        collector.dropped += 1;
+    }
+};
+collector.drain = function () {
+    var samples = [];
+    for (var i = 0; i < collector.count; i++) {
+        samples.push(collector.ring[(collector.head + i) % capacity]);
+    }
+    var drained = {samples: samples, dropped: collector.dropped};
+    collector.head = 0;
+    collector.count = 0;
+    collector.dropped = 0;
+    return drained;
+};
+collector.sample = function (kind) {
+    var player = document.getElementById('movie_player');
+    var video = document.getElementsByClassName('video-stream html5-main-video')[0];
+    var panel = document.getElementsByClassName('html5-video-info-panel-content')[0];
+    var sample = {
+        kind: kind,
+        t: Date.now(),
+        state: null,
+        ad: document.getElementsByClassName('ad-showing').length,
+        player_time: null,
+        video_time: null,
+        resolution: null,
+        buffer: null,
+        last_progress: collector.lastProgress
+    };
+    try { sample.state = player.getPlayerState(); } catch (e) {}
+    try { sample.player_time = player.getCurrentTime(); } catch (e) {}
+    try { sample.video_time = video.currentTime; } catch (e) {}
+    try { sample.resolution = panel.children[2].children[1].textContent.replace(" ","").split("/")[0]; } catch (e) {}
+    try { sample.buffer = panel.children[10].children[1].textContent.split(" ")[1]; } catch (e) {}
+    if (kind !== 'tick' || sample.ad !== collector.lastAd ||
+        (sample.resolution !== null && sample.resolution !== collector.lastResolution)) {
+        collector.lastChange = sample.t;
+    }
+    collector.lastAd = sample.ad;
+    if (sample.resolution !== null) { collector.lastResolution = sample.resolution; }
+    collector.push(sample);
+};
+collector.schedule = function () {
+    var dense = Date.now() - collector.lastChange < policy.window_ms;
+    collector.timer = setTimeout(function () {
+        collector.sample('tick');
+        collector.schedule();
+    }, dense ? policy.dense_ms : policy.steady_ms);
+};
+// a transition seen outside of the ticks: the sampler turns dense straight away
+collector.mark = function () {
+    collector.lastChange = Date.now();
+    clearTimeout(collector.timer);
+    collector.schedule();
+};
+// called by the ad observer the moment an ad starts or ends, so there is a sample right at the boundary
+collector.burst = function () {
+    collector.sample('tick');
+    collector.mark();
+};
+collector.schedule();
+window.__collector = collector;
+// media events do not bubble, so they are caught on the capturing phase. the
+// listeners are only added once per page and always use the latest collector
+if (!window.__collectorListeners) {
+    window.__collectorListeners = true;
+    ['waiting', 'playing', 'stalled'].forEach(function (name) {
+        document.addEventListener(name, function (e) {
+            if (e.target.classList && e.target.classList.contains('html5-main-video')) {
+                window.__collector.sample(name);
+                window.__collector.mark();
+            }
+        }, true);
+    });
+    document.addEventListener('timeupdate', function (e) {
+        if (e.target.classList && e.target.classList.contains('html5-main-video')) {
+            window.__collector.lastProgress = Date.now();
+        }
+    }, true);
+}
+"""
+
+# same as SNAPSHOT_SCRIPT, but also drains the in-page sampler in the same round trip
+DRAIN_SCRIPT = SNAPSHOT_BODY + """
+snapshot.drained = window.__collector ? window.__collector.drain() : null;
+return snapshot;
+"""
+
+
+# this JS snippet installs an observer on the player that emits timestamped ad_start,
+# ad_end and ad_id_change events into a page-side queue, which is drained along with
+# every snapshot. it reacts to the player's class list toggling "ad-showing" and to
+# the video id row of the stats for nerds panel (which sits inside the player)
+# changing, so ad boundaries are caught exactly even when they fall between two probes
+AD_OBSERVER_SCRIPT = """
+if (window.__adObserver) { return; }
+var player = document.getElementById('movie_player');
+var adObserver = {queue: [], adShowing: false, videoId: null};
+adObserver.readVideoId = function () {
+    try {
+        var panel = document.getElementsByClassName('html5-video-info-panel-content')[0];
+        return panel.children[0].children[1].textContent.replace(" ","").split("/")[0];
+    } catch (e) { return null; }
+};
+adObserver.emit = function (type) {
+    var playerTime = null;
+    try { playerTime = player.getCurrentTime(); } catch (e) {}
+    adObserver.queue.push({type: type, t: Date.now(), video_id: adObserver.videoId, player_time: playerTime});
+    // in the accelerated mode ads play at normal speed, and the main video gets its rate back after them
+    if (window.__accelerated) {
+        try {
+            document.getElementsByClassName('video-stream html5-main-video')[0].playbackRate =
+                type === 'ad_end' ? window.__accelerated.rate : 1;
+        } catch (e) {}
+    }
+    // the next ad of a pod starting (ad_id_change) is a boundary as well
+    if (window.__collector) { window.__collector.burst(); }
+};
+adObserver.check = function () {
+    var showing = document.getElementsByClassName('ad-showing').length > 0;
+    if (showing !== adObserver.adShowing) {
+        adObserver.adShowing = showing;
+        adObserver.emit(showing ? 'ad_start' : 'ad_end');
+    }
+    var videoId = adObserver.readVideoId();
+    if (videoId !== null && videoId !== adObserver.videoId) {
+        adObserver.videoId = videoId;
+        if (showing) { adObserver.emit('ad_id_change'); }
+    }
+};
+adObserver.drain = function () {
+    var queue = adObserver.queue;
+    adObserver.queue = [];
+    return queue;
+};
+adObserver.check();
+new MutationObserver(adObserver.check).observe(player, {
+    attributes: true, attributeFilter: ['class'], childList: true, characterData: true, subtree: true
+});
+window.__adObserver = adObserver;
+"""
+
+
+# this JS snippet returns the mid-roll cue points (in seconds) listed in the ad placements
+# of the player response, which is embedded in the watch page
+CUE_POINTS_SCRIPT = """
+var cues = [];
+try {
+    (window.ytInitialPlayerResponse.adPlacements || []).forEach(function (placement) {
+        try {
+            var config = placement.adPlacementRenderer.config.adPlacementConfig;
+            var offset = Number(config.adTimeOffset.offsetStartMilliseconds);
+            if (config.kind === 'AD_PLACEMENT_KIND_MILLISECONDS' && offset > 0) { cues.push(offset / 1000); }
+        } catch (e) {}
+    });
+} catch (e) {}
+return cues.sort(function (a, b) { return a - b; });
+"""
+
+# this JS snippet seeks the main video to arguments[0] seconds. the seek is a transition
+# for the in-page sampler, which samples densely up to the ad that follows
+SEEK_SCRIPT = """
+document.getElementsByClassName('video-stream html5-main-video')[0].currentTime = arguments[0];
+if (window.__collector) { window.__collector.mark(); }
+"""
+
+# this JS snippet plays the main video arguments[0] times faster. the ad observer puts the
+# rate back to 1 while ads play
+RATE_SCRIPT = """
+window.__accelerated = {rate: arguments[0]};
+if (!document.getElementsByClassName('ad-showing').length) {
+    document.getElementsByClassName('video-stream html5-main-video')[0].playbackRate = arguments[0];
+}
+"""
+
+
+class AdTransitions:
+    '''
+    This class keeps the ad events emitted by AD_OBSERVER_SCRIPT until they are
+    consumed, either by record_ad_buffer (for the ad it is recording) or by the
+    main video loop (for ads that started and ended between two of its probes)
+    '''
+
+    def __init__(self, driver: webdriver.Chrome, movie_id):
+        self.driver = driver
+        self.movie_id = movie_id
+        self.pending = []
+
+    def install(self):
+        # has to be called again after every driver.get since the page is replaced
+        self.driver.execute_script(AD_OBSERVER_SCRIPT)
+
+    def feed(self, snapshot):
+        # every snapshot carries the events emitted since the previous one
+        self.pending.extend(snapshot.pop("ad_events", []))
+
+    def is_ad_id(self, video_id):
+        return video_id is not None and str(video_id).strip() != str(self.movie_id).strip()
+
+    def take_missed_ads(self):
+        '''
+        This function returns a (ad id, boundaries) pair for every ad that started
+        and ended while no probe was looking, and drops events that are left over
+        from ads that have already been recorded. an ad that has started but not
+        ended yet is left pending
+        '''
+        missed = []
+        start = None
+        ad_id = ""
+        index = 0
+        for index, event in enumerate(self.pending):
+            if event["type"] == "ad_start":
+                start = event
+                ad_id = event["video_id"] if self.is_ad_id(event["video_id"]) else ""
+            elif event["type"] == "ad_id_change" and start is not None and self.is_ad_id(event["video_id"]):
+                if ad_id and event["video_id"] != ad_id:
+                    # the next ad of a pod took over
+                    missed.append((ad_id, ad_boundaries(start, event)))
+                    start = event
+                ad_id = event["video_id"]
+            elif event["type"] == "ad_end" and start is not None:
+                missed.append((ad_id, ad_boundaries(start, event)))
+                start = None
+        # only an ad that is still going on is kept
+        self.pending = self.pending[self.pending.index(start):] if start is not None else []
+        return missed
+
+
+def ad_boundaries(start, end):
+    # the page timestamps (milliseconds) at which an ad started and ended, and the
+    # played seconds of the main video at that point
+    return {
+        "start_t": start["t"] if start else None,
+        "end_t": end["t"] if end else None,
+        "played": start["player_time"] if start else None,
+    }
+
+
+class PlaybackAccelerator:
+    '''
+    This class moves the main video on between its ads in the accelerated mode.
+    when the page lists its mid-roll cue points the video is seeked to lead
+    seconds before the next one (and to lead seconds before its end after the
+    last one), so it plays the last stretch before every ad at normal speed and
+    the buffer readings right before the ad are those of normal playback.
+    otherwise it is played rate times faster, except during ads
+    '''
+
+    def __init__(self, driver: webdriver.Chrome, duration, rate=PLAYBACK_RATE, lead=SEEK_LEAD):
+        self.driver = driver
+        self.duration = duration
+        self.rate = rate
+        self.lead = lead
+        self.cue_points = driver.execute_script(CUE_POINTS_SCRIPT) or []
+        # (from, to) played seconds of every seek made
+        self.seeks = []
+
+    def start(self):
+        if not self.cue_points:
+            self.driver.execute_script(RATE_SCRIPT, self.rate)
+
+    def advance(self, snapshot):
+        # called on every tick of the main video, seeks it when it is not close enough to its next ad
+        played = snapshot["player_time"]
+        if not self.cue_points or snapshot["ad_showing"] or snapshot["player_state"] != 1 or played is None:
+            return
+        # cue points that have been played (or skipped over) already
+        upcoming = [cue for cue in self.cue_points if cue > played + 1]
+        target = (upcoming[0] if upcoming else self.duration) - self.lead
+        # a seek the page has not caught up with yet is not made again
+        if target > played + 1 and not (self.seeks and self.seeks[-1][1] == target):
+            self.driver.execute_script(SEEK_SCRIPT, target)
+            self.seeks.append((played, target))
+
+    def details(self):
+        return {
+            "Mode": "seek" if self.cue_points else "rate",
+            "Rate": 1 if self.cue_points else self.rate,
+            "Lead": self.lead,
+            "CuePoints": self.cue_points,
+            "Seeks": self.seeks,
+        }
+
+
+class SamplingPolicy:
+    '''
+    This class is the rate policy of the sampling: every dense_ms milliseconds
+    for window_ms after a transition (an ad starting or ending, a change of
+    resolution or a stall) and every steady_ms milliseconds otherwise. the
+    in-page sampler follows it by itself (see SAMPLER_SCRIPT), this class
+    applies it to the probes taken from python, and is recorded with the output
+    of every video so the density of its traces is known
+    '''
+
+    def __init__(self, dense_ms=SAMPLE_INTERVAL_MS, steady_ms=STEADY_INTERVAL_MS, window_ms=DENSE_WINDOW_MS):
+        self.dense_ms = dense_ms
+        self.steady_ms = steady_ms
+        self.window_ms = window_ms
+        # playback starting counts as a transition
+        self.last_change = time.monotonic()
+        self.ad_showing = None
+        self.resolution = None
+        # number of transitions seen by the probes
+        self.transitions = 0
+
+    def observe(self, snapshot):
+        # has to be given every snapshot before AdTransitions takes its ad events
+        changed = (
+            bool(snapshot.get("ad_events"))
+            or snapshot["ad_showing"] != self.ad_showing
+            # the player is buffering
+            or snapshot["player_state"] == 3
+            or (snapshot["resolution"] is not None and snapshot["resolution"] != self.resolution)
+        )
+        self.ad_showing = snapshot["ad_showing"]
+        if snapshot["resolution"] is not None:
+            self.resolution = snapshot["resolution"]
+        if changed:
+            self.last_change = time.monotonic()
+            self.transitions += 1
+
+    def dense(self):
+        return (time.monotonic() - self.last_change) * 1000 < self.window_ms
+
+    def interval(self):
+        # seconds until the next probe when the player is polled from python
+        return (self.dense_ms if self.dense() else self.steady_ms) / 1000
+
+    def drain_interval(self):
+        # seconds until the in-page sampler is drained again
+        return AD_DRAIN_INTERVAL if self.dense() else DRAIN_INTERVAL
+
+    def to_page(self):
+        # the policy as passed to SAMPLER_SCRIPT
+        return {"dense_ms": self.dense_ms, "steady_ms": self.steady_ms, "window_ms": self.window_ms}
+
+    def details(self):
+        return {
+            "Adaptive": self.dense_ms != self.steady_ms,
+            "DenseMs": self.dense_ms,
+            "SteadyMs": self.steady_ms,
+            "WindowMs": self.window_ms,
+            "Transitions": self.transitions,
+        }
+
+
+def sampling_policy():
+    # the policy set by the constants at the top of the script
+    if ADAPTIVE_SAMPLING:
+        return SamplingPolicy(SAMPLE_INTERVAL_MS, STEADY_INTERVAL_MS, DENSE_WINDOW_MS)
+    return SamplingPolicy(SAMPLE_INTERVAL_MS, SAMPLE_INTERVAL_MS, DENSE_WINDOW_MS)
+
+
+class PageSampler:
+    '''
+    This class wraps the in-page sampler installed by SAMPLER_SCRIPT. Every
+    snapshot taken through it also drains the samples accumulated in the page
+    since the last one, and keeps them until they are taken by the main video
+    loop or by record_ad_buffer (samples are handed out in the order they were
+    taken, split by whether an ad was showing at the time)
+    '''
+
+    def __init__(self, driver: webdriver.Chrome, policy=None, capacity=SAMPLER_CAPACITY):
+        self.driver = driver
+        self.policy = policy if policy is not None else sampling_policy()
+        self.capacity = capacity
+        # interval samples waiting to be taken
+        self.pending = []
+        # waiting/playing/stalled events of the main video element
+        self.events = []
+        # samples dropped by the ring buffer because it was not drained in time
+        self.dropped = 0
+        # ad samples that were never taken because the ad was not seen by a snapshot
+        self.orphaned = 0
+
+    def install(self):
+        # has to be called again after every driver.get since the page is replaced
+        self.driver.execute_script(SAMPLER_SCRIPT, self.policy.to_page(), self.capacity)
+
+    def snapshot(self):
+        snapshot = self.driver.execute_script(DRAIN_SCRIPT)
+        drained = snapshot.pop("drained", None)
+        if drained is not None:
+            self.dropped += drained["dropped"]
+            for sample in drained["samples"]:
+                if sample["kind"] == "tick":
+                    self.pending.append(sample)
+                else:
+                    self.events.append(sample)
+        return snapshot
+
+    def take(self, ad):
+        # hands out the leading run of pending samples whose ad flag matches
+        index = 0
+        while index < len(self.pending) and bool(self.pending[index]["ad"]) == bool(ad):
+            index += 1
+        taken = self.pending[:index]
+        self.pending = self.pending[index:]
+        return taken
+
+    def take_main_readings(self, ad_playing):
+        '''
+        This function returns the (buffer, played seconds, resolution) readings of the
+        main video sampled since the last call. ad samples standing in front of them
+        are skipped when no ad is showing anymore, since no one will take them
+        '''
+        samples = self.take(ad=False)
+        while self.pending and not ad_playing:
+            self.orphaned += len(self.take(ad=True))
+            samples += self.take(ad=False)
+        return [
+            (float(sample["buffer"]), sample["player_time"], sample["resolution"])
+            for sample in samples
+            if sample["buffer"] is not None
+        ]
+
+    def take_ad_readings(self, since=None, until=None):
+        # returns the (buffer, played seconds, resolution) readings of the ad being played,
+        # only those sampled before the page timestamp until if one is given (the next ad
+        # of a pod starts there). main video samples in front of them that were taken before
+        # the page timestamp since (the start of the ad) are dropped: a pre-roll ad is preceded
+        # by the samples taken while the page loaded, which no one else takes
+        while since is not None and self.pending and not self.pending[0]["ad"] and self.pending[0]["t"] < since:
+            self.pending.pop(0)
+        samples = self.take(ad=True)
+        if until is not None:
+            self.pending = [sample for sample in samples if sample["t"] >= until] + self.pending
+            samples = [sample for sample in samples if sample["t"] < until]
+        return [
+            (float(sample["buffer"]), sample["video_time"], sample["resolution"])
+            for sample in samples
+            if sample["buffer"] is not None and sample["video_time"] is not None
+        ]
+
+    def take_events(self):
+        # hands out the waiting/playing/stalled events drained since the last call
+        events = self.events
+        self.events = []
+        return events
+
+    def details(self, events):
+        # summary of the sampler that is written along with the other files of a video
+        return {
+            "IntervalMs": self.policy.dense_ms,
+            "Policy": self.policy.details(),
+            "Capacity": self.capacity,
+            "Dropped": self.dropped,
+            "Orphaned": self.orphaned,
+            "Events": events,
+        }
+
+
+@metrics.timed
+def take_snapshot(driver: webdriver.Chrome, sampler=None):
+    '''
+    This function probes the player once using SNAPSHOT_SCRIPT and returns
+    a dictionary with the player state, ad flag, current times, duration,
+    resolution, buffer health, the video id shown in stats for nerds and
+    the skip information of an ad (if one is showing). if a sampler is passed
+    the in-page samples are drained in the same round trip
+    '''
+    if sampler is not None:
+        return sampler.snapshot()
+    return driver.execute_script(SNAPSHOT_SCRIPT)
+
+
+def time_to_sleep(driver: webdriver.Chrome):
+    # the longest time the script waits for a pre-roll ad to show up once the main video
+    # has started playing, worked out from the download limit currently applied to the session
+    return float(2 / network_profiles.download_limit(driver, downloadLimitMbps))
+
+
+@metrics.timed
 def start_playing_video(driver: webdriver.Chrome):
     # fetching the state of the player by executing the JS code in the chrome browser
     player_state = driver.execute_script(
@@ -122,296 +745,532 @@ def start_playing_video(driver: webdriver.Chrome):
         return
 
 
-def play_video_if_not_playing(driver: webdriver.Chrome):
-    # fetch the player state using the same JS code in the web browser's console
-    player_state = driver.execute_script(
-        "return document.getElementById('movie_player').getPlayerState()"
-    )
+@metrics.timed
+def play_video_if_not_playing(driver: webdriver.Chrome, player_state=None):
+    # the caller usually already has the player state from a snapshot, only
+    # fetch it from the browser if it was not passed in
+    if player_state is None:
+        player_state = driver.execute_script(
+            "return document.getElementById('movie_player').getPlayerState()"
+        )
     # if the player state is 0 meaning the video has ended, simply return
     if player_state == 0:
         return
-    # if the video has not started yet, then locate the relevant HTML5-embedded class
-    if player_state == -1:
-        # execute the script
-        driver.execute_script(
-            "document.getElementsByClassName('video-stream html5-main-video')[0].play()"
-        )
-    # if any other state except for 1 (player state 1 implies the video is already playing)
+    # if any other state except for 1 (player state 1 implies the video is already playing),
+    # including -1 (the video has not started yet), locate the embedded class names using JS
+    # and play the video
     if player_state != 1:
-        # locate the embedded class names using JS and play the video
         driver.execute_script(
             "document.getElementsByClassName('video-stream html5-main-video')[0].play()"
         )
 
 
-def record_ad_buffer(driver: webdriver.Chrome, movie_id):
-    # this function keeps track of the ad buffer recorded every second the ad video progresses
-    ad_buffer_list = []
+@metrics.timed
+def record_ad_buffer(driver: webdriver.Chrome, movie_id, snapshot, sampler, transitions, policy=None):
+    # this function keeps track of the ad buffer recorded every second the ad video progresses.
+    # like collect_video_steps it is a generator that yields the seconds it wants to wait between
+    # probes, and is used with "yield from" to get its return value. the caller hands over the
+    # snapshot in which it saw the ad. it returns when the ad ends, or when the next ad of a pod
+    # takes over (the caller then calls it again for that ad). without a sampler the probes follow
+    # the sampling policy: dense around the start and end of the ad, steady in between
+    if policy is None:
+        policy = sampling_policy()
+    # the readings of the ad, kept in packed arrays
+    ad_buffer_list = ReadingTrace()
+    transitions.feed(snapshot)
     # this captures a singaling value whether the ad is playing or not
-    ad_playing = driver.execute_script(
-        "return document.getElementsByClassName('ad-showing').length"
-    )
+    ad_playing = snapshot["ad_showing"]
     # this string stores the id of the ad stored in the URL of the ad id
     ad_id = ""
-    ad_skippable = []
-    # stores the skip duration of the ads
-    all_numbers = []
+    # the most frequent skippable flag seen while the ad played
+    ad_skippable = RunningMode()
+    # stores the longest skip duration of the ad seen so far
+    skip_dur = None
+    # the ad events marking the start and end of this ad, and the id they gave it
+    start_event = None
+    end_event = None
+    event_ad_id = None
+    # the event starting the next ad of a pod, if this ad is cut short by one
+    next_ad_event = None
+    # page timestamp of the start of the ad, samples of the main video taken before it are not waited for
+    since = None
     # while the ad is playing
     while ad_playing:
-        # get the ad buffer in seconds and convert it into a floating point value
-        ad_buffer = float(
-            driver.execute_script(
-                'return document.getElementsByClassName("html5-video-info-panel-content")[0].children[10].children[1].textContent.split(" ")[1]'
-            )
-        )
-        # capture the resolution on which the ad is playing
-        res = driver.execute_script(
-            'return document.getElementsByClassName("html5-video-info-panel-content")[0].children[2].children[1].textContent.replace(" ","").split("/")[0]'
-        )
-        # this looping variable keeps on incrementing until the current time the ad has played so far is fetched
-        current_time_retry = 0
-        while current_time_retry < 10:
-            try:
-                # capturing the current running time of the advertisement playing
-                ad_played = float(
-                    driver.execute_script(
-                        "return document.getElementsByClassName('video-stream html5-main-video')[0].currentTime"
-                    )
-                )
-                # break from the while loop if the time has been fetched
-                break
-            except:
-                # increment the looping variable and try again
-                current_time_retry += 1
+        # going through the ad events in order, stopping at the start of the next ad
+        while transitions.pending:
+            event = transitions.pending[0]
+            if event["type"] == "ad_start":
+                if start_event is not None:
+                    next_ad_event = event
+                    break
+                start_event = event
+                # the stats panel may have switched to the ad before its class did
+                if transitions.is_ad_id(event["video_id"]):
+                    event_ad_id = event["video_id"]
+            elif event["type"] == "ad_id_change" and transitions.is_ad_id(event["video_id"]):
+                if event_ad_id is not None and event["video_id"] != event_ad_id:
+                    next_ad_event = event
+                    break
+                event_ad_id = event["video_id"]
+                if start_event is None:
+                    start_event = event
+            elif event["type"] == "ad_end":
+                end_event = event
+            transitions.pending.pop(0)
+        if start_event is not None:
+            since = start_event["t"]
+        if next_ad_event is not None:
+            # this ad ends where the next one of the pod starts (unless its own ad_end was seen)
+            if end_event is None:
+                end_event = next_ad_event
+            if sampler is not None:
+                ad_buffer_list.extend(sampler.take_ad_readings(since, until=next_ad_event["t"]))
+            break
 
-        try:
-            # feth the ad id using the following JS code
-            ad_id_temp = driver.execute_script(
-                'return document.getElementsByClassName("html5-video-info-panel-content")[0].children[0].children[1].textContent.replace(" ","").split("/")[0]'
-            )
-            # if the ad id is not equal to the id passed to the function
-            if str(ad_id_temp).strip() != str(movie_id).strip():
-                # set the ad it equal to the ad id fetched in the above JS code (right before the current if statement)
-                ad_id = ad_id_temp
-        except:
-            pass
+        if sampler is not None:
+            # the buffer readings of the ad are sampled inside the page, just take what
+            # has been drained so far
+            ad_buffer_list.extend(sampler.take_ad_readings(since))
+        else:
+            # get the ad buffer in seconds and convert it into a floating point value
+            ad_buffer = float(snapshot["buffer"])
+            # capture the resolution on which the ad is playing
+            res = snapshot["resolution"]
+            if snapshot["video_time"] is None:
+                # wait for the current running time of the advertisement to become available and probe again
+                yield from wait_for(driver, "video_time", VIDEO_TIME_TIMEOUT)
+                snapshot = take_snapshot(driver)
+                # the ad events drained by this probe are handled on the next pass
+                policy.observe(snapshot)
+                transitions.feed(snapshot)
+            # capturing the current running time of the advertisement playing
+            ad_played = float(snapshot["video_time"])
+            ad_played_in_seconds = ad_played
+            ad_buffer_list.append((ad_buffer, ad_played_in_seconds, res))
+
+        # the ad id is read from the stats for nerds panel as part of the snapshot
+        ad_id_temp = snapshot["video_id"]
+        # if the ad id is not equal to the id passed to the function
+        if ad_id_temp is not None and str(ad_id_temp).strip() != str(movie_id).strip():
+            # set the ad it equal to the ad id fetched in the snapshot
+            ad_id = ad_id_temp
 
         try:
-            # fetch the skip duration of the ad if the ad is skippable
-            skip_duration = driver.execute_script(
-                'return document.getElementsByClassName("ytp-ad-text ytp-ad-preview-text")[0].innerText'
-            )
             # convert the skip duration into an integer by doing the necessary string manipulation
-            numba = int(skip_duration.split(" ")[-1])
-            all_numbers.append(numba)
+            numba = int(snapshot["skip_text"].split(" ")[-1])
         except:
-            # simply append -2 if there is an error fetching the skip duration for the current ad being played
-            all_numbers.append(-2)
-
-        ad_played_in_seconds = ad_played
-        ad_buffer_list.append((ad_buffer, ad_played_in_seconds, res))
-        # after extracting all the relevant information, it checks if the ad is still playing or not and updates the
-        # looping variable
-        ad_playing = driver.execute_script(
-            "return document.getElementsByClassName('ad-showing').length"
-        )
+            # simply use -2 if there is an error fetching the skip duration for the current ad being played
+            numba = -2
+        # keeping the max of the skip durations seen so far
+        skip_dur = numba if skip_dur is None else max(skip_dur, numba)
+
+        # after extracting all the relevant information, probe the player again to check if the ad is
+        # still playing or not and update the looping variable
+        # no need to busy-poll with the sampler, the samples keep accumulating in the page meanwhile
+        yield AD_DRAIN_INTERVAL if sampler is not None else policy.interval()
+        snapshot = take_snapshot(driver, sampler)
+        policy.observe(snapshot)
+        transitions.feed(snapshot)
+        ad_playing = snapshot["ad_showing"]
         # this returns a boolean representing whether the ad is skippable or not
-        skippable = int(driver.execute_script(
-            "return document.getElementsByClassName('ytp-ad-skip-button-container').length"
-        ))
-        # if the ad is skippable, append the value to the ad_skippable list
-        ad_skippable.append(skippable)
+        skippable = int(snapshot["skip_button"])
+        # counting the value towards the most frequent one
+        ad_skippable.add(skippable)
         # call this function if the ad is not playing or it has stopped due to some reason
-        play_video_if_not_playing(driver)
+        play_video_if_not_playing(driver, snapshot["player_state"])
 
-    skippable = most_frequent(ad_skippable)
-    # this captures the skip duration at various instances and returns the max of this list
+    if next_ad_event is None:
+        if sampler is not None:
+            # readings of the ad drained by the final snapshot
+            ad_buffer_list.extend(sampler.take_ad_readings(since))
+        # the ad_end event drained by the final snapshot
+        while transitions.pending and transitions.pending[0]["type"] != "ad_start":
+            event = transitions.pending.pop(0)
+            if event["type"] == "ad_end":
+                end_event = event
+    # the id given by the ad events is exact, the one read by the probes is only used without it
+    if event_ad_id is not None:
+        ad_id = event_ad_id
+    # the ad may be cut short by the next one of a pod before a single probe was taken
+    skippable = ad_skippable.mode if ad_skippable.total else int(snapshot["skip_button"])
+    # the skip duration is the max of the values captured at various instances
     # this was observed to be 5 seconds for every run
-    skip_dur = max(all_numbers)
-    return ad_id, skippable, ad_buffer_list, skip_dur
+    if skip_dur is None:
+        skip_dur = -2
+    return ad_id, skippable, ad_buffer_list, skip_dur, ad_boundaries(start_event, end_event)
 
 
-def driver_code(driver: webdriver.Chrome):
-    # this list comprises of the URLs that were scraped off of the trending
-    # pages using the webscraper.py file
-    list_of_urls = [
-        # "https://www.youtube.com/watch?v=ec1vg-gv9Dk",
-        # 'https://www.youtube.com/watch?v=0OCUjgwOua8',
-        # 'https://www.youtube.com/watch?v=8ogj6nRLhNg',
-        # 'https://www.youtube.com/watch?v=5T4QIbOe7Vw',
-        # 'https://www.youtube.com/watch?v=XX7fJZBZtoE',
-        # 'https://www.youtube.com/watch?v=gsop4R3-Ci8',
-    ]
-    # iterating over the enumerated list of urls
-    for index, url in enumerate(list_of_urls):
-        global error_list
-        global auto_play_toggle
-        # this dictionary stores the information related to the video being played
-        video_info_details = {}
-        # this dictionary stores all the necessary information related to the advertisement's buffer
-        ad_buffer_information = {}
-        # this keeps track of all the errors that arose during the data collection
-        error_list = []
-        # this variable keeps a count of all the unique ads (both in-stream skippable and non-skippable)
-        # that were displayed during the interval the main video was being played
-        unique_ad_count = 0
-        # boolean that flags to true if an ad recently started playing between the video -- mid-roll ads
-        ad_just_played = False
-        # this stores all information related to the main video's buffer
-        buffer_list = []
-        actual_buffer_reads = []
-        buffer_size_with_ad = []
-        # this list stores the resolution of the video being played at each second
-        vid_res_at_each_second = []
-        main_res_all = []
-        # id of the recently streamed ads
-        previous_ad_id = url.split("=")[1]
-        # id of the main video streamed
-        movie_id = url.split("=")[1]
-        # name of the directory in which all the files related to a video are stored
-        new_dir = "./" + str(index + 24)
+def register_ad(video_info_details, ad_buffer_information, ad_id, skippable, skip_duration, ad_buf_details):
+    '''
+    This function adds an ad impression to video_info_details and ad_buffer_information
+    and returns the name it is recorded under: the ad id for a unique ad, and the ad id
+    with its count appended for an ad that has already been displayed in the main video
+    '''
+    # this if statement checks if the ad being played is a unique ad or not
+    # i.e., it is present in the video_info_details list. if already present,
+    # this implies the ad is not unique
+    if ad_id not in video_info_details.keys():
+        # store the details of the ad in the video_info_details dictionary
+        video_info_details[ad_id] = {
+            # this key represents the count of the ad
+            "Count": 1,
+            "Skippable": skippable,
+            "SkipDuration": skip_duration,
+        }
+        name = ad_id
+    else:
+        # if the ad is not unique
+        # increment the count of the ad -- same ad being displayed more than once in the main video
+        video_info_details[ad_id]["Count"] += 1
+        # create a new formatted name with the ad id along with its count appended
+        name = ad_id + "_" + str(video_info_details[ad_id]["Count"])
+    # save the buffer-details with the relevant ad's name
+    ad_buffer_information[name] = {"buffer": ad_buf_details}
+    return name
+
 
+@metrics.timed
+def collect_video_steps(driver: webdriver.Chrome, url, new_dir=None, store=None):
+    '''
+    This function plays a single video (and all of its ads) to the end and
+    records the collected data, either into the campaign store (a connection
+    returned by campaign_store.connect) or, if no store is given, as files in
+    new_dir (./<movie_id> by default). it returns False if the video was
+    skipped for being too long and True otherwise. errors are not caught here,
+    the caller decides what to do with a faulty video
+
+    it is a generator: instead of sleeping it yields the number of seconds it
+    wants to wait (0 between busy-polled ticks), so that the caller decides how
+    to wait. collect_video runs it with time.sleep and async_controller runs
+    many of them from one event loop
+    '''
+    # this dictionary stores the information related to the video being played
+    video_info_details = {}
+    # this dictionary stores all the necessary information related to the advertisement's buffer
+    ad_buffer_information = {}
+    # this keeps track of all the errors that arose during the data collection
+    error_list = []
+    # this variable keeps a count of all the unique ads (both in-stream skippable and non-skippable)
+    # that were displayed during the interval the main video was being played
+    unique_ad_count = 0
+    # boolean that flags to true if an ad recently started playing between the video -- mid-roll ads
+    ad_just_played = False
+    # this stores the last (buffer, played seconds) reading of the main video. every reading
+    # (and the buffer ratio computed from it) is streamed to disk instead of being kept in memory
+    last_buffer_read = None
+    # [ID, Last Buffer Before Ad, How much video played when ad played, Buffer after ad finished]
+    # for every ad impression, in the order they were displayed
+    buffer_size_with_ad = []
+    # this keeps the most frequent resolution of the video being played so far
+    main_resolution = RunningMode()
+    # id of the main video streamed
+    movie_id = url.split("=")[1]
+
+    # the segment downloads are read from the network events of the session
+    capture = None
+    if CAPTURE_NETWORK:
+        capture = NetworkCapture(driver)
+        capture.reset()
+        last_capture_drain = time.monotonic()
+    # visiting the main video's URL using Selenium's .get() method
+    driver.get(url)
+    # waiting for the player to be ready instead of sleeping a fixed time
+    yield from wait_for(driver, "player_ready", PAGE_READY_TIMEOUT)
+    # Enable Stats
+    retry_count = 0
+    # this loop keeps incrementing until stats for nerds
+    # has been toggled on successfully.
+    while retry_count < STATS_RETRIES:
         try:
-            # visiting the main video's URL using Selenium's .get() method
-            driver.get(url)
-            # Enable Stats
-            time.sleep(2)
-            retry_count = 0
-            # this loop keeps incrementing until stats for nerds
-            # has been toggled on successfully.
-            while retry_count < 5:
-                try:
-                    enable_stats_for_nerds(driver)
-                    break
-                except:
-                    retry_count += 1
+            yield from enable_stats_for_nerds(driver)
+            break
+        except:
+            retry_count += 1
+            metrics.stats_retries_total.inc()
+    if retry_count == STATS_RETRIES:
+        # without the panel there is no buffer reading at all, so the video is failed (and retried)
+        # instead of being recorded without any
+        raise RuntimeError("stats for nerds could not be enabled")
 
-            # Start Playing the main video
-            start_playing_video(driver)
+    # installing the ad observer and the in-page sampler before playback
+    # starts so that a pre-roll ad is captured as well
+    transitions = AdTransitions(driver, movie_id)
+    transitions.install()
+    # how often the player is sampled, recorded with the video
+    policy = sampling_policy()
+    sampler = None
+    if USE_PAGE_SAMPLER:
+        sampler = PageSampler(driver, policy)
+        sampler.install()
 
-            # Check If ad played at start
-            time.sleep(TIME_TO_SLEEP)
-            # this variable stores a numeral that confirms if an ad is currently playing
-            ad_playing = driver.execute_script(
-                "return document.getElementsByClassName('ad-showing').length"
-            )
-            print("Playing Video: ", movie_id)
-            # if an ad is playing at the start of the video
-            if ad_playing:
-                # print a confirmation message on the terminal
-                print("ad at start of video!")
-                # get all buffer-related information by calling the record_ad_buffer function
-                # navigate to the definition of the function for self-explanatory comments
-                # on the working methodologies of the function
-                ad_id, skippable, ad_buf_details, skip_duration = record_ad_buffer(
-                    driver, movie_id)
-                # to keep things static and homogenous, set the skip duration equal to 999 in the event
-                # the ad is non-skippable
-                if not (skippable):
-                    skip_duration = 999
-
-                # printing the buffer information fetched to the console screen for authenticity
-                print(
-                    "Ad ID: ",
-                    ad_id,
-                    "Skippable? ",
-                    skippable,
-                    " Skip Duration: ",
-                    skip_duration,
-                )
-                # incrementing the unique_ad_count by 1
-                unique_ad_count += 1
-                # storing the scraped information regarding the ad into the video_info_details dictionary
-                # that will be later written to a text file (used in analysis part of the study)
-                video_info_details[ad_id] = {
-                    # this key represents the count of the ad
-                    "Count": 1,
-                    "Skippable": skippable,
-                    "SkipDuration": skip_duration,
-                }
-                # at the start of the ad, the buffer of the main video will be 0 (none has been downloaded
-                # since the video has not progressed)
-                buffer_size_with_ad.append(
-                    # Start of video. Main Buffer will be 0s.
-                    [ad_id, 0.0, 0.0]
-                )
-                previous_ad_id = ad_id
-                # storing the buffer details of the advertisement
-                to_write = {"buffer": ad_buf_details}
-                ad_buffer_information[ad_id] = to_write
-                # printing a confirmation message to the terminal implying that all data related to
-                # the given ad has been collected
-                print("Advertisement " + str(unique_ad_count) + " Data collected.")
-            # fetching the duration of the main video
-            video_duration_in_seconds = driver.execute_script(
-                'return document.getElementById("movie_player").getDuration()'
-            )
-            # if the video duration is greater than 3600 seconds
-            if video_duration_in_seconds >= 3600:
-                # video_info_details dictionary is reset
-                video_info_details = {}
-                print(
-                    video_duration_in_seconds,
-                    " Seconds. Video Skipped for being too Long!",
-                )
-                # move to the next video in the list
-                continue
-            # making the directory in which we will be saving all our files
-            Path(new_dir).mkdir(parents=False, exist_ok=True)
+    # Start Playing the main video
+    start_playing_video(driver)
 
-            # fetching the player state of YouTube and storing in the the variable
-            # this confirms if the video is playing or not
-            video_playing = driver.execute_script(
-                "return document.getElementById('movie_player').getPlayerState()"
-            )
-            # this checks if the ad is still playing or not
-            ad_playing = driver.execute_script(
-                "return document.getElementsByClassName('ad-showing').length"
-            )
-            # Turning off Autoplay
-            if not auto_play_toggle:
-                try:
-                    # fetching the classname of the autoplay button on YouTube's player and turning it off
-                    driver.execute_script(
-                        "document.getElementsByClassName('ytm-autonav-toggle-button-container')[0].click()"
-                    )
-                    # updating the status of the variable to True
-                    auto_play_toggle = True
-                except:
-                    pass
+    # Check If ad played at start: wait until either an ad shows or the main video plays,
+    # and in the latter case give a pre-roll ad up to time_to_sleep seconds to show up
+    # (this second wait returns straight away if an ad is already showing)
+    yield from wait_for(driver, "ad_or_playing", PLAYBACK_START_TIMEOUT)
+    yield from wait_for(driver, "ad_showing", time_to_sleep(driver))
+    # probing the player once for the ad flag (and everything else)
+    snapshot = take_snapshot(driver, sampler)
+    policy.observe(snapshot)
+    # every snapshot drains the ad observer, so its events are kept even if no pre-roll ad is showing
+    transitions.feed(snapshot)
+    # this variable stores a numeral that confirms if an ad is currently playing
+    ad_playing = snapshot["ad_showing"]
+    print("Playing Video: ", movie_id)
+    # the ad records of the pre-roll ads, written once the writer exists
+    pre_roll_ads = []
+    # if an ad is playing at the start of the video
+    if ad_playing:
+        # print a confirmation message on the terminal
+        print("ad at start of video!")
+    # a pod of pre-roll ads is recorded one ad at a time
+    while ad_playing:
+        # get all buffer-related information by calling the record_ad_buffer function
+        # navigate to the definition of the function for self-explanatory comments
+        # on the working methodologies of the function
+        ad_id, skippable, ad_buf_details, skip_duration, boundaries = yield from record_ad_buffer(
+            driver, movie_id, snapshot, sampler, transitions, policy)
+        # to keep things static and homogenous, set the skip duration equal to 999 in the event
+        # the ad is non-skippable
+        if not (skippable):
+            skip_duration = 999
 
-            # Turning off Volume -- not related to data collection (was done entirely for convenience).
+        # printing the buffer information fetched to the console screen for authenticity
+        print(
+            "Ad ID: ",
+            ad_id,
+            "Skippable? ",
+            skippable,
+            " Skip Duration: ",
+            skip_duration,
+        )
+        # storing the scraped information regarding the ad into the video_info_details dictionary
+        # that will be later written to a text file (used in analysis part of the study)
+        name = register_ad(
+            video_info_details, ad_buffer_information, ad_id, skippable, skip_duration, ad_buf_details
+        )
+        if name == ad_id:
+            # incrementing the unique_ad_count by 1
+            unique_ad_count += 1
+        # at the start of the ad, the buffer of the main video will be 0 (none has been downloaded
+        # since the video has not progressed)
+        buffer_size_with_ad.append(
+            # Start of video. Main Buffer will be 0s.
+            [ad_id, 0.0, 0.0]
+        )
+        # the first reading of the main video is the buffer after the pre-roll pod
+        ad_just_played = True
+        metrics.ads_total.inc(position="pre_roll")
+        metrics.samples_total.inc(len(ad_buf_details), video="ad")
+        pre_roll_ads.append(
+            {
+                "name": name,
+                "ad_id": ad_id,
+                "pre_ad_buffer": 0.0,
+                "played": 0.0,
+                "skippable": skippable,
+                "skip_duration": skip_duration,
+                "buffer": ad_buf_details,
+                "start_t": boundaries["start_t"],
+                "end_t": boundaries["end_t"],
+            }
+        )
+        # printing a confirmation message to the terminal implying that all data related to
+        # the given ad has been collected
+        print("Advertisement " + str(unique_ad_count) + " Data collected.")
+        # the player has moved on since the ad, so probe it again (the next ad of a pod may be showing)
+        snapshot = take_snapshot(driver, sampler)
+        policy.observe(snapshot)
+        transitions.feed(snapshot)
+        ad_playing = snapshot["ad_showing"]
+    # fetching the duration of the main video
+    video_duration_in_seconds = snapshot["duration"]
+    # if the video duration is greater than 3600 seconds (normally caught by the pre-flight pass already)
+    if video_duration_in_seconds >= preflight.MAX_VIDEO_DURATION:
+        # video_info_details dictionary is reset
+        video_info_details = {}
+        print(
+            video_duration_in_seconds,
+            " Seconds. Video Skipped for being too Long!",
+        )
+        # move to the next video in the list
+        return False
+    if store is not None:
+        # every sample is recorded into the campaign store as soon as it is collected
+        writer = VideoRecorder(store, movie_id)
+    else:
+        if new_dir is None:
+            new_dir = "./" + movie_id
+        # making the directory in which we will be saving all our files
+        Path(new_dir).mkdir(parents=True, exist_ok=True)
+        # every sample is streamed to new_dir as soon as it is collected, see sample_writer.py
+        writer = SampleWriter(new_dir)
+    if AD_CATALOG:
+        # the ads of the video are added to the catalog once it is over
+        writer = ad_catalog.CatalogWriter(
+            writer, ad_catalog.connect(AD_CATALOG), movie_id, ad_catalog.campaign_of(store, new_dir)
+        )
+    try:
+        # in the accelerated mode the main video is moved on between its ads
+        accelerator = None
+        if ACCELERATED_PLAYBACK:
+            accelerator = PlaybackAccelerator(driver, video_duration_in_seconds)
+        writer.write(
+            "video",
+            url=url,
+            movie_id=movie_id,
+            duration=video_duration_in_seconds,
+            sampling=policy.details(),
+            accelerated=accelerator.details() if accelerator is not None else False,
+        )
+        # the pre-roll ads (if any) were recorded before the directory existed
+        for ad_record in pre_roll_ads:
+            writer.write("ad", **ad_record)
+
+        # Turning off Autoplay
+        if driver.session_id not in auto_play_toggled_sessions:
             try:
+                # fetching the classname of the autoplay button on YouTube's player and turning it off
                 driver.execute_script(
-                    "document.getElementsByClassName('video-stream html5-main-video')[0].volume=0"
+                    "document.getElementsByClassName('ytm-autonav-toggle-button-container')[0].click()"
                 )
+                # remembering that it has been turned off for this session
+                auto_play_toggled_sessions.add(driver.session_id)
             except:
                 pass
 
-            # loop infinitely to collect information of the main video
-            while True:
-                # play the video if not curretly playing
-                play_video_if_not_playing(driver)
-                # fetching YouTube player's state
-                video_playing = driver.execute_script(
-                    "return document.getElementById('movie_player').getPlayerState()"
+        # Turning off Volume -- not related to data collection (was done entirely for convenience).
+        try:
+            driver.execute_script(
+                "document.getElementsByClassName('video-stream html5-main-video')[0].volume=0"
+            )
+        except:
+            pass
+
+        if accelerator is not None:
+            accelerator.start()
+
+        # loop infinitely to collect information of the main video
+        while True:
+            # no need to busy-poll with the sampler, the samples keep accumulating in the page meanwhile.
+            # either way the wait is short around transitions and longer in steady playback
+            yield policy.drain_interval() if sampler is not None else policy.interval()
+            # probing the player once per tick for all the fields used below
+            snapshot = take_snapshot(driver, sampler)
+            policy.observe(snapshot)
+            transitions.feed(snapshot)
+            # play the video if not curretly playing
+            play_video_if_not_playing(driver, snapshot["player_state"])
+            # YouTube player's state
+            video_playing = snapshot["player_state"]
+            # checking if the ad is playing or not
+            ad_playing = snapshot["ad_showing"]
+            # getting the duration of the video played in seconds
+            video_played_in_seconds = snapshot["player_time"]
+            # readings (buffer, played seconds, resolution) of the main video taken since the last tick
+            if sampler is not None:
+                # everything the page sampled before an ad started is recorded here too, so that the
+                # last buffer value before a mid-roll ad is up to date
+                readings = sampler.take_main_readings(ad_playing)
+            elif not ad_playing and video_playing != 0:
+                readings = [(float(snapshot["buffer"]), video_played_in_seconds, snapshot["resolution"])]
+            else:
+                readings = []
+            metrics.samples_total.inc(len(readings), video="main")
+            # ads that started and ended between two probes are only seen by the ad observer.
+            # they are recorded without any buffer readings of their own
+            for ad_id, boundaries in transitions.take_missed_ads():
+                print("Missed Ad ID: ", ad_id)
+                metrics.ads_total.inc(position="missed")
+                ad_just_played = True
+                buffer_size_with_ad.append(
+                    [
+                        ad_id,
+                        last_buffer_read if last_buffer_read is not None else 0.0,
+                        boundaries["played"],
+                    ]
                 )
-                # checking if the ad is playing or not
-                ad_playing = driver.execute_script(
-                    "return document.getElementsByClassName('ad-showing').length"
+                # -1 since skippability could not be probed, -2 as for an unreadable skip duration
+                name = register_ad(video_info_details, ad_buffer_information, ad_id, -1, -2, [])
+                if name == ad_id:
+                    unique_ad_count += 1
+                writer.write(
+                    "ad",
+                    name=name,
+                    ad_id=ad_id,
+                    pre_ad_buffer=buffer_size_with_ad[-1][1],
+                    played=buffer_size_with_ad[-1][2],
+                    skippable=-1,
+                    skip_duration=-2,
+                    buffer=[],
+                    start_t=boundaries["start_t"],
+                    end_t=boundaries["end_t"],
                 )
-                # getting the duration of the video played in seconds
-                video_played_in_seconds = driver.execute_script(
-                    'return document.getElementById("movie_player").getCurrentTime()'
+            for current_buffer, played_in_seconds, res in readings:
+                # counting the resolution towards the most frequent one
+                main_resolution.add(res)
+
+                # Actual Buffer
+                # [ID,Last Buffer Before Ad, How much video played when ad played, Buffer after ad finished]
+                if ad_just_played:
+                    for i in range(len(buffer_size_with_ad)):
+                        # entries without their fourth field yet are the ads that have just played
+                        if len(buffer_size_with_ad[i]) <= 3:
+                            buffer_size_with_ad[i].append(current_buffer)
+                            writer.write("post_ad_buffer", ad_id=buffer_size_with_ad[i][0], buffer=current_buffer)
+
+                    ad_just_played = False
+
+                # Tuple (Buffer, Video Played in seconds timestamp)
+                last_buffer_read = (current_buffer, played_in_seconds)
+                # Current Buffer/(Video Left)
+                try:
+                    # get the ratio of the total buffer collected so far to the video left to stream
+                    # in seconds
+                    buffer_ratio = float(
+                        current_buffer
+                        / (video_duration_in_seconds - played_in_seconds)
+                    )
+                except:
+                    # if an error during collection, set the buffer_ratio to 0 (reset)
+                    buffer_ratio = 0
+
+                # streaming the reading along with the resolution and buffer ratio at that time
+                writer.write(
+                    "buffer",
+                    buffer=current_buffer,
+                    played=played_in_seconds,
+                    res=res,
+                    ratio=buffer_ratio,
                 )
-                # if the ad is playing -- mid-roll ad
-                if ad_playing:
-                    # ad_just_played gets updated to True
-                    ad_just_played = True
-                    print("Ad Playing")
+            if sampler is not None:
+                for event in sampler.take_events():
+                    writer.write(
+                        "event",
+                        event=event["kind"],
+                        **{key: value for key, value in event.items() if key != "kind"}
+                    )
+            if capture is not None and (
+                video_playing == 0 or time.monotonic() - last_capture_drain >= CAPTURE_DRAIN_INTERVAL
+            ):
+                # segments downloaded since the last drain (including those of any ad)
+                last_capture_drain = time.monotonic()
+                for segment in capture.drain():
+                    writer.write("segment", **segment)
+            if accelerator is not None:
+                accelerator.advance(snapshot)
+            # if the ad is playing -- mid-roll ad
+            if ad_playing:
+                # ad_just_played gets updated to True
+                ad_just_played = True
+                print("Ad Playing")
+                # a pod of ads is recorded one ad at a time
+                while ad_playing:
                     # fetch all buffer-related information regarding ad being played currently
-                    ad_id, skippable, ad_buf_details, skip_duration = record_ad_buffer(
-                        driver, movie_id
+                    ad_id, skippable, ad_buf_details, skip_duration, boundaries = yield from record_ad_buffer(
+                        driver, movie_id, snapshot, sampler, transitions, policy
                     )
                     # if the ad is not skippable
                     if not (skippable):
@@ -426,81 +1285,93 @@ def driver_code(driver: webdriver.Chrome):
                         " Skip Duration: ",
                         skip_duration,
                     )
-                    # if the ad id is not the same as the movie id fetched earlier
+                    # if the ad id is not the same as the movie id fetched earlier. every ad the
+                    # observer saw ending is a separate impression, even if it has the same id as
+                    # the ad before it
                     if (str(ad_id).strip()) != (str(movie_id).strip()):
-                        # if the ad is not equal to the recent-most ad played
-                        if ad_id != previous_ad_id:
-                            print("Ad id is: ", ad_id)
-                            # update the previous_ad_id to the id of the new ad
-                            previous_ad_id = ad_id
-
-                            # Appends the last recorded main_video_buffer when ad was played.
-                            if len(actual_buffer_reads) >= 1:
-                                buffer_size_with_ad.append(
-                                    [
-                                        ad_id,
-                                        actual_buffer_reads[-1],
-                                        video_played_in_seconds,
-                                    ]
-                                )  # Append last buffer value to keep track.
-                            else:
-                                # a buffer value of 0.0 signifies that the ad was at the start
-                                buffer_size_with_ad.append(
-                                    [ad_id, 0.0, video_played_in_seconds]
-                                )  # Ad was at the start.
-
-                            # Ads video information to document.
-                            # this if statement checks if the ad being played is a unique ad or not
-                            # i.e., it is present in the video_info_details list. if already present,
-                            # this implies the ad is not unique
-                            if ad_id not in video_info_details.keys():
-                                # if the ad is unique, increment the unique_ad_count
-                                unique_ad_count += 1
-                                # store the details of the ad in the video_info_details dictionary
-                                video_info_details[ad_id] = {
-                                    "Count": 1,
-                                    "Skippable": skippable,
-                                    "SkipDuration": skip_duration,
-                                }
-                                # store the details of the ad buffer in the dictionary
-                                to_write = {
-                                    "buffer": ad_buf_details,
-                                }
-                                # save the buffer-details with the relevant ad's id
-                                ad_buffer_information[ad_id] = to_write
-                                # print a confirmation message to the terminal highlighting
-                                # that all information regarding the current ad has been
-                                # collected
-                                print(
-                                    "Advertisement "
-                                    + str(unique_ad_count)
-                                    + " Data collected."
-                                )
-                            else:
-                                # if the ad is not unique
-                                # get the count of the ad using the ad_id as a key -- same ad
-                                # being displayed more than once in the main video
-                                current_value = video_info_details[ad_id]["Count"]
-                                # increment the count of the ad
-                                video_info_details[ad_id]["Count"] = current_value + 1
-                                # create a new formatted name with the ad id along with its
-                                # count appended
-                                name = (
-                                    ad_id
-                                    + "_"
-                                    + str(video_info_details[ad_id]["Count"])
-                                )
-                                # buffer details of the current ad
-                                to_write = {
-                                    "buffer": ad_buf_details,
-                                }
-                                # appending to the relevant maintained data structure
-                                ad_buffer_information[name] = to_write
-                                print("Repeated Ad! Information Added!")
-                # all data regarding all ads and the main video has been collected
-                # now is the time to write all gathered data to the relevant text files
-                elif video_playing == 0:
-                    # Video has ended
+                        print("Ad id is: ", ad_id)
+                        # the played seconds of the main video when the ad started
+                        played = boundaries["played"]
+                        if played is None:
+                            played = video_played_in_seconds
+                        metrics.ads_total.inc(position="mid_roll")
+                        metrics.samples_total.inc(len(ad_buf_details), video="ad")
+
+                        # Appends the last recorded main_video_buffer when ad was played.
+                        if last_buffer_read is not None:
+                            buffer_size_with_ad.append(
+                                [
+                                    ad_id,
+                                    last_buffer_read,
+                                    played,
+                                ]
+                            )  # Append last buffer value to keep track.
+                        else:
+                            # a buffer value of 0.0 signifies that the ad was at the start
+                            buffer_size_with_ad.append(
+                                [ad_id, 0.0, played]
+                            )  # Ad was at the start.
+
+                        # Ads video information to document.
+                        name = register_ad(
+                            video_info_details, ad_buffer_information, ad_id, skippable, skip_duration, ad_buf_details
+                        )
+                        if name == ad_id:
+                            # if the ad is unique, increment the unique_ad_count
+                            unique_ad_count += 1
+                            # print a confirmation message to the terminal highlighting
+                            # that all information regarding the current ad has been
+                            # collected
+                            print(
+                                "Advertisement "
+                                + str(unique_ad_count)
+                                + " Data collected."
+                            )
+                        else:
+                            print("Repeated Ad! Information Added!")
+                        # streaming the ad impression as soon as it is over
+                        writer.write(
+                            "ad",
+                            name=name,
+                            ad_id=ad_id,
+                            pre_ad_buffer=buffer_size_with_ad[-1][1],
+                            played=buffer_size_with_ad[-1][2],
+                            skippable=skippable,
+                            skip_duration=skip_duration,
+                            buffer=ad_buf_details,
+                            start_t=boundaries["start_t"],
+                            end_t=boundaries["end_t"],
+                        )
+                    # probing the player again, the next ad of a pod may be showing
+                    snapshot = take_snapshot(driver, sampler)
+                    policy.observe(snapshot)
+                    transitions.feed(snapshot)
+                    ad_playing = snapshot["ad_showing"]
+            # all data regarding all ads and the main video has been collected
+            # now is the time to write all gathered data to the relevant text files
+            elif video_playing == 0:
+                # Video has ended
+                if last_buffer_read is None:
+                    # the panel never gave a buffer reading of the main video (the sampler leaves those out)
+                    raise RuntimeError("no buffer reading of the main video was collected")
+                # fetching the resolution of the main video
+                Main_res = main_resolution.mode
+                # storing the captured information regarding the main video in the
+                # video_info_details dictionary
+                video_info_details["Main_Video"] = {
+                    "Url": url,
+                    "Total Duration": video_duration_in_seconds,
+                    "UniqueAds": unique_ad_count,
+                    "Resolution": Main_res,
+                    "Sampling": policy.details(),
+                    "Accelerated": accelerator.details() if accelerator is not None else False,
+                }
+                # the summary record marks the stream of the video as complete
+                writer.write("summary", **video_info_details["Main_Video"])
+                writer.sync()
+                # with a campaign store everything has already been recorded, otherwise
+                # the files of the video are written now
+                if store is None:
                     # this text file stores generic detauls regarding the main video
                     file_dir = new_dir + "/stream_details.txt"
                     # this file stores the details regarding the buffer captured at every second
@@ -511,110 +1382,273 @@ def driver_code(driver: webdriver.Chrome):
                     # this file saves details regarding the buffer captured of the advertisement
                     file_dir_five = new_dir + "/BufferAdvert.txt"
                     file_dir_six = new_dir + "/AdvertBufferState.txt"
-                    # fetching the resolution of the main video
-                    Main_res = max(main_res_all, key=main_res_all.count)
-                    # storing the captured information regarding the main video in the
-                    # video_info_details dictionary
-                    video_info_details["Main_Video"] = {
-                        "Url": url,
-                        "Total Duration": video_duration_in_seconds,
-                        "UniqueAds": unique_ad_count,
-                        "Resolution": Main_res,
-                    }
+                    # this file stores the stall events and drop counts of the in-page sampler
+                    file_dir_seven = new_dir + "/sampler_details.txt"
+                    # this file stores the media segments downloaded while the video played
+                    file_dir_eight = new_dir + "/segment_details.txt"
                     # writing data to the respective files
                     # using orjson instead of json since it is vectorized
-                    # and helps in faster writing to the files
-                    with open(file_dir, "wb+") as f:
-                        f.write(orjson.dumps(video_info_details))
-
-                    with open(file_dir_two, "wb+") as f:
-                        f.write(orjson.dumps(actual_buffer_reads))
-
-                    with open(file_dir_three, "wb+") as f:
-                        f.write(orjson.dumps(error_list))
-
-                    with open(file_dir_five, "wb+") as f:
-                        f.write(orjson.dumps(buffer_size_with_ad))
-
-                    with open(file_dir_six, "wb+") as f:
-                        f.write(orjson.dumps(ad_buffer_information))
-                    # video info details set to empty and now the loop is ready for the next iteration
-                    video_info_details = {}
-                    unique_ad_count = 0
-                    # printing a confirmation message to the terminal
-                    print("Video Finished and details written to files!")
-                    break
-                else:
-                    # Video is playing normally
-                    # Record Resolution at each second
-                    res = driver.execute_script(
-                        'return document.getElementsByClassName("html5-video-info-panel-content")[0].children[2].children[1].textContent.replace(" ","").split("/")[0]'
-                    )
-                    # creating a tuple with the resolution at a given second and the time (in seconds) at which the
-                    # resolution is captured at
-                    new_data_point = (res, video_played_in_seconds)
-                    # appending the data point to the main list
-                    main_res_all.append(res)
-                    # appending the video resolution datapoint to the relevant data structure
-                    vid_res_at_each_second.append(new_data_point)
-
-                    # Get Current Buffer of the main video using Selenium and JS
-                    current_buffer = float(
-                        driver.execute_script(
-                            'return document.getElementsByClassName("html5-video-info-panel-content")[0].children[10].children[1].textContent.split(" ")[1]'
+                    # and helps in faster writing to the files. the buffer readings and
+                    # sampler events of this attempt are read back from the stream one record at a time
+                    write_json_file(file_dir, video_info_details)
+
+                    if WRITE_JSON_TRACES:
+                        write_json_array(
+                            file_dir_two,
+                            (
+                                (record["buffer"], record["played"])
+                                for record in read_records(writer.path, "buffer", writer.start)
+                            ),
                         )
-                    )
-                    # Actual Buffer
-                    # [ID,Last Buffer Before Ad, How much video played when ad played, Buffer after ad finished]
-                    if ad_just_played:
-                        for i in range(len(buffer_size_with_ad)):
-                            if len(buffer_size_with_ad[i]) <= 2:
-                                buffer_size_with_ad[i].append(current_buffer)
-
-                        ad_just_played = False
-
-                    # Tuple (Buffer, Video Played in seconds timestamp)
-                    actual_buffer_reads.append(
-                        (current_buffer, video_played_in_seconds))
-                    # Current Buffer/(Video Left)
-                    try:
-                        # get the ratio of the total buffer collected so far to the video left to stream
-                        # in seconds
-                        buffer_ratio = float(
-                            current_buffer
-                            / (video_duration_in_seconds - video_played_in_seconds)
+
+                    write_json_file(file_dir_three, error_list)
+
+                    write_json_file(file_dir_five, buffer_size_with_ad)
+
+                    if WRITE_JSON_TRACES:
+                        write_json_file(file_dir_six, ad_buffer_information)
+
+                    if WRITE_COLUMNAR_TRACES:
+                        # imported here so that numpy is only needed when the columnar output is on
+                        import columnar
+
+                        columnar.write_video_columns(
+                            new_dir,
+                            (
+                                (record["buffer"], record["played"], record["res"])
+                                for record in read_records(writer.path, "buffer", writer.start)
+                            ),
+                            ad_buffer_information,
                         )
-                    except:
-                        # if an error during collection, set the buffer_ratio to 0 (reset)
-                        buffer_ratio = 0
 
-                    buffer_list.append(buffer_ratio)
-                    previous_ad_id = url.split("=")[1]
-        except Exception as e:
-            # if an error occurs because of a corrupted Video URL
-            # print the error to the terminal
-            print(e)
-            print("Error occured while collecting data! Moving to next video!")
-            print("Video: ", url)
-            # store the faulty url to the designated text files
-            with open("faultyVideos.txt", "a") as f:
-                to_write = str(url) + "\n"
-                f.write(to_write)
-            # continue to the next url in list_of_urls maintained
+                    if sampler is not None:
+                        events = [
+                            {key: value for key, value in record.items() if key != "kind"}
+                            for record in read_records(writer.path, "event", writer.start)
+                        ]
+                        write_json_file(file_dir_seven, sampler.details(events))
+
+                    if capture is not None and WRITE_JSON_TRACES:
+                        write_json_array(
+                            file_dir_eight,
+                            (
+                                {key: value for key, value in record.items() if key != "kind"}
+                                for record in read_records(writer.path, "segment", writer.start)
+                            ),
+                        )
+                # video info details set to empty and now the loop is ready for the next iteration
+                video_info_details = {}
+                unique_ad_count = 0
+                # printing a confirmation message to the terminal
+                print("Video Finished and details written to files!")
+                return True
+    except Exception as e:
+        # the error is recorded along with the samples before the caller gets to see it
+        error_list.append(repr(e))
+        writer.write("error", type=type(e).__name__, message=str(e))
+        raise
+    finally:
+        writer.close()
+
+
+def collect_video(driver: webdriver.Chrome, url, new_dir=None, store=None):
+    '''
+    This function runs collect_video_steps to completion on the calling thread,
+    sleeping whenever it asks to wait, and returns its result. the network trace
+    of the session (if it has one) is applied along the way
+    '''
+    steps = network_profiles.shape_steps(driver, collect_video_steps(driver, url, new_dir, store))
+    try:
+        while True:
+            time.sleep(next(steps))
+    except StopIteration as stop:
+        count_video(stop.value)
+        return stop.value
+    except Exception as e:
+        count_video(None, e)
+        raise
+
+
+def count_video(collected, e=None):
+    # counting the outcome of a video (and the type of the error it failed with)
+    if e is not None:
+        metrics.videos_total.inc(outcome="failed")
+        metrics.failures_total.inc(exception=type(e).__name__)
+    else:
+        metrics.videos_total.inc(outcome="done" if collected else "skipped")
+
+
+def record_faulty_video(url, e, faulty_file="faultyVideos.txt"):
+    # if an error occurs because of a corrupted Video URL
+    # print the error to the terminal
+    print(e)
+    print("Error occured while collecting data! Moving to next video!")
+    print("Video: ", url)
+    # store the faulty url to the designated text files
+    with open(faulty_file, "a") as f:
+        to_write = str(url) + "\n"
+        f.write(to_write)
+
+
+def prepare_campaign(store, list_of_urls, restart=True):
+    '''
+    This function adds the urls to the manifest of the campaign store, after a
+    pre-flight pass (see preflight.py) has marked the ones that are too long or
+    unavailable as skipped, so that no instrumented session is spent on them.
+    urls the manifest already has are left out of the pre-flight pass. restart
+    is off for urls added while the campaign is running (see feed_campaign)
+    '''
+    if restart:
+        manifest.prepare(store)
+    known = manifest.known(store, list_of_urls)
+    list_of_urls = [url for url in list_of_urls if url not in known]
+    skipped = preflight.check_urls(list_of_urls, store)
+    for url, reason in skipped.items():
+        print("Video Skipped in Pre-flight: ", url, reason)
+    manifest.add(store, list_of_urls, skipped)
+
+
+def feed_campaign(store_path, source, done=None, batch_size=FEED_BATCH):
+    '''
+    This function adds the urls of a source (see url_sources.py) to the manifest
+    of the campaign store at store_path, batch_size of them at a time, so a source
+    of millions of urls is never held in memory and workers can collect the first
+    batches while the next ones are read. the manifest keeps urls it already has
+    from being added twice. done (a threading or multiprocessing Event) is set
+    once the source runs out, a watched directory never does. the manifest has
+    to be prepared before the workers start, it is not restarted here
+    '''
+    # the feeder has its own connection, it runs next to the workers
+    store = campaign_store.connect(store_path)
+    try:
+        for batch in url_sources.batches(source, batch_size):
+            prepare_campaign(store, batch, restart=False)
+    finally:
+        store.close()
+        if done is not None:
+            done.set()
+
+
+def collect_campaign(pool: DriverPool, store, faulty_file="faultyVideos.txt", metrics_file=METRICS_FILE, feeding=None):
+    '''
+    This function keeps collecting the urls it claims from the manifest of the
+    campaign store (see manifest.py) into that store, until no url is left to
+    collect or retry. failed urls are retried after their backoff has passed.
+    every video is collected on a session taken from the pool and handed back
+    to it afterwards, so a session left broken by a failure is replaced. the
+    metrics are written to metrics_file (if any) after every video. while a
+    source is still being fed into the manifest (feeding is the done Event of
+    feed_campaign, not set yet) running out of urls only means waiting for more
+    '''
+    while True:
+        url = manifest.claim(store)
+        if url is None:
+            wait = manifest.seconds_until_retry(store)
+            if wait is None and feeding is not None and not feeding.is_set():
+                time.sleep(IDLE_POLL_INTERVAL)
+                continue
+            if wait is None:
+                return
+            # only failed urls waiting for their backoff are left
+            time.sleep(wait)
             continue
+        driver = pool.acquire()
+        try:
+            collected = collect_video(driver, url, store=store)
+        except Exception as e:
+            pool.release(driver, failed=True)
+            manifest.fail(store, url, repr(e))
+            record_faulty_video(url, e, faulty_file)
+        else:
+            pool.release(driver)
+            manifest.finish(store, url, collected)
+        if metrics_file:
+            metrics.write_textfile(metrics_file)
+
+
+def driver_code(pool: DriverPool):
+    # this list comprises of the URLs that were scraped off of the trending
+    # pages using the webscraper.py file
+    list_of_urls = [
+        # "https://www.youtube.com/watch?v=ec1vg-gv9Dk",
+        # 'https://www.youtube.com/watch?v=0OCUjgwOua8',
+        # 'https://www.youtube.com/watch?v=8ogj6nRLhNg',
+        # 'https://www.youtube.com/watch?v=5T4QIbOe7Vw',
+        # 'https://www.youtube.com/watch?v=XX7fJZBZtoE',
+        # 'https://www.youtube.com/watch?v=gsop4R3-Ci8',
+    ]
+    # all the videos are recorded into a single campaign store, keyed by their movie_id.
+    # its manifest remembers which urls are done, so a restarted run skips them
+    store = campaign_store.connect(CAMPAIGN_STORE)
+    if URL_SOURCE is None:
+        prepare_campaign(store, list_of_urls)
+        collect_campaign(pool, store)
+        store.close()
+        return
+    # the source is fed into the manifest from a thread while the videos are collected,
+    # a watched directory keeps the campaign running until it is stopped
+    manifest.prepare(store)
+    done = threading.Event()
+    source = url_sources.open_source(URL_SOURCE, follow=True)
+    threading.Thread(target=feed_campaign, args=(CAMPAIGN_STORE, source, done), daemon=True).start()
+    collect_campaign(pool, store, feeding=done)
+    store.close()
+
+
+def forget_session(driver: webdriver.Chrome):
+    # dropping everything kept about a session that has been quit
+    auto_play_toggled_sessions.discard(driver.session_id)
+    network_profiles.session_traces.pop(driver.session_id, None)
+    network_profiles.session_conditions.pop(driver.session_id, None)
+    # the copy of the profile template the session was launched with
+    browser_profile.remove_session_profile(driver.session_id)
+
+
+def create_driver(
+    latency=latencyInMilliseconds,
+    download_limit=downloadLimitMbps,
+    upload_limit=uploadLimitMbps,
+    capture_network=CAPTURE_NETWORK,
+    dense=DENSE_MODE,
+    profile_template=PROFILE_TEMPLATE,
+    trace=None,
+):
+    '''
+    This function spawns an instance of chrome driver with the mobile emulation
+    options and throttles its network to the given conditions. with capture_network
+    the session logs its network events for NetworkCapture, and with dense it is
+    launched in the dense mode of browser_profile.py. if a trace of time-varying
+    conditions is given (see network_profiles.py) it replaces the fixed conditions
+    '''
+    options = chrome_options
+    if dense:
+        options = dense_options(chrome_options, profile_template)
+    if capture_network:
+        # the shared options are left untouched for sessions without the capture, and
+        # the dense ones (if any) are kept
+        options = copy.deepcopy(options)
+        enable_logging(options)
+    # creating an instance of chrome driver
+    driver = webdriver.Chrome(options=options)
+    # a copy of the profile template is removed once the session is forgotten
+    profile_dir = browser_profile.profile_dir_of(options)
+    if profile_dir is not None:
+        browser_profile.session_profiles[driver.session_id] = profile_dir
+    if trace:
+        # the first step is applied straight away, the rest while each video plays
+        network_profiles.session_traces[driver.session_id] = network_profiles.NetworkTrace(trace)
+        network_profiles.session_traces[driver.session_id].apply(driver)
+    else:
+        # throttling the network by setting all manual conditions
+        network_profiles.apply_conditions(driver, latency, download_limit, upload_limit)
+    # every WebDriver command of the session is timed from now on
+    return metrics.instrument_driver(driver)
 
 
 # DRIVER CODE
 if __name__ == '__main__':
-    # creating an instance of chrome driver
-    driver = webdriver.Chrome(options=chrome_options)
-    # throttling the network by setting all manual conditions
-    driver.set_network_conditions(
-        offline=False,
-        latency=latencyInMilliseconds,
-        download_throughput=downloadLimitMbps * 125000,  # Mbps to bytes per second
-        upload_throughput=uploadLimitMbps * 125000,  # Mbps to bytes per second
-    )
-    # quitting the driver once done
-    driver_code(driver)
-    driver.quit()
+    # a pool of warm chrome sessions with the network throttled, recycled every few videos
+    pool = DriverPool(create_driver, forget_session)
+    driver_code(pool)
+    # quitting the drivers once done
+    pool.close()
@@ -0,0 +1,345 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+
+import orjson
+
+from aggregates import RunningMode
+from campaign_store import VideoRecorder
+from sample_writer import STREAM_FILE, last_attempt
+
+# the ad catalog is one sqlite database shared by every campaign. every ad impression
+# of a completed video is a row of impressions, with a summary of its buffer readings.
+# the readings themselves are not copied: they stay where the campaign keeps them (the
+# ad_samples of its store, or the stream of the video, see readings). ads keeps the
+# aggregates of every ad id, refreshed whenever one of its impressions changes
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ads (
+    ad_id TEXT PRIMARY KEY,
+    impressions INTEGER,
+    videos INTEGER,
+    campaigns INTEGER,
+    skippable INTEGER,
+    skip_duration INTEGER,
+    mean_buffer REAL,
+    first_seen REAL,
+    last_seen REAL
+);
+CREATE TABLE IF NOT EXISTS impressions (
+    id INTEGER PRIMARY KEY,
+    ad_id TEXT,
+    campaign TEXT,
+    movie_id TEXT,
+    name TEXT,
+    skippable INTEGER,
+    skip_duration INTEGER,
+    played REAL,
+    pre_ad_buffer REAL,
+    post_ad_buffer REAL,
+    start_t REAL,
+    end_t REAL,
+    samples INTEGER,
+    min_buffer REAL,
+    mean_buffer REAL,
+    max_buffer REAL,
+    last_buffer REAL,
+    resolution TEXT,
+    accelerated INTEGER,
+    store_impression INTEGER,
+    recorded_at REAL
+);
+CREATE INDEX IF NOT EXISTS impressions_ad ON impressions (ad_id);
+CREATE INDEX IF NOT EXISTS impressions_video ON impressions (movie_id);
+CREATE INDEX IF NOT EXISTS impressions_campaign_video ON impressions (campaign, movie_id);
+"""
+
+# how long a writer waits for another writer to release the catalog, in milliseconds
+BUSY_TIMEOUT_MS = 30000
+
+# the columns of impressions filled from an ad record, in order
+IMPRESSION_COLUMNS = (
+    "ad_id", "campaign", "movie_id", "name", "skippable", "skip_duration", "played",
+    "pre_ad_buffer", "post_ad_buffer", "start_t", "end_t", "samples", "min_buffer",
+    "mean_buffer", "max_buffer", "last_buffer", "resolution", "accelerated", "store_impression",
+    "recorded_at",
+)
+
+
+def connect(path):
+    '''
+    This function opens a connection to the ad catalog at path, creating the
+    tables if needed. like the campaign store it is in WAL mode, so the workers
+    of several campaigns can add to it while it is being queried
+    '''
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA busy_timeout=" + str(BUSY_TIMEOUT_MS))
+    connection.executescript(SCHEMA)
+    connection.commit()
+    return connection
+
+
+def campaign_of(store=None, new_dir=None):
+    # a campaign is named after its store, or after the directory its video directories are in
+    if store is not None:
+        return store.execute("PRAGMA database_list").fetchone()[2]
+    if new_dir is not None:
+        return str(Path(new_dir).resolve().parent)
+    return None
+
+
+def summarize(fields, campaign, movie_id, accelerated=False, store_impression=None):
+    '''
+    This function turns an ad record (as written by the collector) into a row of
+    impressions. store_impression is the id of the impression in the campaign
+    store it was recorded into (None for a campaign written to files)
+    '''
+    buffers = []
+    resolution = RunningMode()
+    for buffer, _, res in fields["buffer"]:
+        buffers.append(buffer)
+        resolution.add(res)
+    pre_ad_buffer = fields["pre_ad_buffer"]
+    if isinstance(pre_ad_buffer, (list, tuple)):
+        # the last (buffer, played seconds) reading of the main video before the ad
+        pre_ad_buffer = pre_ad_buffer[0]
+    row = {
+        "ad_id": fields["ad_id"],
+        "campaign": campaign,
+        "movie_id": movie_id,
+        "name": fields["name"],
+        "skippable": fields["skippable"],
+        "skip_duration": fields["skip_duration"],
+        "played": fields["played"],
+        "pre_ad_buffer": pre_ad_buffer,
+        "post_ad_buffer": None,
+        "start_t": fields.get("start_t"),
+        "end_t": fields.get("end_t"),
+        "samples": len(buffers),
+        "min_buffer": min(buffers) if buffers else None,
+        "mean_buffer": sum(buffers) / len(buffers) if buffers else None,
+        "max_buffer": max(buffers) if buffers else None,
+        "last_buffer": buffers[-1] if buffers else None,
+        "resolution": resolution.mode,
+        "accelerated": int(bool(accelerated)),
+        "store_impression": store_impression,
+        "recorded_at": time.time(),
+    }
+    return row
+
+
+def replace_video(connection, campaign, movie_id, impressions):
+    '''
+    This function replaces the impressions of a video of a campaign with the given
+    rows and refreshes the ads they (and the impressions they replace) belong to,
+    in a single transaction
+    '''
+    ad_ids = {row[0] for row in connection.execute(
+        "SELECT DISTINCT ad_id FROM impressions WHERE campaign IS ? AND movie_id = ?", (campaign, movie_id)
+    )}
+    connection.execute("DELETE FROM impressions WHERE campaign IS ? AND movie_id = ?", (campaign, movie_id))
+    for row in impressions:
+        connection.execute(
+            "INSERT INTO impressions (" + ", ".join(IMPRESSION_COLUMNS) + ") VALUES ("
+            + ", ".join("?" * len(IMPRESSION_COLUMNS)) + ")",
+            [row[column] for column in IMPRESSION_COLUMNS],
+        )
+        ad_ids.add(row["ad_id"])
+    for ad_id in ad_ids:
+        refresh_ad(connection, ad_id)
+    connection.commit()
+
+
+def refresh_ad(connection, ad_id):
+    '''
+    This function works out the aggregates of an ad again from its impressions
+    (found through their ad_id index): the most common skippability among the
+    impressions where it could be probed, and the longest skip offset of its
+    skippable impressions (999 and -2 are the collector's sentinels, left out)
+    '''
+    connection.execute("DELETE FROM ads WHERE ad_id = ?", (ad_id,))
+    connection.execute(
+        "INSERT INTO ads SELECT ad_id, COUNT(*), COUNT(DISTINCT movie_id), COUNT(DISTINCT campaign), "
+        "(SELECT skippable FROM impressions WHERE ad_id = ? AND skippable >= 0 "
+        "GROUP BY skippable ORDER BY COUNT(*) DESC, MIN(id) LIMIT 1), "
+        "MAX(CASE WHEN skippable = 1 AND skip_duration >= 0 AND skip_duration < 999 THEN skip_duration END), "
+        "AVG(mean_buffer), MIN(recorded_at), MAX(recorded_at) "
+        "FROM impressions WHERE ad_id = ? GROUP BY ad_id",
+        (ad_id, ad_id),
+    )
+
+
+class CatalogWriter:
+    '''
+    This class wraps the writer of a video (a SampleWriter or a VideoRecorder) and
+    adds the ad impressions of the video to the ad catalog once the video is over.
+    every record goes on to the wrapped writer unchanged. the impressions are only
+    added when the summary record marks the video as complete, replacing those of
+    an earlier attempt at the same video, and are dropped if the video fails
+    '''
+
+    def __init__(self, writer, connection, movie_id, campaign=None):
+        self.writer = writer
+        self.connection = connection
+        self.movie_id = movie_id
+        self.campaign = campaign
+        self.accelerated = False
+        # the rows of every impression of the video so far
+        self.impressions = []
+        if isinstance(writer, VideoRecorder):
+            # the recorder has just deleted the impressions of any earlier attempt at the video
+            # from the store, and sqlite hands their ids out again, so the rows referring to
+            # them go as well (even if this attempt fails)
+            replace_video(connection, campaign, movie_id, [])
+
+    def __getattr__(self, name):
+        # path, flush and anything else of the wrapped writer
+        return getattr(self.writer, name)
+
+    def write(self, kind, **fields):
+        self.writer.write(kind, **fields)
+        if kind == "video":
+            self.accelerated = fields.get("accelerated", False)
+            self.impressions = []
+        elif kind == "ad":
+            self.impressions.append(
+                summarize(
+                    fields, self.campaign, self.movie_id, self.accelerated,
+                    # set by a VideoRecorder, a SampleWriter has none
+                    getattr(self.writer, "last_impression_id", None),
+                )
+            )
+        elif kind == "post_ad_buffer":
+            # the buffer of the main video after the ad, like VideoRecorder it goes to the
+            # latest impression of the ad
+            for row in reversed(self.impressions):
+                if row["ad_id"] == fields["ad_id"]:
+                    row["post_ad_buffer"] = fields["buffer"]
+                    break
+        elif kind == "summary":
+            replace_video(self.connection, self.campaign, self.movie_id, self.impressions)
+            self.impressions = []
+        elif kind == "error":
+            self.impressions = []
+
+    def sync(self):
+        self.writer.sync()
+
+    def close(self):
+        try:
+            self.writer.close()
+        finally:
+            self.connection.close()
+
+
+def impressions_of_ad(connection, ad_id):
+    # every impression of an ad across all campaigns, oldest first
+    return query(connection, "SELECT * FROM impressions WHERE ad_id = ? ORDER BY id", (ad_id,))
+
+
+def ads_on_video(connection, movie_id):
+    # every impression shown on a video, in every campaign it was collected in
+    return query(connection, "SELECT * FROM impressions WHERE movie_id = ? ORDER BY id", (movie_id,))
+
+
+def ad_details(connection, ad_id):
+    rows = query(connection, "SELECT * FROM ads WHERE ad_id = ?", (ad_id,))
+    return rows[0] if rows else None
+
+
+def readings(impression):
+    '''
+    This function returns the (buffer, played seconds, resolution) readings of an
+    impression (a row of impressions_of_ad or ads_on_video), read from where its
+    campaign keeps them: the ad_samples of its store, or the ad record of the last
+    completed attempt in the stream of its video. returns None if they are gone
+    '''
+    if impression["store_impression"] is not None:
+        if not os.path.exists(impression["campaign"]):
+            return None
+        store = sqlite3.connect(impression["campaign"])
+        try:
+            # the id may have been handed out again since, to an impression of another video
+            if store.execute(
+                "SELECT 1 FROM ad_impressions WHERE id = ? AND movie_id = ?",
+                (impression["store_impression"], impression["movie_id"]),
+            ).fetchone() is None:
+                return None
+            return [
+                list(row) for row in store.execute(
+                    "SELECT buffer, played, res FROM ad_samples WHERE impression_id = ? ORDER BY rowid",
+                    (impression["store_impression"],),
+                )
+            ]
+        finally:
+            store.close()
+    stream = Path(impression["campaign"]) / impression["movie_id"] / STREAM_FILE
+    if not stream.exists():
+        return None
+    for record in last_attempt(str(stream), completed=True):
+        if record["kind"] == "ad" and record["name"] == impression["name"]:
+            return record["buffer"]
+    return None
+
+
+def query(connection, sql, parameters=()):
+    cursor = connection.execute(sql, parameters)
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor]
+
+
+def import_directory(connection, root):
+    '''
+    This function adds the ad impressions of every video collected into a directory
+    before the catalog existed, read from the samples.ndjson stream of each of them
+    (only its last completed attempt, the one readings reads from too). returns
+    the number of videos added
+    '''
+    campaign = str(Path(root).resolve())
+    added = 0
+    for stream in sorted(Path(root).glob("*/" + STREAM_FILE)):
+        records = last_attempt(str(stream), completed=True)
+        if not records or records[0]["kind"] != "video":
+            continue
+        catalog = CatalogWriter(NullWriter(), connection, records[0]["movie_id"], campaign)
+        for record in records:
+            catalog.write(record.pop("kind"), **record)
+        added += 1
+    return added
+
+
+class NullWriter:
+    # a writer that drops every record, for CatalogWriter when importing old streams
+    def write(self, kind, **fields):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the cross-campaign ad catalog")
+    parser.add_argument("catalog", help="path of the ad catalog")
+    parser.add_argument("--ad", default=None, help="print every impression of this ad id")
+    parser.add_argument("--video", default=None, help="print every ad impression of this video id")
+    parser.add_argument("--import-dir", default=None, help="add the videos collected into this directory")
+    args = parser.parse_args()
+
+    connection = connect(args.catalog)
+    if args.import_dir:
+        print("Videos added:", import_directory(connection, args.import_dir))
+    if args.ad:
+        sys.stdout.write(orjson.dumps(ad_details(connection, args.ad)).decode() + os.linesep)
+        for row in impressions_of_ad(connection, args.ad):
+            sys.stdout.write(orjson.dumps(row).decode() + os.linesep)
+    if args.video:
+        for row in ads_on_video(connection, args.video):
+            sys.stdout.write(orjson.dumps(row).decode() + os.linesep)
+    connection.close()
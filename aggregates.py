@@ -0,0 +1,74 @@
+import math
+import array
+
+
+class RunningMode:
+    '''
+    This class keeps the most frequent of the values added to it so far, updated
+    as every value arrives, so that it is known at any time without going over
+    all the values again. ties go to the value that was seen first, like they do
+    with Counter.most_common and max(values, key=values.count)
+    '''
+
+    def __init__(self):
+        self.counts = {}
+        # index at which every value was first seen, to break ties
+        self.first_seen = {}
+        self.total = 0
+        self.mode = None
+        self.mode_count = 0
+
+    def add(self, value):
+        count = self.counts.get(value, 0) + 1
+        self.counts[value] = count
+        if value not in self.first_seen:
+            self.first_seen[value] = self.total
+        self.total += 1
+        if count > self.mode_count or (
+            count == self.mode_count and self.first_seen[value] < self.first_seen[self.mode]
+        ):
+            self.mode = value
+            self.mode_count = count
+
+
+class ReadingTrace:
+    '''
+    This class stores (buffer, played seconds, resolution) readings in packed
+    arrays instead of a list of tuples: two doubles and a two-byte resolution
+    code per reading. it is appended to and iterated over like the list it
+    replaces, and is encoded as that list when written out as json
+    '''
+
+    def __init__(self, readings=()):
+        self.buffer = array.array("d")
+        self.played = array.array("d")
+        self.res = array.array("H")
+        # resolution strings of the codes (code 0 is a missing resolution)
+        self.resolutions = [None]
+        self.codes = {None: 0}
+        self.extend(readings)
+
+    def append(self, reading):
+        buffer, played, res = reading
+        code = self.codes.get(res)
+        if code is None:
+            code = self.codes[res] = len(self.resolutions)
+            self.resolutions.append(res)
+        self.buffer.append(buffer)
+        # played seconds that could not be read are kept as NaN
+        self.played.append(float("nan") if played is None else played)
+        self.res.append(code)
+
+    def extend(self, readings):
+        for reading in readings:
+            self.append(reading)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __iter__(self):
+        for buffer, played, code in zip(self.buffer, self.played, self.res):
+            yield (buffer, None if math.isnan(played) else played, self.resolutions[code])
+
+    def to_json(self):
+        return [list(reading) for reading in self]
@@ -0,0 +1,216 @@
+import csv
+import sys
+import sqlite3
+import orjson
+import numpy as np
+
+# readings of the main video's buffer below this many seconds count as a low-buffer run
+LOW_BUFFER_SECONDS = 0.5
+
+
+def column(rows, index, dtype=np.float64):
+    # missing values (NULL in the store) come out as NaN in float columns
+    return np.array([row[index] for row in rows], dtype=dtype)
+
+
+def video_index(movie_ids, rows):
+    # movie_ids is sorted, so the index of the video of every row can be searched for
+    return np.searchsorted(movie_ids, np.array([row[0] for row in rows], dtype=object)).astype(np.int64)
+
+
+def load_campaign(store_path):
+    '''
+    This function loads every finished video of a campaign store into flat numpy
+    arrays, so that the metrics below can be computed for all the videos at once.
+    every row of the sample, ad and event arrays carries the index of its video in
+    "movie_ids" (the "video" arrays), and rows are grouped by video
+    '''
+    connection = sqlite3.connect(store_path)
+    done = "SELECT movie_id FROM videos WHERE status = 'done'"
+    movie_ids = np.array(
+        [row[0] for row in connection.execute(done + " ORDER BY movie_id")], dtype=object
+    )
+
+    campaign = {"movie_ids": movie_ids}
+
+    rows = connection.execute(
+        "SELECT movie_id, played, buffer, res FROM buffer_samples WHERE movie_id IN (" + done + ") ORDER BY movie_id, rowid"
+    ).fetchall()
+    res_labels, res_codes = np.unique(
+        np.array([str(row[3]) for row in rows], dtype=object), return_inverse=True
+    )
+    campaign["sample_video"] = video_index(movie_ids, rows)
+    campaign["sample_played"] = column(rows, 1)
+    campaign["sample_buffer"] = column(rows, 2)
+    campaign["sample_res"] = res_codes.astype(np.int64)
+    campaign["res_labels"] = res_labels
+
+    rows = connection.execute(
+        "SELECT movie_id, id, ad_id, played, pre_ad_buffer, post_ad_buffer FROM ad_impressions WHERE movie_id IN (" + done + ") ORDER BY movie_id, id"
+    ).fetchall()
+    campaign["ad_video"] = video_index(movie_ids, rows)
+    campaign["ad_id"] = np.array([row[2] for row in rows], dtype=object)
+    campaign["ad_played"] = column(rows, 3)
+    # pre_ad_buffer is either 0.0 (ad at the start) or the last (buffer, played seconds) reading
+    pre_ad_buffer = [orjson.loads(row[4]) for row in rows]
+    campaign["ad_pre_buffer"] = np.array(
+        [value[0] if isinstance(value, list) else value for value in pre_ad_buffer], dtype=np.float64
+    )
+    campaign["ad_post_buffer"] = column(rows, 5)
+    impression_ids = np.array([row[1] for row in rows], dtype=np.int64)
+
+    rows = connection.execute(
+        "SELECT impression_id, played, buffer FROM ad_samples WHERE impression_id IN (SELECT id FROM ad_impressions WHERE movie_id IN (" + done + ")) ORDER BY impression_id, rowid"
+    ).fetchall()
+    # impressions are ordered by video, so their ids are sorted before being searched
+    by_id = np.argsort(impression_ids)
+    campaign["ad_sample_ad"] = by_id[
+        np.searchsorted(impression_ids[by_id], column(rows, 0, np.int64))
+    ]
+    campaign["ad_sample_played"] = column(rows, 1)
+    campaign["ad_sample_buffer"] = column(rows, 2)
+
+    rows = connection.execute(
+        "SELECT movie_id, event, t FROM events WHERE movie_id IN (" + done + ") ORDER BY movie_id, t"
+    ).fetchall()
+    campaign["event_video"] = video_index(movie_ids, rows)
+    campaign["event_name"] = np.array([row[1] for row in rows], dtype=object)
+    # the in-page sampler timestamps events in milliseconds
+    campaign["event_t"] = column(rows, 2) / 1000.0
+
+    connection.close()
+    return campaign
+
+
+def per_video_mean(video, values, videos):
+    # mean of the finite values of every video, NaN for videos without any
+    finite = np.isfinite(values)
+    total = np.bincount(video[finite], weights=values[finite], minlength=videos)
+    count = np.bincount(video[finite], minlength=videos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count
+
+
+def ad_buffer_deltas(campaign):
+    '''
+    This function returns the main video's buffer right before and right after
+    every ad impression, looked up in the buffer trace by the played seconds at
+    which the ad was shown (this is what BufferAdvert.txt tries to capture)
+    '''
+    video, played, buffer = campaign["sample_video"], campaign["sample_played"], campaign["sample_buffer"]
+    before = np.full(len(campaign["ad_video"]), np.nan)
+    after = np.full(len(campaign["ad_video"]), np.nan)
+    if len(video) == 0:
+        return before, after
+    # a single sorted key orders the samples by video first and played seconds second
+    span = np.nanmax(np.abs(played)) + 1 if np.isfinite(played).any() else 1
+    order = np.lexsort((np.nan_to_num(played), video))
+    keys = video[order] * span + np.nan_to_num(played[order])
+    ad_keys = campaign["ad_video"] * span + np.nan_to_num(campaign["ad_played"])
+    position = np.searchsorted(keys, ad_keys, side="right") - 1
+
+    has_before = (position >= 0) & (video[order][np.clip(position, 0, None)] == campaign["ad_video"])
+    before[has_before] = buffer[order][position[has_before]]
+    next_position = np.clip(position + 1, 0, len(order) - 1)
+    has_after = (position + 1 < len(order)) & (video[order][next_position] == campaign["ad_video"])
+    after[has_after] = buffer[order][next_position[has_after]]
+    return before, after
+
+
+def ad_drain_rates(campaign):
+    '''
+    This function returns, for every ad impression, how many seconds of the main
+    video's buffer were drained per second of ad played
+    '''
+    ads = len(campaign["ad_video"])
+    ad, played = campaign["ad_sample_ad"], campaign["ad_sample_played"]
+    finite = np.isfinite(played)
+    first = np.full(ads, np.inf)
+    last = np.full(ads, -np.inf)
+    np.minimum.at(first, ad[finite], played[finite])
+    np.maximum.at(last, ad[finite], played[finite])
+    duration = last - first
+
+    before, after = ad_buffer_deltas(campaign)
+    # the post-ad buffer recorded during collection is preferred when there is one
+    after = np.where(np.isfinite(campaign["ad_post_buffer"]), campaign["ad_post_buffer"], after)
+    before = np.where(campaign["ad_pre_buffer"] > 0, campaign["ad_pre_buffer"], before)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(duration > 0, (before - after) / duration, np.nan)
+
+
+def video_metrics(campaign):
+    '''
+    This function computes the per-video metrics of a campaign loaded with
+    load_campaign. it returns a dictionary of arrays with one entry per video
+    (in the order of campaign["movie_ids"]), and "time_at_resolution", a
+    (videos x resolutions) array of the seconds played at each resolution in
+    campaign["res_labels"]
+    '''
+    videos = len(campaign["movie_ids"])
+    video, played = campaign["sample_video"], campaign["sample_played"]
+    buffer, res = campaign["sample_buffer"], campaign["sample_res"]
+    metrics = {"movie_id": campaign["movie_ids"]}
+    metrics["samples"] = np.bincount(video, minlength=videos)
+    metrics["mean_buffer"] = per_video_mean(video, buffer, videos)
+
+    # consecutive readings of the same video
+    same_video = video[1:] == video[:-1]
+    switched = same_video & (res[1:] != res[:-1])
+    metrics["resolution_switches"] = np.bincount(video[1:][switched], minlength=videos)
+
+    # the seconds played between two readings are counted towards the resolution of the first one
+    step = np.diff(played)
+    counted = same_video & np.isfinite(step) & (step > 0)
+    resolutions = len(campaign["res_labels"])
+    metrics["time_at_resolution"] = np.bincount(
+        (video[:-1] * resolutions + res[:-1])[counted],
+        weights=step[counted],
+        minlength=videos * resolutions,
+    ).reshape(videos, resolutions)
+
+    # a low-buffer run starts at every low reading whose previous reading (of the same video) was not low
+    low = buffer < LOW_BUFFER_SECONDS
+    run_start = low.copy()
+    run_start[1:] &= ~(low[:-1] & same_video)
+    metrics["low_buffer_runs"] = np.bincount(video[run_start], minlength=videos)
+
+    # a stall is a waiting event of the main video element, and lasts until the playing event after it
+    event_video, event_name, event_t = campaign["event_video"], campaign["event_name"], campaign["event_t"]
+    waiting = event_name == "waiting"
+    metrics["stalls"] = np.bincount(event_video[waiting], minlength=videos)
+    resumed = (
+        waiting[:-1]
+        & (event_name[1:] == "playing")
+        & (event_video[1:] == event_video[:-1])
+    )
+    metrics["stall_seconds"] = np.bincount(
+        event_video[:-1][resumed],
+        weights=(event_t[1:] - event_t[:-1])[resumed],
+        minlength=videos,
+    )
+
+    ad_video = campaign["ad_video"]
+    before, after = ad_buffer_deltas(campaign)
+    metrics["ads"] = np.bincount(ad_video, minlength=videos)
+    metrics["mean_ad_buffer_delta"] = per_video_mean(ad_video, after - before, videos)
+    metrics["mean_ad_drain_rate"] = per_video_mean(ad_video, ad_drain_rates(campaign), videos)
+    return metrics
+
+
+def write_report(campaign, metrics, out):
+    # one csv row per video, with a time_at_<resolution> column for every resolution seen
+    writer = csv.writer(out)
+    names = [name for name in metrics if name != "time_at_resolution"]
+    writer.writerow(names + ["time_at_" + str(label) for label in campaign["res_labels"]])
+    for index in range(len(campaign["movie_ids"])):
+        writer.writerow(
+            [metrics[name][index] for name in names]
+            + list(metrics["time_at_resolution"][index])
+        )
+
+
+if __name__ == '__main__':
+    # usage: python analysis.py campaign.sqlite3 > report.csv
+    campaign = load_campaign(sys.argv[1])
+    write_report(campaign, video_metrics(campaign), sys.stdout)
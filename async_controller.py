@@ -0,0 +1,236 @@
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import CollectionScript
+import campaign_store
+import manifest
+import metrics
+import network_profiles
+import preflight
+import url_sources
+from driver_pool import DriverPool
+
+# maximum number of selenium calls that are in flight at the same time. each call
+# only blocks a pool thread for a single round trip to chromedriver, so this can be
+# much smaller than the number of sessions
+MAX_BLOCKING_CALLS = 32
+# without a store, at most this many urls per session wait on the work queue, so a
+# source is only read as fast as the sessions get through it
+QUEUE_DEPTH = 4
+
+
+def advance(steps):
+    '''
+    This function runs a collect_video_steps generator up to its next wait and
+    returns (finished, value) where value is either the number of seconds to
+    wait or the final result. StopIteration cannot be passed through a future,
+    which is why it is turned into a return value here
+    '''
+    try:
+        return False, next(steps)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+async def collect_video(executor, driver, url, new_dir=None, store=None):
+    '''
+    This function is the asyncio counterpart of CollectionScript.collect_video.
+    every stretch of selenium calls between two waits runs on the executor, and
+    the waits themselves are awaited on the event loop, so a session only holds
+    a thread while it is actually talking to its browser
+    '''
+    loop = asyncio.get_running_loop()
+    steps = network_profiles.shape_steps(
+        driver, CollectionScript.collect_video_steps(driver, url, new_dir, store)
+    )
+    try:
+        while True:
+            finished, value = await loop.run_in_executor(executor, advance, steps)
+            if finished:
+                CollectionScript.count_video(value)
+                return value
+            await asyncio.sleep(value)
+    except Exception as e:
+        CollectionScript.count_video(None, e)
+        raise
+
+
+async def next_url(executor, work_queue, store, feeding=None):
+    '''
+    This function returns the next url a session should collect, or None when
+    there is nothing left. with a store the url is claimed from its manifest
+    (waiting out the backoff of failed urls, and for more urls while feeding, the
+    done Event of CollectionScript.feed_campaign, is not set), otherwise it is
+    taken off the queue, which gets a None for every session once the source is over
+    '''
+    loop = asyncio.get_running_loop()
+    if not store:
+        return await work_queue.get()
+    while True:
+        url = await loop.run_in_executor(executor, manifest.claim, store)
+        if url is not None:
+            return url
+        wait = await loop.run_in_executor(executor, manifest.seconds_until_retry, store)
+        if wait is None and feeding is not None and not feeding.is_set():
+            await asyncio.sleep(CollectionScript.IDLE_POLL_INTERVAL)
+            continue
+        if wait is None:
+            return None
+        await asyncio.sleep(wait)
+
+
+async def session(session_id, executor, work_queue, output_root, network_conditions, store_path=None, feeding=None):
+    '''
+    This function drives one browser at a time, taken from its own pool of warm
+    sessions (see driver_pool.py): it keeps collecting the urls it takes off
+    the work queue until the queue is empty. each session writes to its own
+    output directory (its own faultyVideos.txt, and one directory per video
+    unless the videos are recorded into the campaign store at store_path, whose
+    manifest then keeps track of the state of every url)
+    '''
+    loop = asyncio.get_running_loop()
+    output_dir = Path(output_root) / ("session_" + str(session_id))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # every session has its own connection, the store takes care of concurrent writers
+    store = campaign_store.connect(store_path) if store_path else None
+    pool = DriverPool(CollectionScript.create_driver, CollectionScript.forget_session, **network_conditions)
+    try:
+        while True:
+            url = await next_url(executor, work_queue, store, feeding)
+            if url is None:
+                break
+            new_dir = None if store else str(output_dir / url.split("=")[1])
+            driver = await loop.run_in_executor(executor, pool.acquire)
+            try:
+                collected = await collect_video(executor, driver, url, new_dir, store)
+            except Exception as e:
+                await loop.run_in_executor(executor, lambda: pool.release(driver, failed=True))
+                # the manifest writes may wait on the lock of the store (and the files are written
+                # to disk), so they run on the executor like every other blocking call
+                if store:
+                    await loop.run_in_executor(executor, manifest.fail, store, url, repr(e))
+                await loop.run_in_executor(
+                    executor, CollectionScript.record_faulty_video, url, e, str(output_dir / "faultyVideos.txt")
+                )
+            else:
+                await loop.run_in_executor(executor, pool.release, driver)
+                if store:
+                    await loop.run_in_executor(executor, manifest.finish, store, url, collected)
+            # all sessions share the metrics of the process
+            await loop.run_in_executor(
+                executor, metrics.write_textfile, str(Path(output_root) / CollectionScript.METRICS_FILE)
+            )
+    finally:
+        # quitting the drivers once done (or if the session was cancelled)
+        await loop.run_in_executor(executor, pool.close)
+        if store:
+            store.close()
+
+
+async def feed_queue(work_queue, list_of_urls, sessions):
+    '''
+    This function puts the urls of a source on the work queue of the sessions, a
+    batch at a time, after the pre-flight pass has filtered them and they have
+    been deduplicated in memory, and then a None for every session. the source
+    and the pre-flight pass are read on a thread of their own, since reading a
+    watched directory blocks until new urls show up
+    '''
+    loop = asyncio.get_running_loop()
+    batches = url_sources.batches(url_sources.dedupe(list_of_urls), CollectionScript.FEED_BATCH)
+    while True:
+        batch = await loop.run_in_executor(None, next, batches, None)
+        if batch is None:
+            break
+        skipped = await loop.run_in_executor(None, preflight.check_urls, batch)
+        for url in batch:
+            if url not in skipped:
+                # waits while the queue is full
+                await work_queue.put(url)
+    for _ in range(sessions):
+        await work_queue.put(None)
+
+
+async def run_campaign(list_of_urls, sessions, output_root="./campaign", network_conditions=None, store_path=None):
+    '''
+    This function collects all the given urls with the given number of concurrent
+    browser sessions, all driven from the current event loop. list_of_urls can be
+    any iterable of urls, such as a source of url_sources.py: it is read lazily
+    while the sessions collect. network_conditions is either a single dictionary of
+    create_driver arguments used by every session, or a list of them assigned to the
+    sessions in turn. if store_path is given every session records into that campaign
+    store, and urls that its manifest already has (done, skipped or queued) are not
+    collected again
+    '''
+    if not list_of_urls:
+        return
+    if isinstance(list_of_urls, (list, tuple)):
+        sessions = min(sessions, len(list_of_urls))
+    sessions = max(1, sessions)
+    if network_conditions is None:
+        network_conditions = {}
+    if isinstance(network_conditions, dict):
+        network_conditions = [network_conditions]
+
+    work_queue = asyncio.Queue(maxsize=sessions * QUEUE_DEPTH)
+    feeding = None
+    loop = asyncio.get_running_loop()
+    if store_path:
+        # the manifest is the work queue of the sessions, it is restarted before they start
+        # and fed on a thread of its own while they collect
+        store = campaign_store.connect(store_path)
+        manifest.prepare(store)
+        store.close()
+        feeding = threading.Event()
+        feeder = loop.run_in_executor(None, CollectionScript.feed_campaign, store_path, list_of_urls, feeding)
+    else:
+        feeder = feed_queue(work_queue, list_of_urls, sessions)
+
+    with ThreadPoolExecutor(max_workers=min(sessions, MAX_BLOCKING_CALLS)) as executor:
+        await asyncio.gather(
+            feeder,
+            *[
+                session(
+                    session_id,
+                    executor,
+                    work_queue,
+                    output_root,
+                    network_conditions[session_id % len(network_conditions)],
+                    store_path,
+                    feeding,
+                )
+                for session_id in range(sessions)
+            ]
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Collect a list of YouTube urls with many browsers from one event loop")
+    parser.add_argument("urls", help="file with one video url, id or json object per line, or a directory of such files")
+    parser.add_argument("--follow", action="store_true", help="keep watching the urls directory for new files until stopped")
+    parser.add_argument("--sessions", type=int, default=8, help="number of concurrent browser sessions")
+    parser.add_argument("--output", default="./campaign", help="directory the sessions write to")
+    parser.add_argument("--store", default=None, help="campaign store to record the videos into")
+    parser.add_argument("--dense", action="store_true", help="launch headless, trimmed down browsers (see browser_profile.py)")
+    parser.add_argument("--profile-template", default=None, help="chrome profile directory every dense browser starts from a copy of")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve the metrics on this port at /metrics")
+    parser.add_argument("--network", choices=sorted(network_profiles.PROFILES), default=None, help="network profile of the browsers (see network_profiles.py)")
+    args = parser.parse_args()
+
+    source = url_sources.open_source(args.urls, follow=args.follow)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    network_conditions = network_profiles.resolve(args.network) if args.network else {}
+    if args.dense:
+        network_conditions.update(dense=True, profile_template=args.profile_template)
+    asyncio.run(
+        run_campaign(
+            source,
+            sessions=args.sessions,
+            output_root=args.output,
+            network_conditions=network_conditions,
+            store_path=args.store,
+        )
+    )
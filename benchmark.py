@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+import tracemalloc
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+import CollectionScript
+import async_controller
+import preflight
+from browser_profile import session_memory_mb
+from replay import ReplayServer
+from sample_writer import read_records, write_json_file
+
+# where the results of every run are saved, one json file per run
+RESULTS_DIR = "benchmarks"
+# a number of concurrent sessions is over the ceiling of the host once the 95th
+# percentile of its probe latency goes above this many milliseconds
+CEILING_LATENCY_MS = 250
+
+
+def synthetic_scenario(video_id, duration=120, speed=10.0, ad_every=60, pod_size=2, ad_duration=15):
+    '''
+    This function returns a fake player scenario of the given length (in seconds
+    of video) with a pod of pod_size ads every ad_every seconds, starting with a
+    pre-roll pod. the main video keeps a steadily growing buffer
+    '''
+    trace = [[second, min(5.0 + second * 0.5, 60.0), "1280x720@30"] for second in range(0, int(duration), 5)]
+    ads = [
+        {
+            "at": at,
+            "pod": [
+                {"id": video_id + "ad" + str(at) + "_" + str(index), "duration": ad_duration, "skip_after": 5 if index % 2 == 0 else None}
+                for index in range(pod_size)
+            ],
+        }
+        for at in range(0, int(duration), ad_every)
+    ]
+    return {"video_id": video_id, "duration": duration, "speed": speed, "trace": trace, "ads": ads, "stalls": [[duration / 2, 2.0]]}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary(values):
+    # the summary statistics every timing of the suite is reported with
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+
+class TimedDriver:
+    '''
+    This class wraps a driver and times every script it runs, by probe: the
+    snapshot (with or without draining the sampler, and split by whether an ad
+    was showing, i.e., main loop vs record_ad_buffer), the condition waits, and
+    everything else. everything that is not a script call goes straight through
+    '''
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.timings = {}
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+    def record(self, probe, started):
+        self.timings.setdefault(probe, []).append((time.perf_counter() - started) * 1000)
+
+    def execute_script(self, script, *args):
+        started = time.perf_counter()
+        result = self.driver.execute_script(script, *args)
+        if script in (CollectionScript.SNAPSHOT_SCRIPT, CollectionScript.DRAIN_SCRIPT):
+            probe = "drain" if script == CollectionScript.DRAIN_SCRIPT else "snapshot"
+            self.record(probe + ("_ad" if result and result.get("ad_showing") else "_main"), started)
+        else:
+            self.record("other_script", started)
+        return result
+
+    def execute_async_script(self, script, *args):
+        started = time.perf_counter()
+        result = self.driver.execute_async_script(script, *args)
+        self.record("wait", started)
+        return result
+
+
+def sample_counts(new_dir):
+    # the main video and ad readings a collected video ended up with
+    path = os.path.join(new_dir, "samples.ndjson")
+    main = sum(1 for _ in read_records(path, "buffer"))
+    ads = sum(len(record["buffer"]) for record in read_records(path, "ad"))
+    return main, ads
+
+
+def bench_collection(driver, server, scenario, output_root):
+    '''
+    This function collects one scenario and returns the latency of every probe,
+    the readings collected per second, and how much the collector's python memory
+    and the browser's memory grew while it ran
+    '''
+    timed = TimedDriver(driver)
+    new_dir = str(Path(output_root) / scenario["video_id"])
+    browser_before = session_memory_mb(driver)
+    tracemalloc.start()
+    started = time.perf_counter()
+    CollectionScript.collect_video(timed, server.url(scenario["video_id"]), new_dir)
+    elapsed = time.perf_counter() - started
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    main, ads = sample_counts(new_dir)
+    return {
+        "video_seconds": scenario["duration"],
+        "wall_seconds": elapsed,
+        "probes": {probe: summary(values) for probe, values in timed.timings.items()},
+        "main_readings": main,
+        "ad_readings": ads,
+        "readings_per_second": (main + ads) / elapsed,
+        "python_peak_mb": python_peak / (1024 * 1024),
+        "browser_growth_mb": session_memory_mb(driver) - browser_before,
+    }
+
+
+def bench_jitter(driver, server, scenario, seconds=10):
+    '''
+    This function lets the in-page sampler run on the fake player for the given
+    number of seconds and returns how far apart its samples actually were
+    '''
+    driver.get(server.url(scenario["video_id"]))
+    driver.execute_script("document.getElementsByClassName('video-stream html5-main-video')[0].play()")
+    # a fixed rate, so the intervals can be compared against it
+    fixed = CollectionScript.SamplingPolicy(CollectionScript.SAMPLE_INTERVAL_MS, CollectionScript.SAMPLE_INTERVAL_MS)
+    driver.execute_script(CollectionScript.SAMPLER_SCRIPT, fixed.to_page(), CollectionScript.SAMPLER_CAPACITY)
+    time.sleep(seconds)
+    drained = driver.execute_script("return window.__collector.drain()")
+    times = [sample["t"] for sample in drained["samples"] if sample["kind"] == "tick"]
+    intervals = [later - earlier for earlier, later in zip(times, times[1:])]
+    return {
+        "interval_ms": CollectionScript.SAMPLE_INTERVAL_MS,
+        "intervals": summary(intervals),
+        "jitter": summary([abs(interval - CollectionScript.SAMPLE_INTERVAL_MS) for interval in intervals]),
+        "dropped": drained["dropped"],
+    }
+
+
+async def bench_sessions(server, scenarios, sessions, output_root, create_args):
+    # collects the scenarios with the given number of concurrent sessions, and returns
+    # the latency of all their probes and the memory of their browsers
+    loop = asyncio.get_running_loop()
+    work_queue = asyncio.Queue()
+    for scenario in scenarios:
+        work_queue.put_nowait(server.url(scenario["video_id"]))
+    latencies = []
+    memory = []
+
+    async def session(session_id, executor):
+        driver = await loop.run_in_executor(executor, lambda: CollectionScript.create_driver(**create_args))
+        timed = TimedDriver(driver)
+        try:
+            while not work_queue.empty():
+                url = work_queue.get_nowait()
+                new_dir = str(Path(output_root) / ("session_" + str(session_id)) / url.split("=")[1])
+                await async_controller.collect_video(executor, timed, url, new_dir)
+            memory.append(session_memory_mb(driver))
+        finally:
+            await loop.run_in_executor(executor, driver.quit)
+        for probe, values in timed.timings.items():
+            if probe != "wait":
+                latencies.extend(values)
+
+    with ThreadPoolExecutor(max_workers=min(sessions, async_controller.MAX_BLOCKING_CALLS)) as executor:
+        started = time.perf_counter()
+        await asyncio.gather(*[session(session_id, executor) for session_id in range(sessions)])
+        elapsed = time.perf_counter() - started
+    return {
+        "sessions": sessions,
+        "wall_seconds": elapsed,
+        "probe_latency": summary(latencies),
+        "session_memory_mb": summary(memory),
+    }
+
+
+def bench_ceiling(server, scenario, max_sessions, output_root, create_args):
+    '''
+    This function doubles the number of concurrent sessions until the probes get
+    slower than CEILING_LATENCY_MS (at the 95th percentile) or max_sessions is
+    reached, and returns every level it measured along with the last one that held
+    '''
+    levels = []
+    ceiling = 0
+    sessions = 1
+    while sessions <= max_sessions:
+        scenarios = [dict(scenario, video_id=scenario["video_id"] + "s" + str(index)) for index in range(sessions)]
+        server.scenarios.update({item["video_id"]: item for item in scenarios})
+        level = asyncio.run(bench_sessions(server, scenarios, sessions, output_root, create_args))
+        levels.append(level)
+        if level["probe_latency"].get("p95", 0) > CEILING_LATENCY_MS:
+            break
+        ceiling = sessions
+        sessions *= 2
+    return {"ceiling": ceiling, "latency_limit_ms": CEILING_LATENCY_MS, "levels": levels}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(quick=False, max_sessions=8, output_root="./benchmark_output", results_dir=RESULTS_DIR, **create_args):
+    '''
+    This function runs the whole suite against the fake player and saves the
+    results to results_dir/<time>-<revision>.json, so they can be compared
+    across versions of the collector. quick shortens every benchmark so the
+    suite can be run on every change; the full one includes a video of almost
+    an hour (videos of an hour or more are skipped by the collector). every run
+    collects into its own directory under output_root, so the streams of an
+    earlier run are never counted again
+    '''
+    create_args.setdefault("dense", True)
+    create_args.setdefault("latency", 0)
+    create_args.setdefault("download_limit", 1000)
+    create_args.setdefault("upload_limit", 1000)
+    revision = git_revision()
+    output_root = str(Path(output_root) / (time.strftime("%Y%m%d-%H%M%S") + "-" + revision))
+    short = synthetic_scenario("benchshort", duration=60 if quick else 300, speed=10.0)
+    long_video = synthetic_scenario(
+        "benchlong", duration=300 if quick else preflight.MAX_VIDEO_DURATION - 60, speed=60.0, ad_every=300
+    )
+    server = ReplayServer([short, long_video]).start()
+    results = {
+        "revision": revision,
+        "started_at": time.time(),
+        "quick": quick,
+        "settings": {
+            "use_page_sampler": CollectionScript.USE_PAGE_SAMPLER,
+            "sample_interval_ms": CollectionScript.SAMPLE_INTERVAL_MS,
+            "sampling": CollectionScript.sampling_policy().details(),
+            "drain_interval": CollectionScript.DRAIN_INTERVAL,
+            "create_args": create_args,
+        },
+    }
+    driver = CollectionScript.create_driver(**create_args)
+    try:
+        results["collection"] = bench_collection(driver, server, short, output_root)
+        results["long_session"] = bench_collection(driver, server, long_video, output_root)
+        results["jitter"] = bench_jitter(driver, server, short, seconds=5 if quick else 30)
+    finally:
+        driver.quit()
+    try:
+        results["ceiling"] = bench_ceiling(
+            server, synthetic_scenario("benchceiling", duration=30, speed=5.0, ad_every=15),
+            2 if quick else max_sessions, output_root, create_args,
+        )
+    finally:
+        server.stop()
+
+    Path(results_dir).mkdir(parents=True, exist_ok=True)
+    path = str(Path(results_dir) / (time.strftime("%Y%m%d-%H%M%S") + "-" + results["revision"] + ".json"))
+    write_json_file(path, results)
+    print("Benchmark results written to", path)
+    return results
+
+
+def flatten(results, prefix=""):
+    # the numeric results keyed by their dotted path, for comparing two runs
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old_path, new_path, out=sys.stdout):
+    # prints every numeric result of two runs side by side with its relative change
+    with open(old_path, "rb") as f:
+        old = flatten(orjson.loads(f.read()))
+    with open(new_path, "rb") as f:
+        new = flatten(orjson.loads(f.read()))
+    for key in sorted(set(old) & set(new)):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        out.write("%-60s %14.3f %14.3f %+8.1f%%\n" % (key, old[key], new[key], change))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the overhead of the collector against the fake player page")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the suite and save its results")
+    run_parser.add_argument("--quick", action="store_true", help="shorter videos and fewer sessions")
+    run_parser.add_argument("--max-sessions", type=int, default=8, help="most concurrent sessions tried for the ceiling")
+    run_parser.add_argument("--results", default=RESULTS_DIR, help="directory the results are saved to")
+    compare_parser = subparsers.add_parser("compare", help="compare the results of two runs")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_suite(quick=args.quick, max_sessions=args.max_sessions, results_dir=args.results)
+    else:
+        compare(args.old, args.new)
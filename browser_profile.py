@@ -0,0 +1,157 @@
+import os
+import sys
+import copy
+import time
+import atexit
+import shutil
+import tempfile
+
+# chrome flags of the dense launch mode. the browser runs headless with software
+# rendering and without any of the background services a normal profile runs, so
+# that as many sessions as possible fit on a host
+DENSE_FLAGS = [
+    # no GPU process, the frames are composited in software
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    # /dev/shm is small in containers, shared memory goes to /tmp instead
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-features=MediaRouter,OptimizationHints,TranslateUI",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--metrics-recording-only",
+    # the page is never visible, but the player must not be throttled like a background tab
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    # the player has to start without a user gesture, and sound is never needed
+    "--autoplay-policy=no-user-gesture-required",
+    "--mute-audio",
+    # one renderer is enough for a single tab
+    "--renderer-process-limit=1",
+]
+
+# content settings of the dense launch mode: images (thumbnails, avatars, the poster
+# of the player) are not loaded, the video itself is not an image and plays as usual
+DENSE_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.default_content_setting_values.notifications": 2,
+}
+
+# memory budget of a dense session playing a video. this is an estimate, to be replaced
+# by the peak printed by running this file (python browser_profile.py <url>) on the host
+DENSE_MEMORY_PER_SESSION_MB = 350
+
+# the profile copy of every session started from a template, by session id. a copy is
+# removed as soon as its session is quit (see remove_session_profile)
+session_profiles = {}
+
+
+def dense_options(options, profile_template=None):
+    '''
+    This function returns a copy of the given ChromeOptions (the mobile emulation
+    options of CollectionScript) set up for the dense launch mode. if a profile
+    template directory is given, every session starts from its own copy of it,
+    so the template itself is only ever read
+    '''
+    options = copy.deepcopy(options)
+    options.headless = True
+    for flag in DENSE_FLAGS:
+        options.add_argument(flag)
+    options.add_experimental_option("prefs", DENSE_PREFS)
+    if profile_template:
+        options.add_argument("--user-data-dir=" + session_profile(profile_template))
+    return options
+
+
+def session_profile(profile_template):
+    '''
+    This function copies the profile template into a new temporary directory and
+    returns its path. chrome cannot share a profile directory between sessions, and
+    it writes to whichever one it is given. the copy is removed with remove_session_profile
+    once its session is quit, or when the process exits for sessions that never are
+    '''
+    profile_dir = tempfile.mkdtemp(prefix="collector-profile-")
+    shutil.copytree(profile_template, profile_dir, dirs_exist_ok=True)
+    atexit.register(shutil.rmtree, profile_dir, True)
+    return profile_dir
+
+
+def profile_dir_of(options):
+    # the profile directory a session is launched with, if any
+    for argument in options.arguments:
+        if argument.startswith("--user-data-dir="):
+            return argument[len("--user-data-dir="):]
+    return None
+
+
+def remove_session_profile(session_id):
+    # must only be called once the browser of the session has quit
+    profile_dir = session_profiles.pop(session_id, None)
+    if profile_dir is not None:
+        shutil.rmtree(profile_dir, True)
+
+
+def process_tree_rss_mb(pid):
+    '''
+    This function returns the resident memory (in megabytes) of the process with the
+    given pid and all of its descendants, read from /proc (linux only)
+    '''
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/" + entry + "/stat") as f:
+                # the parent pid is the second field after the (parenthesised) command name
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open("/proc/" + str(current) + "/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def session_memory_mb(driver):
+    # memory of chromedriver and the whole browser it started
+    return process_tree_rss_mb(driver.service.process.pid)
+
+
+if __name__ == '__main__':
+    # usage: python browser_profile.py <url> [seconds]
+    # plays the url in a dense session and prints its peak memory every 5 seconds,
+    # which is how DENSE_MEMORY_PER_SESSION_MB is set
+    import CollectionScript
+
+    driver = CollectionScript.create_driver(dense=True)
+    try:
+        driver.get(sys.argv[1])
+        deadline = time.monotonic() + (float(sys.argv[2]) if len(sys.argv) > 2 else 60)
+        peak = 0.0
+        while time.monotonic() < deadline:
+            driver.execute_script(
+                "var v = document.getElementsByClassName('video-stream html5-main-video')[0]; if (v) { v.play(); }"
+            )
+            peak = max(peak, session_memory_mb(driver))
+            print("Session memory: ", round(peak), "MB")
+            time.sleep(5)
+    finally:
+        driver.quit()
@@ -0,0 +1,237 @@
+import time
+import sqlite3
+import orjson
+
+# the tables of a campaign store. every row is keyed by the movie_id of the main
+# video, and ad rows additionally by the ad id (name is the ad id with the repeat
+# count appended, like the keys of AdvertBufferState.txt)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    movie_id TEXT PRIMARY KEY,
+    url TEXT,
+    duration REAL,
+    unique_ads INTEGER,
+    resolution TEXT,
+    status TEXT,
+    started_at REAL,
+    finished_at REAL,
+    sampling TEXT,
+    accelerated TEXT
+);
+CREATE TABLE IF NOT EXISTS buffer_samples (
+    movie_id TEXT,
+    played REAL,
+    buffer REAL,
+    res TEXT,
+    ratio REAL
+);
+CREATE INDEX IF NOT EXISTS buffer_samples_movie ON buffer_samples (movie_id);
+CREATE TABLE IF NOT EXISTS ad_impressions (
+    id INTEGER PRIMARY KEY,
+    movie_id TEXT,
+    ad_id TEXT,
+    name TEXT,
+    skippable INTEGER,
+    skip_duration INTEGER,
+    pre_ad_buffer TEXT,
+    played REAL,
+    post_ad_buffer REAL,
+    start_t REAL,
+    end_t REAL
+);
+CREATE INDEX IF NOT EXISTS ad_impressions_movie ON ad_impressions (movie_id);
+CREATE INDEX IF NOT EXISTS ad_impressions_ad ON ad_impressions (ad_id);
+CREATE TABLE IF NOT EXISTS ad_samples (
+    impression_id INTEGER,
+    played REAL,
+    buffer REAL,
+    res TEXT
+);
+CREATE INDEX IF NOT EXISTS ad_samples_impression ON ad_samples (impression_id);
+CREATE TABLE IF NOT EXISTS events (
+    movie_id TEXT,
+    event TEXT,
+    t REAL,
+    details TEXT
+);
+CREATE TABLE IF NOT EXISTS segments (
+    movie_id TEXT,
+    itag INTEGER,
+    range TEXT,
+    bytes INTEGER,
+    sent REAL,
+    response REAL,
+    finished REAL,
+    wall_time REAL,
+    status INTEGER,
+    failed INTEGER
+);
+CREATE INDEX IF NOT EXISTS segments_movie ON segments (movie_id);
+CREATE TABLE IF NOT EXISTS errors (
+    movie_id TEXT,
+    type TEXT,
+    message TEXT,
+    at REAL
+);
+"""
+
+# columns added to the tables after stores were first created, added to older stores by connect
+MIGRATIONS = [
+    ("ad_impressions", "start_t", "REAL"),
+    ("ad_impressions", "end_t", "REAL"),
+    ("videos", "sampling", "TEXT"),
+    ("videos", "accelerated", "TEXT"),
+]
+
+# number of records after which the pending inserts of a video are committed
+COMMIT_EVERY = 50
+# how long a writer waits for another writer to release the database, in milliseconds
+BUSY_TIMEOUT_MS = 30000
+
+
+def connect(path):
+    '''
+    This function opens a connection to the campaign store at path, creating
+    the tables if needed. the database is put in WAL mode so that several
+    worker processes (or async sessions, each with its own connection) can
+    write to it while analysis jobs read from it
+    '''
+    # the connection of an async session is used from whichever executor thread
+    # runs its current step, but never from two threads at once
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA busy_timeout=" + str(BUSY_TIMEOUT_MS))
+    connection.executescript(SCHEMA)
+    for table, name, kind in MIGRATIONS:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(" + table + ")")]
+        if name not in columns:
+            connection.execute("ALTER TABLE " + table + " ADD COLUMN " + name + " " + kind)
+    connection.commit()
+    return connection
+
+
+class VideoRecorder:
+    '''
+    This class records the samples of one video into the campaign store. it has
+    the same write/sync/close interface as sample_writer.SampleWriter, so the
+    collector can stream its records to either of them
+    '''
+
+    def __init__(self, connection, movie_id, commit_every=COMMIT_EVERY):
+        self.connection = connection
+        self.movie_id = movie_id
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        # a video that is collected again replaces whatever an earlier attempt left behind
+        self.connection.execute(
+            "DELETE FROM ad_samples WHERE impression_id IN (SELECT id FROM ad_impressions WHERE movie_id = ?)",
+            (movie_id,),
+        )
+        for table in ("buffer_samples", "ad_impressions", "events", "segments", "errors"):
+            self.connection.execute("DELETE FROM " + table + " WHERE movie_id = ?", (movie_id,))
+        self.connection.commit()
+
+    def write(self, kind, **fields):
+        if kind == "video":
+            self.connection.execute(
+                "INSERT OR REPLACE INTO videos (movie_id, url, duration, status, started_at, sampling, accelerated) VALUES (?, ?, ?, 'in_progress', ?, ?, ?)",
+                (
+                    self.movie_id,
+                    fields["url"],
+                    fields["duration"],
+                    time.time(),
+                    # the sampling policy the video was collected with (see CollectionScript.SamplingPolicy)
+                    orjson.dumps(fields.get("sampling")).decode(),
+                    # false, or the settings of the accelerated mode (see CollectionScript.PlaybackAccelerator)
+                    orjson.dumps(fields.get("accelerated", False)).decode(),
+                ),
+            )
+        elif kind == "buffer":
+            self.connection.execute(
+                "INSERT INTO buffer_samples VALUES (?, ?, ?, ?, ?)",
+                (self.movie_id, fields["played"], fields["buffer"], fields["res"], fields["ratio"]),
+            )
+        elif kind == "ad":
+            cursor = self.connection.execute(
+                "INSERT INTO ad_impressions (movie_id, ad_id, name, skippable, skip_duration, pre_ad_buffer, played, start_t, end_t) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.movie_id,
+                    fields["ad_id"],
+                    fields["name"],
+                    fields["skippable"],
+                    fields["skip_duration"],
+                    # either 0.0 or the last (buffer, played seconds) reading before the ad
+                    orjson.dumps(fields["pre_ad_buffer"]).decode(),
+                    fields["played"],
+                    # page timestamps (milliseconds) of the ad's start and end, seen by the ad observer
+                    fields.get("start_t"),
+                    fields.get("end_t"),
+                ),
+            )
+            # the ad catalog (see ad_catalog.py) refers to the impression by this id
+            self.last_impression_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO ad_samples VALUES (?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, played, buffer, res)
+                    for buffer, played, res in fields["buffer"]
+                ],
+            )
+        elif kind == "post_ad_buffer":
+            self.connection.execute(
+                "UPDATE ad_impressions SET post_ad_buffer = ? WHERE id = (SELECT MAX(id) FROM ad_impressions WHERE movie_id = ? AND ad_id = ?)",
+                (fields["buffer"], self.movie_id, fields["ad_id"]),
+            )
+        elif kind == "event":
+            self.connection.execute(
+                "INSERT INTO events VALUES (?, ?, ?, ?)",
+                (self.movie_id, fields.get("event"), fields.get("t"), orjson.dumps(fields).decode()),
+            )
+        elif kind == "segment":
+            self.connection.execute(
+                "INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.movie_id,
+                    fields.get("itag"),
+                    fields.get("range"),
+                    fields["bytes"],
+                    fields["sent"],
+                    fields["response"],
+                    fields["finished"],
+                    fields["wall_time"],
+                    fields["status"],
+                    int(fields["failed"]),
+                ),
+            )
+        elif kind == "error":
+            self.connection.execute(
+                "INSERT INTO errors VALUES (?, ?, ?, ?)",
+                (self.movie_id, fields["type"], fields["message"], time.time()),
+            )
+            self.connection.execute(
+                "UPDATE videos SET status = 'failed' WHERE movie_id = ?", (self.movie_id,)
+            )
+        elif kind == "summary":
+            self.connection.execute(
+                "UPDATE videos SET unique_ads = ?, resolution = ?, status = 'done', finished_at = ?, "
+                "accelerated = ? WHERE movie_id = ?",
+                (
+                    fields["UniqueAds"],
+                    fields["Resolution"],
+                    time.time(),
+                    # the seeks made are only known once the video is over
+                    orjson.dumps(fields.get("Accelerated", False)).decode(),
+                    self.movie_id,
+                ),
+            )
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.sync()
+
+    def sync(self):
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.sync()
@@ -0,0 +1,121 @@
+import os
+import array
+import orjson
+import numpy as np
+
+# name of the directory (inside a video's directory) that holds the columnar files
+COLUMNS_DIR = "columns"
+# resolution code stored for readings whose resolution could not be read
+MISSING_RES = 0
+
+
+class ResolutionDictionary:
+    '''
+    This class dictionary-encodes resolution strings ("1280x720@30") into small
+    integer codes. code 0 is reserved for a missing resolution
+    '''
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {}
+
+    def encode(self, res):
+        if res is None:
+            return MISSING_RES
+        code = self.codes.get(res)
+        if code is None:
+            code = len(self.values)
+            self.codes[res] = code
+            self.values.append(res)
+        return code
+
+
+def as_number(value):
+    # played seconds that could not be read are stored as NaN
+    return float("nan") if value is None else value
+
+
+def save_column(directory, name, values, dtype):
+    # each column is a plain .npy file so that it can be memory-mapped by the reader
+    np.save(os.path.join(directory, name + ".npy"), np.frombuffer(values, dtype=dtype))
+
+
+def write_video_columns(new_dir, buffer_readings, ad_buffer_information):
+    '''
+    This function writes the traces of a video in columnar form to new_dir/columns:
+
+    buffer.npy (float32), played.npy (float64) and res.npy (uint16 codes) hold the
+    main video's readings, which are given as an iterable of (buffer, played, res).
+    ad_buffer.npy, ad_played.npy and ad_res.npy hold the readings of every ad one after
+    the other, and ad_offsets.npy (int64) the index at which each ad starts, in the
+    order of the names in dictionary.json. dictionary.json also maps the resolution
+    codes back to their strings
+    '''
+    directory = os.path.join(new_dir, COLUMNS_DIR)
+    os.makedirs(directory, exist_ok=True)
+    resolutions = ResolutionDictionary()
+
+    # array.array keeps the values as packed machine numbers while they are collected
+    buffer, played, res = array.array("f"), array.array("d"), array.array("H")
+    for current_buffer, played_in_seconds, current_res in buffer_readings:
+        buffer.append(current_buffer)
+        played.append(as_number(played_in_seconds))
+        res.append(resolutions.encode(current_res))
+    save_column(directory, "buffer", buffer, np.float32)
+    save_column(directory, "played", played, np.float64)
+    save_column(directory, "res", res, np.uint16)
+
+    ad_names = []
+    ad_offsets = array.array("q")
+    ad_buffer, ad_played, ad_res = array.array("f"), array.array("d"), array.array("H")
+    for name, details in ad_buffer_information.items():
+        ad_names.append(name)
+        ad_offsets.append(len(ad_buffer))
+        for current_buffer, played_in_seconds, current_res in details["buffer"]:
+            ad_buffer.append(current_buffer)
+            ad_played.append(as_number(played_in_seconds))
+            ad_res.append(resolutions.encode(current_res))
+    save_column(directory, "ad_buffer", ad_buffer, np.float32)
+    save_column(directory, "ad_played", ad_played, np.float64)
+    save_column(directory, "ad_res", ad_res, np.uint16)
+    save_column(directory, "ad_offsets", ad_offsets, np.int64)
+
+    with open(os.path.join(directory, "dictionary.json"), "wb") as f:
+        f.write(orjson.dumps({"resolutions": resolutions.values, "ads": ad_names}))
+
+
+def load_video_columns(new_dir, mmap=True):
+    '''
+    This function returns a dictionary with every column written by
+    write_video_columns (memory-mapped unless mmap is False) along with the
+    "resolutions" and "ads" lists of dictionary.json
+    '''
+    directory = os.path.join(new_dir, COLUMNS_DIR)
+    with open(os.path.join(directory, "dictionary.json"), "rb") as f:
+        columns = orjson.loads(f.read())
+    for name in ("buffer", "played", "res", "ad_buffer", "ad_played", "ad_res", "ad_offsets"):
+        path = os.path.join(directory, name + ".npy")
+        try:
+            columns[name] = np.load(path, mmap_mode="r" if mmap else None)
+        except ValueError:
+            # an empty column cannot be memory-mapped
+            columns[name] = np.load(path)
+    return columns
+
+
+def ad_trace(columns, name):
+    '''
+    This function returns the (buffer, played, res) arrays of a single ad out of
+    the columns returned by load_video_columns
+    '''
+    index = columns["ads"].index(name)
+    start = columns["ad_offsets"][index]
+    if index + 1 < len(columns["ads"]):
+        end = columns["ad_offsets"][index + 1]
+    else:
+        end = len(columns["ad_buffer"])
+    return (
+        columns["ad_buffer"][start:end],
+        columns["ad_played"][start:end],
+        columns["ad_res"][start:end],
+    )
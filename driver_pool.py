@@ -0,0 +1,129 @@
+from browser_profile import session_memory_mb
+
+# a session is recycled (quit and replaced by a fresh one) after collecting this many videos
+VIDEOS_PER_SESSION = 25
+# or as soon as its browser uses more than this much memory, in megabytes
+MAX_SESSION_MEMORY_MB = 1500
+# the page a session is parked on between two videos
+BLANK_PAGE = "about:blank"
+
+
+class DriverPool:
+    '''
+    This class keeps warm chrome sessions (all created by create_driver with the
+    same create_args) so that the cold start of chrome is paid once for many videos. a
+    session is handed out by acquire and given back with release, which resets its
+    page state, and recycles it after VIDEOS_PER_SESSION videos, when it has grown
+    past MAX_SESSION_MEMORY_MB or when it is no longer healthy. forget_session is
+    called with every session that is quit, to drop what the collector keeps about
+    it. a pool is used by a single worker (or async session) at a time
+    '''
+
+    def __init__(
+        self,
+        create_driver,
+        forget_session=None,
+        size=1,
+        videos_per_session=VIDEOS_PER_SESSION,
+        max_memory_mb=MAX_SESSION_MEMORY_MB,
+        **create_args
+    ):
+        self.create_driver = create_driver
+        self.forget_session = forget_session
+        self.size = size
+        self.videos_per_session = videos_per_session
+        self.max_memory_mb = max_memory_mb
+        self.create_args = create_args
+        self.idle = []
+        # number of videos collected by every live session, by session id
+        self.videos = {}
+
+    def warm(self):
+        # starting the sessions up front instead of on the first acquire
+        while len(self.idle) < self.size:
+            self.idle.append(self.create())
+
+    def create(self):
+        driver = self.create_driver(**self.create_args)
+        self.videos[driver.session_id] = 0
+        return driver
+
+    def acquire(self):
+        '''
+        This function returns a healthy session, starting a new one if no idle
+        session is left (or the idle ones turn out to be dead)
+        '''
+        while self.idle:
+            driver = self.idle.pop()
+            if healthy(driver):
+                return driver
+            self.retire(driver)
+        return self.create()
+
+    def release(self, driver, failed=False):
+        '''
+        This function takes a session back after a video. the page is reset so the
+        next video starts from a clean state, and the session is recycled if it has
+        done its share of videos, grown too large, or is left broken by a failure
+        '''
+        self.videos[driver.session_id] = self.videos.get(driver.session_id, 0) + 1
+        if (failed and not healthy(driver)) or not reset_page(driver):
+            self.retire(driver)
+            return
+        if self.videos[driver.session_id] >= self.videos_per_session or self.too_large(driver):
+            self.retire(driver)
+            return
+        if len(self.idle) < self.size:
+            self.idle.append(driver)
+        else:
+            self.retire(driver)
+
+    def too_large(self, driver):
+        if self.max_memory_mb is None:
+            return False
+        try:
+            return session_memory_mb(driver) > self.max_memory_mb
+        except (AttributeError, OSError):
+            # the memory can only be measured for local sessions on linux
+            return False
+
+    def retire(self, driver):
+        self.videos.pop(driver.session_id, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        # only once the browser is gone, since forgetting a session removes its profile copy
+        if self.forget_session is not None:
+            self.forget_session(driver)
+
+    def close(self):
+        while self.idle:
+            self.retire(self.idle.pop())
+
+
+def healthy(driver):
+    # a session is healthy if its browser still answers a script
+    try:
+        return driver.execute_script("return 1") == 1
+    except Exception:
+        return False
+
+
+def reset_page(driver):
+    '''
+    This function brings a session back to a blank page between two videos,
+    dismissing any dialog the last video left open. the stats for nerds panel and
+    the volume belong to the page and are set up again by the next video, the
+    autoplay setting belongs to the session and stays off. returns whether the
+    session could be reset
+    '''
+    try:
+        driver.switch_to.alert.dismiss()
+    except Exception:
+        pass
+    try:
+        driver.get(BLANK_PAGE)
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,140 @@
+import time
+
+# the manifest lives in the campaign store next to the collected data. it keeps the
+# state of every url of the campaign: pending, in_progress, done, skipped (too long)
+# or failed (with the reason of the last failure and the number of retries so far)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    url TEXT PRIMARY KEY,
+    state TEXT,
+    retries INTEGER DEFAULT 0,
+    reason TEXT,
+    next_attempt_at REAL DEFAULT 0,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS manifest_state ON manifest (state, next_attempt_at);
+"""
+
+# a failed url is retried at most this many times
+MAX_RETRIES = 3
+# seconds to wait before the first retry of a failed url, doubled on every retry after that
+RETRY_BACKOFF = 60
+
+
+def prepare(connection, urls=()):
+    '''
+    This function creates the manifest in the campaign store (if needed) and adds
+    the given urls as pending, leaving urls it already knows about untouched. it is
+    meant to be called once when a campaign is (re)started: urls left in_progress by
+    a run that died are put back to pending, since no one is collecting them anymore
+    '''
+    connection.executescript(SCHEMA)
+    add(connection, urls)
+    connection.execute(
+        "UPDATE manifest SET state = 'pending', updated_at = ? WHERE state = 'in_progress'",
+        (time.time(),),
+    )
+    connection.commit()
+
+
+def add(connection, urls, skipped=None):
+    '''
+    This function adds urls as pending while the campaign is running, leaving urls
+    it already knows about (in_progress ones included) untouched. skipped maps the
+    urls the pre-flight pass found not worth collecting to the reason, these are
+    added as skipped straight away. all of them are added in one transaction, so a
+    worker never gets to claim a url that is about to be skipped
+    '''
+    skipped = skipped or {}
+    connection.executemany(
+        "INSERT OR IGNORE INTO manifest (url, state, updated_at) VALUES (?, 'pending', ?)",
+        [(url, time.time()) for url in urls if url not in skipped],
+    )
+    connection.executemany(
+        "INSERT OR IGNORE INTO manifest (url, state, reason, updated_at) VALUES (?, 'skipped', ?, ?)",
+        [(url, reason, time.time()) for url, reason in skipped.items()],
+    )
+    connection.commit()
+
+
+def known(connection, urls):
+    # the ones of the given urls the manifest already has, whatever their state
+    urls = list(urls)
+    found = set()
+    # sqlite allows a limited number of parameters per statement
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        found.update(
+            row[0] for row in connection.execute(
+                "SELECT url FROM manifest WHERE url IN (" + ",".join("?" * len(chunk)) + ")", chunk
+            )
+        )
+    return found
+
+
+def claim(connection):
+    '''
+    This function marks the next url that can be collected now as in_progress and
+    returns it, or returns None if there is no such url. pending urls come first,
+    then failed urls whose backoff has passed. the claim is made in an immediate
+    transaction so that two workers sharing the store never get the same url
+    '''
+    # anything still uncommitted on this connection is committed before the claim
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            "SELECT url FROM manifest WHERE state = 'pending' "
+            "OR (state = 'failed' AND retries <= ? AND next_attempt_at <= ?) "
+            "ORDER BY state = 'failed', next_attempt_at LIMIT 1",
+            (MAX_RETRIES, time.time()),
+        ).fetchone()
+        if row is not None:
+            connection.execute(
+                "UPDATE manifest SET state = 'in_progress', updated_at = ? WHERE url = ?",
+                (time.time(), row[0]),
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return None if row is None else row[0]
+
+
+def seconds_until_retry(connection):
+    '''
+    This function returns how long to wait until a failed url can be retried, or
+    None if there is nothing left to retry (every url is done, skipped, being
+    collected by someone else or out of retries)
+    '''
+    row = connection.execute(
+        "SELECT MIN(next_attempt_at) FROM manifest WHERE state = 'pending' "
+        "OR (state = 'failed' AND retries <= ?)",
+        (MAX_RETRIES,),
+    ).fetchone()
+    if row[0] is None:
+        return None
+    return max(0.0, row[0] - time.time())
+
+
+def finish(connection, url, collected=True):
+    # collect_video returns False for videos skipped for being too long
+    connection.execute(
+        "UPDATE manifest SET state = ?, reason = NULL, updated_at = ? WHERE url = ?",
+        ("done" if collected else "skipped", time.time(), url),
+    )
+    connection.commit()
+
+
+def fail(connection, url, reason):
+    '''
+    This function marks a url as failed with the given reason. it is retried
+    after RETRY_BACKOFF seconds, doubling with every retry, until MAX_RETRIES
+    retries have been made
+    '''
+    connection.execute(
+        "UPDATE manifest SET state = 'failed', retries = retries + 1, reason = ?, "
+        "next_attempt_at = ? * (1 << retries) + ?, updated_at = ? WHERE url = ?",
+        (reason, RETRY_BACKOFF, time.time(), time.time(), url),
+    )
+    connection.commit()
@@ -0,0 +1,214 @@
+import os
+import time
+import inspect
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# upper bounds (in seconds) of the buckets of every histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# when on, the functions decorated with timed record how long every call (or, for
+# the collector's generators, every step between two waits) takes
+TIMING_HOOKS = False
+
+
+class Metric:
+    '''
+    This class is the base of the counters and histograms below. every metric keeps
+    one value per combination of label values, and can be updated from any thread
+    (the async controller runs the collector on a pool of threads)
+    '''
+
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def key(self, labels):
+        return tuple(sorted(labels.items()))
+
+    def lines(self):
+        yield "# HELP " + self.name + " " + self.help_text
+        yield "# TYPE " + self.name + " " + self.kind
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def lines(self):
+        yield from super().lines()
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                yield self.name + format_labels(key) + " " + repr(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # one count per bucket, then the count and sum of all observations
+                counts = self.values[key] = [0] * len(BUCKETS) + [0, 0.0]
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def lines(self):
+        yield from super().lines()
+        with self.lock:
+            for key, counts in sorted(self.values.items()):
+                for index, bound in enumerate(BUCKETS):
+                    yield self.name + "_bucket" + format_labels(key + (("le", repr(bound)),)) + " " + str(counts[index])
+                yield self.name + "_bucket" + format_labels(key + (("le", "+Inf"),)) + " " + str(counts[-2])
+                yield self.name + "_count" + format_labels(key) + " " + str(counts[-2])
+                yield self.name + "_sum" + format_labels(key) + " " + repr(counts[-1])
+
+
+def format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(name + '="' + str(value).replace('"', '\\"') + '"' for name, value in key) + "}"
+
+
+# every metric created so far, in the order they were created
+REGISTRY = []
+
+webdriver_call_seconds = Histogram(
+    "collector_webdriver_call_seconds", "Latency of WebDriver commands, by command."
+)
+samples_total = Counter(
+    "collector_samples_total", "Buffer readings collected, by whether they were of the main video or an ad."
+)
+ads_total = Counter(
+    "collector_ads_total", "Ad impressions recorded, by where in the video they were shown."
+)
+stats_retries_total = Counter(
+    "collector_stats_for_nerds_retries_total", "Failed attempts at turning stats for nerds on."
+)
+failures_total = Counter(
+    "collector_failures_total", "Videos whose collection failed, by exception type."
+)
+videos_total = Counter(
+    "collector_videos_total", "Videos collected, by outcome."
+)
+function_seconds = Histogram(
+    "collector_function_seconds", "Time spent in the functions with timing hooks, by function."
+)
+
+
+def instrument_driver(driver):
+    '''
+    This function makes a driver time every WebDriver command it sends. every
+    selenium call (execute_script, get, find_element, click, ...) goes through
+    the execute method of the driver, which is wrapped on this instance only
+    '''
+    execute = driver.execute
+
+    def timed_execute(driver_command, params=None):
+        started = time.perf_counter()
+        try:
+            return execute(driver_command, params)
+        finally:
+            webdriver_call_seconds.observe(time.perf_counter() - started, command=driver_command)
+
+    driver.execute = timed_execute
+    return driver
+
+
+def timed(function):
+    '''
+    This decorator records the time spent in the decorated function when
+    TIMING_HOOKS is on. for a generator function (like the collector's steps)
+    every step between two waits is timed, so the waits themselves are not counted
+    '''
+    name = function.__name__
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            steps = function(*args, **kwargs)
+            if not TIMING_HOOKS:
+                return (yield from steps)
+            value = None
+            while True:
+                started = time.perf_counter()
+                try:
+                    wait = steps.send(value)
+                except StopIteration as stop:
+                    function_seconds.observe(time.perf_counter() - started, function=name)
+                    return stop.value
+                function_seconds.observe(time.perf_counter() - started, function=name)
+                value = yield wait
+        return wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not TIMING_HOOKS:
+            return function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            function_seconds.observe(time.perf_counter() - started, function=name)
+    return wrapper
+
+
+def render():
+    # every metric in the prometheus text format
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.lines())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    '''
+    This function writes every metric to path in the prometheus text format (as
+    read by the textfile collector of node_exporter). it is written to a temporary
+    file first and then moved into place, so path is never left half written. the
+    temporary file is named after the calling thread, since the sessions of
+    async_controller write the same path from several executor threads
+    '''
+    temp_path = path + "." + str(threading.get_ident()) + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(render())
+    os.replace(temp_path, path)
+
+
+def serve(port, host="127.0.0.1"):
+    '''
+    This function serves the metrics on http://host:port/metrics from a
+    background thread, and returns the server
+    '''
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # scrapes are not logged to the terminal
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,91 @@
+import orjson
+from urllib.parse import urlparse, parse_qs
+
+# the media segments of a video are fetched from urls with this path (on *.googlevideo.com)
+SEGMENT_PATH = "/videoplayback"
+# query parameters of a segment url kept in its record. itag identifies the format
+# (resolution / bitrate) of the stream, range the bytes of the stream fetched
+SEGMENT_PARAMS = ("itag", "range", "clen", "dur", "mime", "rn")
+
+
+def enable_logging(options):
+    '''
+    This function turns on chrome's performance log on the given ChromeOptions.
+    chromedriver then records the DevTools Network domain events of the session,
+    which NetworkCapture reads back. only the network events are recorded
+    '''
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+
+def segment_params(url):
+    # the parameters of a segment url, or None if the url is not a media segment
+    parsed = urlparse(url)
+    if parsed.path != SEGMENT_PATH:
+        return None
+    query = parse_qs(parsed.query)
+    return {name: query[name][0] for name in SEGMENT_PARAMS if name in query}
+
+
+class NetworkCapture:
+    '''
+    This class turns the Network domain events in the performance log of a
+    driver (created with enable_logging) into one record per media segment
+    download: its itag and byte range, the bytes received, and when it was
+    requested, when the response started and when it finished. the timestamps
+    are the DevTools monotonic clock in seconds, wall_time is the time of the
+    request in seconds since the epoch
+    '''
+
+    def __init__(self, driver):
+        self.driver = driver
+        # segment requests that have not finished yet, by DevTools request id
+        self.in_flight = {}
+
+    def reset(self):
+        # everything logged so far (the previous video, the page load) is thrown away
+        self.driver.get_log("performance")
+        self.in_flight = {}
+
+    def drain(self):
+        '''
+        This function reads the performance log and returns the records of the
+        segments that finished (or failed) since the last drain. requests still
+        in flight are kept until a later drain sees them finish
+        '''
+        finished = []
+        for entry in self.driver.get_log("performance"):
+            message = orjson.loads(entry["message"])["message"]
+            method = message.get("method", "")
+            params = message.get("params", {})
+            request_id = params.get("requestId")
+            if method == "Network.requestWillBeSent":
+                segment = segment_params(params["request"]["url"])
+                if segment is not None:
+                    segment.update(
+                        request_id=request_id,
+                        sent=params["timestamp"],
+                        wall_time=params.get("wallTime"),
+                        response=None,
+                        status=None,
+                        bytes=0,
+                    )
+                    self.in_flight[request_id] = segment
+                continue
+            segment = self.in_flight.get(request_id)
+            if segment is None:
+                continue
+            if method == "Network.responseReceived":
+                segment["response"] = params["timestamp"]
+                segment["status"] = params["response"].get("status")
+            elif method == "Network.dataReceived":
+                segment["bytes"] += params.get("encodedDataLength") or params.get("dataLength", 0)
+            elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+                del self.in_flight[request_id]
+                segment["finished"] = params["timestamp"]
+                segment["failed"] = method == "Network.loadingFailed"
+                # loadingFinished carries the exact number of bytes received over the network
+                if params.get("encodedDataLength"):
+                    segment["bytes"] = params["encodedDataLength"]
+                finished.append(segment)
+        return finished
@@ -0,0 +1,127 @@
+import time
+
+# named network shaping profiles. every profile is a dictionary of create_driver
+# arguments: either fixed conditions (latency in milliseconds, download and upload
+# limits in Mbps), or a "trace" of (seconds since the start of the video, latency,
+# download limit, upload limit) steps that are applied one after the other while
+# each video plays (the last step lasts until the video ends)
+PROFILES = {
+    # the conditions every campaign of the study was collected with
+    "default": {"latency": 5, "download_limit": 9, "upload_limit": 9},
+    "fiber": {"latency": 2, "download_limit": 100, "upload_limit": 50},
+    "cable": {"latency": 20, "download_limit": 25, "upload_limit": 5},
+    "4g": {"latency": 50, "download_limit": 9, "upload_limit": 3},
+    "3g": {"latency": 150, "download_limit": 1.6, "upload_limit": 0.75},
+    "2g": {"latency": 300, "download_limit": 0.25, "upload_limit": 0.05},
+    # a connection that drops to 3g speeds for half a minute every minute and a half
+    "fluctuating": {
+        "trace": [
+            (0, 50, 9, 3),
+            (60, 150, 1.6, 0.75),
+            (90, 50, 9, 3),
+            (150, 150, 1.6, 0.75),
+            (180, 50, 9, 3),
+        ]
+    },
+    # a connection that keeps getting worse as the video plays
+    "degrading": {
+        "trace": [
+            (0, 20, 25, 5),
+            (30, 50, 9, 3),
+            (60, 150, 1.6, 0.75),
+            (90, 300, 0.25, 0.05),
+        ]
+    },
+}
+
+# the conditions last applied to every session, by session id
+session_conditions = {}
+# the traces of the sessions created with one, by session id
+session_traces = {}
+
+
+def apply_conditions(driver, latency, download_limit, upload_limit):
+    # throttling the network of the session by setting all manual conditions
+    driver.set_network_conditions(
+        offline=False,
+        latency=latency,
+        download_throughput=download_limit * 125000,  # Mbps to bytes per second
+        upload_throughput=upload_limit * 125000,  # Mbps to bytes per second
+    )
+    session_conditions[driver.session_id] = (latency, download_limit, upload_limit)
+
+
+def download_limit(driver, default):
+    # the download limit (in Mbps) currently applied to the session
+    conditions = session_conditions.get(driver.session_id)
+    return default if conditions is None else conditions[1]
+
+
+class NetworkTrace:
+    '''
+    This class applies the steps of a time-varying profile to a session. the
+    trace starts over with every video, and every step is applied as soon as
+    its time has come (see shape_steps)
+    '''
+
+    def __init__(self, steps):
+        self.steps = sorted(steps)
+        self.started_at = time.monotonic()
+        self.applied = -1
+
+    def restart(self, driver):
+        self.started_at = time.monotonic()
+        self.applied = -1
+        self.apply(driver)
+
+    def seconds_until_change(self):
+        # seconds until the next step is due, None once the last step has been applied
+        if self.applied + 1 >= len(self.steps):
+            return None
+        return max(0.0, self.steps[self.applied + 1][0] - (time.monotonic() - self.started_at))
+
+    def apply(self, driver):
+        # applying the latest step that is due, if it has not been applied already
+        elapsed = time.monotonic() - self.started_at
+        due = self.applied
+        while due + 1 < len(self.steps) and self.steps[due + 1][0] <= elapsed:
+            due += 1
+        if due != self.applied:
+            self.applied = due
+            apply_conditions(driver, *self.steps[due][1:])
+
+
+def shape_steps(driver, steps):
+    '''
+    This function wraps a collect_video_steps generator of a session created
+    with a trace, restarting the trace when the video starts and applying its
+    steps when they are due. the waits the video steps ask for are split at
+    the steps of the trace, so no step is applied late. sessions without a
+    trace get the video steps unchanged
+    '''
+    trace = session_traces.get(driver.session_id)
+    if trace is None:
+        return (yield from steps)
+    trace.restart(driver)
+    try:
+        while True:
+            wait = next(steps)
+            deadline = time.monotonic() + wait
+            while True:
+                change = trace.seconds_until_change()
+                remaining = deadline - time.monotonic()
+                if change is None or change >= remaining:
+                    break
+                yield change
+                trace.apply(driver)
+            yield max(0.0, deadline - time.monotonic())
+            trace.apply(driver)
+    except StopIteration as stop:
+        return stop.value
+
+
+def resolve(profile):
+    # a profile is given either by name or as a dictionary of create_driver arguments
+    if isinstance(profile, str):
+        return dict(PROFILES[profile])
+    return dict(profile)
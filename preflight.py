@@ -0,0 +1,105 @@
+import re
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# the results of the pre-flight pass are cached in the campaign store by movie_id
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS preflight (
+    movie_id TEXT PRIMARY KEY,
+    duration REAL,
+    status TEXT,
+    checked_at REAL
+);
+"""
+
+# videos this long (in seconds) or longer are not collected
+MAX_VIDEO_DURATION = 3600
+# number of watch pages fetched at the same time
+PREFLIGHT_WORKERS = 16
+# seconds a watch page may take to load
+PREFLIGHT_TIMEOUT = 15
+# the availability of a video can change, so cached results are only trusted for this many seconds
+CACHE_SECONDS = 7 * 24 * 3600
+
+# the watch page embeds the player response, which holds the duration and playability of the video
+LENGTH_PATTERN = re.compile(r'"lengthSeconds":"(\d+)"')
+STATUS_PATTERN = re.compile(r'"playabilityStatus":\{"status":"(\w+)"')
+
+
+def fetch_metadata(url):
+    '''
+    This function fetches the watch page of a video over plain HTTP (no browser
+    involved) and returns its (duration in seconds, playability status). the
+    duration is None if the page does not have one
+    '''
+    request = urllib.request.Request(
+        url,
+        headers={"User-Agent": "Mozilla/5.0", "Accept-Language": "en-US,en;q=0.9"},
+    )
+    with urllib.request.urlopen(request, timeout=PREFLIGHT_TIMEOUT) as response:
+        page = response.read().decode("utf-8", errors="replace")
+    length = LENGTH_PATTERN.search(page)
+    status = STATUS_PATTERN.search(page)
+    return (
+        float(length.group(1)) if length else None,
+        status.group(1) if status else "UNKNOWN",
+    )
+
+
+def check_urls(list_of_urls, store=None, workers=PREFLIGHT_WORKERS, max_duration=MAX_VIDEO_DURATION):
+    '''
+    This function resolves the duration and availability of all the given urls
+    in parallel and returns a dictionary of the urls that should not be collected,
+    mapped to the reason why. results are cached in the store (if one is given)
+    by movie_id. urls whose page could not be fetched are not skipped (nor cached),
+    the full session will find out what is wrong with them
+    '''
+    metadata = {}
+    if store is not None:
+        store.executescript(SCHEMA)
+        # only the cached results of these urls are looked up, the cache can be far larger
+        movie_ids = list({url.split("=")[1] for url in list_of_urls})
+        # sqlite allows a limited number of parameters per statement
+        for start in range(0, len(movie_ids), 500):
+            chunk = movie_ids[start:start + 500]
+            for movie_id, duration, status in store.execute(
+                "SELECT movie_id, duration, status FROM preflight WHERE checked_at >= ? AND movie_id IN ("
+                + ",".join("?" * len(chunk)) + ")",
+                [time.time() - CACHE_SECONDS] + chunk,
+            ):
+                metadata[movie_id] = (duration, status)
+
+    # the urls that are not in the cache are fetched in parallel
+    to_fetch = {}
+    for url in list_of_urls:
+        movie_id = url.split("=")[1]
+        if movie_id not in metadata:
+            to_fetch[movie_id] = url
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            movie_id: executor.submit(fetch_metadata, url)
+            for movie_id, url in to_fetch.items()
+        }
+        for movie_id, future in futures.items():
+            try:
+                metadata[movie_id] = future.result()
+            except Exception as e:
+                print("Pre-flight failed for", movie_id, ":", e)
+                continue
+            if store is not None:
+                store.execute(
+                    "INSERT OR REPLACE INTO preflight VALUES (?, ?, ?, ?)",
+                    (movie_id, metadata[movie_id][0], metadata[movie_id][1], time.time()),
+                )
+    if store is not None:
+        store.commit()
+
+    skipped = {}
+    for url in list_of_urls:
+        duration, status = metadata.get(url.split("=")[1], (None, "OK"))
+        if status not in ("OK", "UNKNOWN"):
+            skipped[url] = "unavailable: " + status
+        elif duration is not None and duration >= max_duration:
+            skipped[url] = "too long: " + str(duration) + " seconds"
+    return skipped
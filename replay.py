@@ -0,0 +1,181 @@
+import sys
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import orjson
+
+from sample_writer import last_attempt
+
+# the page served for every video of a replay
+PAGE_FILE = Path(__file__).with_name("fake_player.html")
+
+
+def scenario_from_stream(path, speed=1.0):
+    '''
+    This function turns the samples.ndjson stream of a collected video into a
+    scenario for the fake player, so the video can be played back offline: the
+    main video's buffer trace, its ad pods (with their own buffer traces, skip
+    offsets and durations) and its stalls. only the last attempt in the stream
+    is used. speed makes the fake player's clock run that many times faster
+    '''
+    records = last_attempt(path)
+
+    scenario = {"video_id": None, "duration": 0, "speed": speed, "trace": [], "ads": [], "stalls": []}
+    waiting = None
+    for record in records:
+        kind = record["kind"]
+        if kind == "video":
+            scenario["video_id"] = record["movie_id"]
+            scenario["duration"] = record["duration"]
+        elif kind == "buffer" and record["played"] is not None:
+            scenario["trace"].append([record["played"], record["buffer"], record["res"]])
+        elif kind == "ad":
+            scenario_ad(scenario, record)
+        elif kind == "event" and record.get("event") == "waiting":
+            waiting = record
+        elif kind == "event" and record.get("event") == "playing" and waiting is not None:
+            if waiting.get("player_time") is not None:
+                scenario["stalls"].append(
+                    [waiting["player_time"], max(0.0, (record["t"] - waiting["t"]) / 1000.0)]
+                )
+            waiting = None
+    scenario["trace"].sort(key=lambda reading: reading[0])
+    return scenario
+
+
+def scenario_ad(scenario, record):
+    # adds an ad record of a stream to the pods of a scenario. ads shown at the same
+    # played seconds of the main video make up one pod
+    readings = [[played, buffer, res] for buffer, played, res in record["buffer"] if played is not None]
+    if record.get("start_t") is not None and record.get("end_t") is not None:
+        duration = (record["end_t"] - record["start_t"]) / 1000.0
+    else:
+        duration = max([reading[0] for reading in readings], default=0.0) + 1.0
+    skip_after = None
+    if record["skippable"] == 1 and 0 < record["skip_duration"] < 999:
+        skip_after = record["skip_duration"]
+    ad = {
+        "id": record["ad_id"],
+        "duration": max(duration, 1.0),
+        "skip_after": skip_after,
+        "trace": readings,
+    }
+    at = record["played"] or 0.0
+    if scenario["ads"] and scenario["ads"][-1]["at"] == at:
+        scenario["ads"][-1]["pod"].append(ad)
+    else:
+        scenario["ads"].append({"at": at, "pod": [ad]})
+
+
+class ReplayServer:
+    '''
+    This class serves the fake player page for a set of scenarios on a local port,
+    from a background thread. the watch url of a scenario looks like the one of a
+    real video (.../watch?v=<video_id>), so the collector handles it unchanged
+    '''
+
+    def __init__(self, scenarios, host="127.0.0.1", port=0):
+        self.scenarios = {scenario["video_id"]: scenario for scenario in scenarios}
+        self.page = PAGE_FILE.read_text()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                request = urlparse(self.path)
+                video_id = parse_qs(request.query).get("v", [None])[0]
+                if request.path != "/watch" or video_id not in server.scenarios:
+                    self.send_error(404)
+                    return
+                body = server.render(server.scenarios[video_id]).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # requests are not logged to the terminal
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def render(self, scenario):
+        page = self.page.replace("/*SCENARIO*/null", orjson.dumps(scenario).decode())
+        return page.replace("__LENGTH__", str(int(scenario["duration"])))
+
+    def url(self, video_id):
+        host, port = self.httpd.server_address[:2]
+        return "http://" + host + ":" + str(port) + "/watch?v=" + video_id
+
+    def urls(self):
+        return [self.url(video_id) for video_id in self.scenarios]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def replay(scenarios, output_root="./replay", store_path=None, **create_args):
+    '''
+    This function collects every scenario from the fake player with a single chrome
+    session, into output_root/<video_id> (or into the campaign store at store_path),
+    exactly as driver_code collects real videos. the create_driver arguments default
+    to a dense session without network throttling, which the local page does not need
+    '''
+    import CollectionScript
+    import campaign_store
+
+    create_args.setdefault("dense", True)
+    create_args.setdefault("latency", 0)
+    create_args.setdefault("download_limit", 1000)
+    create_args.setdefault("upload_limit", 1000)
+    server = ReplayServer(scenarios).start()
+    store = campaign_store.connect(store_path) if store_path else None
+    driver = CollectionScript.create_driver(**create_args)
+    results = {}
+    try:
+        for url in server.urls():
+            video_id = url.split("=")[1]
+            new_dir = None if store else str(Path(output_root) / video_id)
+            results[video_id] = CollectionScript.collect_video(driver, url, new_dir, store)
+    finally:
+        driver.quit()
+        server.stop()
+        if store:
+            store.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play collected videos back offline through the fake player page")
+    parser.add_argument("streams", nargs="+", help="samples.ndjson files (or scenario .json files) to replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="how many times faster than real time the fake player runs")
+    parser.add_argument("--output", default="./replay", help="directory the replayed videos are written to")
+    parser.add_argument("--store", default=None, help="campaign store to record the replayed videos into")
+    parser.add_argument("--serve", action="store_true", help="only serve the pages and print their urls")
+    args = parser.parse_args()
+
+    scenarios = []
+    for path in args.streams:
+        if path.endswith(".json"):
+            with open(path, "rb") as f:
+                scenarios.append(orjson.loads(f.read()))
+        else:
+            scenarios.append(scenario_from_stream(path, args.speed))
+    if args.serve:
+        server = ReplayServer(scenarios).start()
+        print("\n".join(server.urls()))
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            server.stop()
+        sys.exit(0)
+    print(replay(scenarios, args.output, args.store))
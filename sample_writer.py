@@ -0,0 +1,136 @@
+import os
+import time
+import orjson
+
+# name of the append-only file every sample of a video is streamed to
+STREAM_FILE = "samples.ndjson"
+# number of records after which the stream is flushed from python's buffer to the OS
+FLUSH_EVERY = 20
+# seconds after which the stream is also fsynced, so a crash of the host loses at most this much
+FSYNC_INTERVAL = 5.0
+
+
+def encode(value):
+    # orjson calls this for values it cannot encode itself, like the packed
+    # traces of aggregates.ReadingTrace, which know how to turn themselves into json
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    raise TypeError("cannot encode " + type(value).__name__)
+
+
+class SampleWriter:
+    '''
+    This class streams the records of a video to new_dir/samples.ndjson as they
+    are collected, one orjson-encoded record per line. each record has a "kind"
+    (buffer, ad, post_ad_buffer, event, error, summary) next to its fields.
+    nothing collected before a crash is lost, and the collector does not need to
+    keep the samples of the whole video in memory until it ends
+    '''
+
+    def __init__(self, new_dir, flush_every=FLUSH_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = os.path.join(new_dir, STREAM_FILE)
+        self.flush_every = flush_every
+        self.fsync_interval = fsync_interval
+        # appending, so a video that is collected again keeps the records of earlier attempts
+        self.file = open(self.path, "ab")
+        # where the records of this attempt start, the files of the video are rebuilt from there only
+        self.start = self.file.tell()
+        if self.start and not ends_with_newline(self.path):
+            # the last line of an attempt that crashed mid-write is closed off
+            self.file.write(b"\n")
+            self.start += 1
+        self.unflushed = 0
+        self.last_sync = time.monotonic()
+
+    def write(self, kind, **fields):
+        fields["kind"] = kind
+        self.file.write(orjson.dumps(fields, default=encode) + b"\n")
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def flush(self):
+        self.file.flush()
+        self.unflushed = 0
+
+    def sync(self):
+        self.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+def ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def read_records(path, kind=None, start=0):
+    '''
+    This function yields the records stored in a samples.ndjson file one at a
+    time, optionally only those of the given kind. start is the byte offset to
+    read from (SampleWriter.start, to leave out earlier attempts at the video).
+    a line that was only partly written because of a crash is skipped
+    '''
+    with open(path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+            if kind is None or record["kind"] == kind:
+                yield record
+
+
+def last_attempt(path, completed=False):
+    '''
+    This function returns the records of the last attempt at the video in a
+    samples.ndjson file (every attempt starts with a video record). with completed
+    on it returns those of the last attempt that got to its summary record instead,
+    or an empty list if none did
+    '''
+    records = []
+    last_completed = []
+    for record in read_records(path):
+        if record["kind"] == "video":
+            # a video collected again starts its records over
+            records = []
+        records.append(record)
+        if record["kind"] == "summary":
+            last_completed = records
+    return last_completed if completed else records
+
+
+def write_json_file(path, data):
+    '''
+    This function writes data as json to path. it is written to a temporary file
+    first and then moved into place, so path is never left half written
+    '''
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(orjson.dumps(data, default=encode))
+    os.replace(temp_path, path)
+
+
+def write_json_array(path, items):
+    '''
+    Same as write_json_file, but for a (possibly very long) iterable of items that
+    is written as a json array one item at a time instead of being built in memory
+    '''
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(b"[")
+        for index, item in enumerate(items):
+            if index:
+                f.write(b",")
+            f.write(orjson.dumps(item, default=encode))
+        f.write(b"]")
+    os.replace(temp_path, path)
@@ -0,0 +1,190 @@
+import os
+import argparse
+import multiprocessing
+from pathlib import Path
+
+import CollectionScript
+import campaign_store
+import manifest
+import metrics
+import network_profiles
+import preflight
+import url_sources
+from browser_profile import DENSE_MEMORY_PER_SESSION_MB
+from driver_pool import DriverPool
+
+# rough budget of a single chrome instance playing a video with stats for nerds on.
+# these are used to work out how many workers a host can run at the same time
+MEMORY_PER_SESSION_MB = 700
+CPUS_PER_SESSION = 1.0
+# without a store, at most this many urls per worker wait on the work queue, so a
+# source is only read as fast as the workers get through it
+QUEUE_DEPTH = 4
+
+
+def host_concurrency_limit(
+    memory_per_session_mb=None,
+    cpus_per_session=CPUS_PER_SESSION,
+    dense=CollectionScript.DENSE_MODE,
+):
+    '''
+    This function returns the number of chrome workers the current host can
+    run concurrently, i.e., the smaller of the number that fits in the CPU
+    count and the number that fits in the available memory (always at least 1).
+    the memory budget of a session defaults to the one of its launch mode
+    '''
+    if memory_per_session_mb is None:
+        memory_per_session_mb = DENSE_MEMORY_PER_SESSION_MB if dense else MEMORY_PER_SESSION_MB
+    limit = int((os.cpu_count() or 1) / cpus_per_session)
+    try:
+        # available physical memory in megabytes (not available on every platform)
+        available_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") / (1024 * 1024)
+        limit = min(limit, int(available_mb / memory_per_session_mb))
+    except (AttributeError, ValueError, OSError):
+        pass
+    return max(1, limit)
+
+
+def worker(worker_id, work_queue, output_root, network_conditions, store_path=None, metrics_port=None, feeding=None):
+    '''
+    This function is the body of a worker process. it keeps its own pool of
+    throttled chrome sessions (see driver_pool.py) and keeps collecting the urls it pulls off the shared work
+    queue until it gets the None sentinel. each worker writes to its own output
+    directory (its own faultyVideos.txt, and one directory per video unless the
+    videos are recorded into the campaign store at store_path). with a store the
+    urls are claimed from its manifest instead of the work queue, and the worker
+    waits for more of them until feeding (see CollectionScript.feed_campaign) is
+    set. its metrics are written to its output directory after every video, and
+    served on metrics_port + worker_id if a metrics port is given
+    '''
+    output_dir = Path(output_root) / ("worker_" + str(worker_id))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    metrics_file = str(output_dir / CollectionScript.METRICS_FILE)
+    if metrics_port:
+        metrics.serve(metrics_port + worker_id)
+    # every worker has its own connection, the store takes care of concurrent writers
+    store = campaign_store.connect(store_path) if store_path else None
+    pool = DriverPool(CollectionScript.create_driver, CollectionScript.forget_session, **network_conditions)
+    try:
+        if store:
+            CollectionScript.collect_campaign(pool, store, str(output_dir / "faultyVideos.txt"), metrics_file, feeding)
+            return
+        while True:
+            url = work_queue.get()
+            # None is put on the queue once for every worker when there is no more work
+            if url is None:
+                break
+            new_dir = None if store else str(output_dir / url.split("=")[1])
+            driver = pool.acquire()
+            try:
+                CollectionScript.collect_video(driver, url, new_dir, store)
+            except Exception as e:
+                pool.release(driver, failed=True)
+                CollectionScript.record_faulty_video(url, e, str(output_dir / "faultyVideos.txt"))
+            else:
+                pool.release(driver)
+            metrics.write_textfile(metrics_file)
+    finally:
+        # quitting the drivers once done (or if the worker crashed)
+        pool.close()
+        if store:
+            store.close()
+
+
+def run_campaign(list_of_urls, workers=None, output_root="./campaign", network_conditions=None, store_path=None, metrics_port=None):
+    '''
+    This function collects all the given urls using a pool of isolated chrome
+    workers, one per process. list_of_urls can be any iterable of urls, such as
+    a source of url_sources.py: it is read lazily while the workers collect, so
+    it can be far larger than memory, or never end (a watched directory). workers
+    defaults to the concurrency limit of the host. network_conditions is either a
+    single dictionary of create_driver arguments used by every worker, or a list
+    of them assigned to the workers in turn. if store_path is given every worker
+    records into that campaign store, and urls that its manifest already has (done,
+    skipped or queued) are not collected again. with a metrics_port every worker
+    serves its metrics on the port after it
+    '''
+    if not list_of_urls:
+        return
+    if network_conditions is None:
+        network_conditions = {}
+    if isinstance(network_conditions, dict):
+        network_conditions = [network_conditions]
+    if workers is None:
+        dense = any(conditions.get("dense", CollectionScript.DENSE_MODE) for conditions in network_conditions)
+        workers = host_concurrency_limit(dense=dense)
+    if isinstance(list_of_urls, (list, tuple)):
+        # no point in spawning browsers that will never get any work
+        workers = max(1, min(workers, len(list_of_urls)))
+
+    # spawn is used so every worker starts from a clean interpreter with its own
+    # copies of the globals in CollectionScript (auto_play_toggled_sessions)
+    context = multiprocessing.get_context("spawn")
+    work_queue = context.Queue(maxsize=workers * QUEUE_DEPTH)
+    feeding = None
+    if store_path:
+        # the manifest is the work queue of the workers, it is restarted before they start
+        store = campaign_store.connect(store_path)
+        manifest.prepare(store)
+        store.close()
+        feeding = context.Event()
+
+    processes = []
+    for worker_id in range(workers):
+        process = context.Process(
+            target=worker,
+            args=(
+                worker_id,
+                work_queue,
+                output_root,
+                network_conditions[worker_id % len(network_conditions)],
+                store_path,
+                metrics_port,
+                feeding,
+            ),
+        )
+        process.start()
+        processes.append(process)
+
+    if store_path:
+        CollectionScript.feed_campaign(store_path, list_of_urls, feeding)
+    else:
+        # without a store the pre-flight pass just filters the urls, and the urls
+        # are deduplicated in memory
+        for batch in url_sources.batches(url_sources.dedupe(list_of_urls), CollectionScript.FEED_BATCH):
+            skipped = preflight.check_urls(batch)
+            for url in batch:
+                if url not in skipped:
+                    # blocks while the queue is full
+                    work_queue.put(url)
+        for _ in range(workers):
+            work_queue.put(None)
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Collect a list of YouTube urls with a pool of chrome workers")
+    parser.add_argument("urls", help="file with one video url, id or json object per line, or a directory of such files")
+    parser.add_argument("--follow", action="store_true", help="keep watching the urls directory for new files until stopped")
+    parser.add_argument("--workers", type=int, default=None, help="number of chrome workers (default: host limit)")
+    parser.add_argument("--output", default="./campaign", help="directory the workers write to")
+    parser.add_argument("--store", default=None, help="campaign store to record the videos into")
+    parser.add_argument("--dense", action="store_true", help="launch headless, trimmed down browsers (see browser_profile.py)")
+    parser.add_argument("--profile-template", default=None, help="chrome profile directory every dense browser starts from a copy of")
+    parser.add_argument("--metrics-port", type=int, default=None, help="first port the workers serve their metrics on")
+    parser.add_argument("--network", choices=sorted(network_profiles.PROFILES), default=None, help="network profile of the browsers (see network_profiles.py)")
+    args = parser.parse_args()
+
+    source = url_sources.open_source(args.urls, follow=args.follow)
+    network_conditions = network_profiles.resolve(args.network) if args.network else {}
+    if args.dense:
+        network_conditions.update(dense=True, profile_template=args.profile_template)
+    run_campaign(
+        source,
+        workers=args.workers,
+        output_root=args.output,
+        network_conditions=network_conditions,
+        store_path=args.store,
+        metrics_port=args.metrics_port,
+    )
@@ -0,0 +1,97 @@
+import argparse
+import multiprocessing
+from pathlib import Path
+
+import network_profiles
+import scheduler
+import url_sources
+from sample_writer import write_json_file
+
+
+def sweep_campaign(list_of_urls, profile_name, profile, workers, output_root, store_root=None):
+    '''
+    This function is the body of one sweep process: it collects the urls under a
+    single network profile, into outputs tagged with the name of the profile
+    (<output_root>/<profile>, and <store_root>/<profile>.sqlite3 with a store).
+    list_of_urls is either a list of urls or a source spec (see
+    url_sources.open_source), which every sweep process reads by itself
+    '''
+    if isinstance(list_of_urls, str):
+        list_of_urls = url_sources.open_source(list_of_urls)
+    output_dir = Path(output_root) / profile_name
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # the conditions the outputs were collected under are kept next to them
+    write_json_file(str(output_dir / "profile.json"), {"name": profile_name, "profile": profile})
+    store_path = None
+    if store_root:
+        Path(store_root).mkdir(parents=True, exist_ok=True)
+        store_path = str(Path(store_root) / (profile_name + ".sqlite3"))
+    scheduler.run_campaign(
+        list_of_urls,
+        workers=workers,
+        output_root=str(output_dir),
+        network_conditions=profile,
+        store_path=store_path,
+    )
+
+
+def run_sweep(list_of_urls, profiles, workers=None, output_root="./sweep", store_root=None, launch_options=None):
+    '''
+    This function collects the same urls under every one of the given network
+    profiles (names of network_profiles.PROFILES or dictionaries of create_driver
+    arguments) at the same time, one scheduler campaign per profile. workers is
+    the total number of chrome workers, shared evenly by the profiles, and defaults
+    to the concurrency limit of the host. launch_options (e.g. {"dense": True}) are
+    create_driver arguments added to every profile. list_of_urls can also be a
+    source spec, as for sweep_campaign. a profile whose store already has all the
+    urls done is not collected again
+    '''
+    if isinstance(profiles, (str, dict)):
+        profiles = [profiles]
+    launch_options = launch_options or {}
+    named = {}
+    for index, profile in enumerate(profiles):
+        name = profile if isinstance(profile, str) else "profile_" + str(index)
+        named[name] = dict(network_profiles.resolve(profile), **launch_options)
+    if workers is None:
+        workers = scheduler.host_concurrency_limit(dense=launch_options.get("dense", False))
+    # every profile gets at least one worker, even if that oversubscribes the host a little
+    per_profile = max(1, workers // len(named))
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for name, profile in named.items():
+        process = context.Process(
+            target=sweep_campaign,
+            args=(list_of_urls, name, profile, per_profile, output_root, store_root),
+        )
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Collect a list of YouTube urls under several network profiles at once")
+    parser.add_argument("urls", help="file with one video url, id or json object per line, or a directory of such files")
+    parser.add_argument(
+        "--profile",
+        action="append",
+        choices=sorted(network_profiles.PROFILES),
+        help="network profile to collect under (repeat for several, default: all of them)",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="total number of chrome workers (default: host limit)")
+    parser.add_argument("--output", default="./sweep", help="directory the profiles write to")
+    parser.add_argument("--store-dir", default=None, help="directory of the campaign stores, one per profile")
+    parser.add_argument("--dense", action="store_true", help="launch headless, trimmed down browsers (see browser_profile.py)")
+    args = parser.parse_args()
+
+    # every profile streams the urls from the source itself instead of getting a copy of them
+    run_sweep(
+        args.urls,
+        args.profile or sorted(network_profiles.PROFILES),
+        workers=args.workers,
+        output_root=args.output,
+        store_root=args.store_dir,
+        launch_options={"dense": True} if args.dense else None,
+    )
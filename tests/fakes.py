@@ -0,0 +1,43 @@
+import CollectionScript
+
+
+class FakeDriver:
+    # answers every drain of the in-page sampler with the next of the given snapshots
+    def __init__(self, snapshots=()):
+        self.snapshots = list(snapshots)
+
+    def execute_script(self, script, *args):
+        if script == CollectionScript.DRAIN_SCRIPT:
+            return self.snapshots.pop(0)
+        return None
+
+
+def sample(t, ad, buffer=1.0, played=None, video_time=None, resolution="720p"):
+    # a sample of the in-page sampler taken at page timestamp t
+    return {
+        "kind": "tick", "t": t, "ad": ad, "buffer": buffer,
+        "player_time": played, "video_time": video_time, "resolution": resolution,
+    }
+
+
+def event(kind, t, video_id, player_time=0.0):
+    # an event of the ad observer
+    return {"type": kind, "t": t, "video_id": video_id, "player_time": player_time}
+
+
+def snapshot(samples=(), ad_showing=False, ad_events=(), video_id="main"):
+    return {
+        "ad_showing": ad_showing, "ad_events": list(ad_events), "player_state": 1,
+        "video_id": video_id, "skip_button": False, "skip_text": None,
+        "buffer": None, "resolution": "720p", "video_time": None, "player_time": None,
+        "drained": {"dropped": 0, "samples": list(samples)},
+    }
+
+
+def run(steps):
+    # runs a generator of the collector to completion without waiting, and returns its value
+    try:
+        while True:
+            next(steps)
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,133 @@
+import pytest
+
+pytest.importorskip("orjson")
+
+import ad_catalog
+import campaign_store
+
+
+def ad(ad_id, buffers):
+    return {
+        "name": ad_id, "ad_id": ad_id, "pre_ad_buffer": 0.0, "played": 0.0, "skippable": 1,
+        "skip_duration": 5, "buffer": [(buffer, 0.5 * index, "720p") for index, buffer in enumerate(buffers)],
+    }
+
+
+def collect(store, catalog, movie_id, ads, complete=True):
+    writer = ad_catalog.CatalogWriter(
+        campaign_store.VideoRecorder(store, movie_id), catalog, movie_id, ad_catalog.campaign_of(store)
+    )
+    writer.write("video", url="https://www.youtube.com/watch?v=" + movie_id, duration=60)
+    for record in ads:
+        writer.write("ad", **record)
+    if complete:
+        writer.write("summary", UniqueAds=len(ads), Resolution="720p")
+    else:
+        writer.write("error", type="RuntimeError", message="failed")
+    writer.writer.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = campaign_store.connect(str(tmp_path / "campaign.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = ad_catalog.connect(str(tmp_path / "catalog.sqlite3"))
+    yield catalog
+    catalog.close()
+
+
+def test_readings_come_from_the_store(store, catalog):
+    collect(store, catalog, "x", [ad("adX", [3.0, 2.0])])
+    [impression] = ad_catalog.ads_on_video(catalog, "x")
+    assert ad_catalog.readings(impression) == [[3.0, 0.0, "720p"], [2.0, 0.5, "720p"]]
+    assert impression["samples"] == 2 and impression["mean_buffer"] == 2.5
+
+
+def test_failed_retry_drops_the_impressions_of_the_earlier_attempt(store, catalog):
+    collect(store, catalog, "x", [ad("adX", [3.0, 2.0])])
+    [stale] = ad_catalog.ads_on_video(catalog, "x")
+    # the retry deletes the impressions of x from the store and fails before recording its own
+    collect(store, catalog, "x", [], complete=False)
+    # the next video gets the id the impression of x had
+    collect(store, catalog, "y", [ad("adY", [9.0])])
+    assert ad_catalog.ads_on_video(catalog, "x") == []
+    assert ad_catalog.ad_details(catalog, "adX") is None
+    assert ad_catalog.readings(stale) is None
+    [impression] = ad_catalog.ads_on_video(catalog, "y")
+    assert ad_catalog.readings(impression) == [[9.0, 0.0, "720p"]]
+
+
+def test_streams_are_read_from_their_last_completed_attempt(tmp_path, catalog):
+    from sample_writer import SampleWriter, last_attempt
+
+    root = tmp_path / "campaign"
+    (root / "x").mkdir(parents=True)
+    for readings, complete in (([1.0], True), ([2.0, 3.0], True), ([4.0], False)):
+        writer = SampleWriter(str(root / "x"))
+        writer.write("video", url="https://www.youtube.com/watch?v=x", movie_id="x", duration=60)
+        writer.write("ad", **ad("adX", readings))
+        if complete:
+            writer.write("summary", UniqueAds=1, Resolution="720p")
+        writer.close()
+    stream = str(root / "x" / "samples.ndjson")
+    assert [record["kind"] for record in last_attempt(stream)] == ["video", "ad"]
+    assert [record["buffer"] for record in last_attempt(stream, completed=True) if record["kind"] == "ad"] == [
+        [[2.0, 0.0, "720p"], [3.0, 0.5, "720p"]]
+    ]
+    assert ad_catalog.import_directory(catalog, str(root)) == 1
+    [impression] = ad_catalog.ads_on_video(catalog, "x")
+    assert impression["samples"] == 2
+    assert ad_catalog.readings(impression) == [[2.0, 0.0, "720p"], [3.0, 0.5, "720p"]]
+
+
+def stream(catalog, movie_id, records, campaign="campaign"):
+    # feeds the records of one attempt at a video through a CatalogWriter of a campaign written to files
+    writer = ad_catalog.CatalogWriter(ad_catalog.NullWriter(), catalog, movie_id, campaign)
+    writer.write("video", url="https://www.youtube.com/watch?v=" + movie_id, duration=60)
+    for kind, fields in records:
+        writer.write(kind, **fields)
+
+
+def test_impressions_are_added_once_the_video_completes(catalog):
+    stream(catalog, "x", [("ad", ad("adX", [3.0, 1.0])), ("post_ad_buffer", {"ad_id": "adX", "buffer": 7.0})])
+    assert ad_catalog.ads_on_video(catalog, "x") == []
+    stream(catalog, "x", [
+        ("ad", ad("adX", [3.0, 1.0])),
+        ("post_ad_buffer", {"ad_id": "adX", "buffer": 7.0}),
+        ("summary", {"UniqueAds": 1, "Resolution": "720p"}),
+    ])
+    [impression] = ad_catalog.ads_on_video(catalog, "x")
+    assert (impression["samples"], impression["min_buffer"], impression["max_buffer"]) == (2, 1.0, 3.0)
+    assert impression["post_ad_buffer"] == 7.0
+
+
+def test_a_failed_attempt_adds_nothing(catalog):
+    stream(catalog, "x", [("ad", ad("adX", [3.0])), ("error", {"type": "RuntimeError", "message": "failed"})])
+    assert ad_catalog.ads_on_video(catalog, "x") == []
+    assert ad_catalog.ad_details(catalog, "adX") is None
+
+
+def test_replace_video_replaces_the_earlier_attempt_and_refreshes_the_ads(catalog):
+    summary = ("summary", {"UniqueAds": 1, "Resolution": "720p"})
+    skippable = dict(ad("adX", [2.0]), skippable=1, skip_duration=5)
+    stream(catalog, "x", [("ad", skippable), ("ad", dict(skippable, name="adX_2")), ("ad", ad("adY", [1.0])), summary])
+    stream(catalog, "y", [("ad", dict(ad("adX", [4.0]), skippable=0, skip_duration=999)), summary])
+    stream(catalog, "x", [("ad", dict(ad("adX", [2.0]), skip_duration=-2)), summary], campaign="other")
+    details = ad_catalog.ad_details(catalog, "adX")
+    assert (details["impressions"], details["videos"], details["campaigns"]) == (4, 2, 2)
+    assert details["skippable"] == 1 and details["skip_duration"] == 5
+
+    # collecting x again in the first campaign replaces its impressions there, and nowhere else
+    stream(catalog, "x", [("ad", dict(ad("adX", [6.0]), skippable=0, skip_duration=999)), summary])
+    details = ad_catalog.ad_details(catalog, "adX")
+    assert (details["impressions"], details["videos"], details["campaigns"]) == (3, 2, 2)
+    assert details["skippable"] == 0 and details["skip_duration"] is None
+    assert details["mean_buffer"] == pytest.approx(4.0)
+    # an ad left without impressions is dropped
+    assert ad_catalog.ad_details(catalog, "adY") is None
+    assert [row["campaign"] for row in ad_catalog.ads_on_video(catalog, "x")] == ["other", "campaign"]
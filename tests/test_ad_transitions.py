@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("selenium")
+
+from CollectionScript import AdTransitions, PageSampler, record_ad_buffer
+from fakes import FakeDriver, event, run, sample, snapshot
+
+
+def transitions_with(*events):
+    transitions = AdTransitions(FakeDriver(), "main")
+    transitions.feed({"ad_events": list(events)})
+    return transitions
+
+
+def test_missed_ad_between_two_probes():
+    transitions = transitions_with(event("ad_start", 1000, "adA", 12.0), event("ad_end", 4000, "main"))
+    assert transitions.take_missed_ads() == [("adA", {"start_t": 1000, "end_t": 4000, "played": 12.0})]
+    assert transitions.pending == []
+
+
+def test_missed_pod_is_split_at_every_id_change():
+    transitions = transitions_with(
+        event("ad_start", 1000, "main", 12.0),
+        event("ad_id_change", 1200, "adA", 12.0),
+        event("ad_id_change", 3000, "adB", 12.0),
+        event("ad_end", 5000, "main"),
+    )
+    assert transitions.take_missed_ads() == [
+        ("adA", {"start_t": 1000, "end_t": 3000, "played": 12.0}),
+        ("adB", {"start_t": 3000, "end_t": 5000, "played": 12.0}),
+    ]
+
+
+def test_ad_still_playing_is_left_pending():
+    start = event("ad_start", 6000, "adC", 20.0)
+    transitions = transitions_with(event("ad_end", 500, "main"), event("ad_start", 1000, "adA"), event("ad_end", 2000, "main"), start)
+    assert [ad_id for ad_id, _ in transitions.take_missed_ads()] == ["adA"]
+    assert transitions.pending == [start]
+
+
+def test_ads_of_a_pod_are_recorded_one_at_a_time():
+    ad_start = event("ad_start", 1000, "adA")
+    next_ad = event("ad_id_change", 3000, "adB")
+    ad_end = event("ad_end", 5000, "main")
+    driver = FakeDriver([
+        snapshot([sample(t, True, 3.0, video_time=(t - 3000) / 1000) for t in (4000, 4500)], ad_events=[ad_end]),
+    ])
+    sampler = PageSampler(driver)
+    sampler.pending = [sample(t, True, 2.0, video_time=(t % 3000) / 1000) for t in (1000, 2000, 3000, 3500)]
+    transitions = AdTransitions(driver, "main")
+
+    first = run(record_ad_buffer(
+        driver, "main", snapshot(ad_showing=True, ad_events=[ad_start, next_ad], video_id="adA"), sampler, transitions
+    ))
+    ad_id, _, readings, _, boundaries = first
+    assert ad_id == "adA"
+    assert [played for _, played, _ in readings] == [1.0, 2.0]
+    assert (boundaries["start_t"], boundaries["end_t"]) == (1000, 3000)
+    # the event starting the next ad is left for the next call
+    assert transitions.pending == [next_ad]
+
+    ad_id, _, readings, _, boundaries = run(record_ad_buffer(
+        driver, "main", snapshot(ad_showing=True, video_id="adB"), sampler, transitions
+    ))
+    assert ad_id == "adB"
+    assert [played for _, played, _ in readings] == [0.0, 0.5, 1.0, 1.5]
+    assert (boundaries["start_t"], boundaries["end_t"]) == (3000, 5000)
+    assert transitions.pending == []
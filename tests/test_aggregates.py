@@ -0,0 +1,46 @@
+import pytest
+
+from aggregates import ReadingTrace, RunningMode
+
+
+@pytest.mark.parametrize("values", [
+    ["480p", "720p"],
+    ["720p", "480p", "480p", "720p"],
+    ["1080p", "720p", "720p", "1080p", "360p", "360p"],
+    ["a", "b", "b", "a", "a", "b", "c"],
+])
+def test_running_mode_ties_go_to_the_value_seen_first(values):
+    mode = RunningMode()
+    for index, value in enumerate(values):
+        mode.add(value)
+        seen = values[:index + 1]
+        assert mode.mode == max(seen, key=seen.count)
+        assert mode.mode_count == seen.count(mode.mode)
+    assert mode.total == len(values)
+
+
+def test_running_mode_is_empty_at_first():
+    mode = RunningMode()
+    assert mode.mode is None
+    assert mode.mode_count == 0
+
+
+def test_reading_trace_gives_back_the_readings_it_was_given():
+    readings = [(5.5, 0.0, "720p"), (4.0, None, "720p"), (3.25, 1.5, None), (2.0, 2.0, "480p")]
+    trace = ReadingTrace(readings[:1])
+    trace.extend(readings[1:3])
+    trace.append(readings[3])
+    assert len(trace) == 4
+    assert list(trace) == readings
+    assert trace.resolutions == [None, "720p", "480p"]
+    assert list(trace.res) == [1, 1, 0, 2]
+
+
+def test_reading_trace_is_encoded_as_a_list():
+    orjson = pytest.importorskip("orjson")
+    from sample_writer import encode
+
+    trace = ReadingTrace([(1.0, 0.5, "720p"), (2.0, None, None)])
+    assert trace.to_json() == [[1.0, 0.5, "720p"], [2.0, None, None]]
+    assert orjson.loads(orjson.dumps({"buffer": trace}, default=encode)) == {"buffer": trace.to_json()}
+    assert ReadingTrace().to_json() == []
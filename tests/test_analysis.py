@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("orjson")
+
+import analysis
+import campaign_store
+
+
+def record_video(connection, movie_id, buffers, events, ads=(), finish=True):
+    recorder = campaign_store.VideoRecorder(connection, movie_id)
+    recorder.write("video", url="https://www.youtube.com/watch?v=" + movie_id, duration=60)
+    for played, buffer, res in buffers:
+        recorder.write("buffer", played=played, buffer=buffer, res=res, ratio=None)
+    for ad in ads:
+        recorder.write("ad", **ad)
+        recorder.write("post_ad_buffer", ad_id=ad["ad_id"], buffer=1.0)
+    for name, t in events:
+        recorder.write("event", event=name, t=t)
+    if finish:
+        recorder.write("summary", UniqueAds=len(ads), Resolution=buffers[0][2])
+    recorder.close()
+
+
+@pytest.fixture
+def campaign(tmp_path):
+    path = str(tmp_path / "campaign.sqlite3")
+    connection = campaign_store.connect(path)
+    record_video(
+        connection,
+        "b",
+        [(0.0, 5.0, "720p"), (1.0, 0.2, "720p"), (2.0, 0.1, "480p"), (4.0, 3.0, "480p"), (5.0, 0.3, "720p")],
+        [("waiting", 1000), ("playing", 3500), ("waiting", 6000)],
+        ads=[{
+            "ad_id": "ad1", "name": "ad", "skippable": True, "skip_duration": 5,
+            "pre_ad_buffer": [2.0, 1.5], "played": 1.5,
+            "buffer": [(2.0, 0.0, "720p"), (1.0, 4.0, "720p")],
+        }],
+    )
+    record_video(connection, "a", [(0.0, 1.0, "1080p")], [])
+    # a video that is not done is left out
+    record_video(connection, "c", [(0.0, 1.0, "1080p")], [("waiting", 0)], finish=False)
+    connection.close()
+    return analysis.load_campaign(path)
+
+
+def test_load_campaign_keeps_finished_videos_only(campaign):
+    assert list(campaign["movie_ids"]) == ["a", "b"]
+    assert list(campaign["sample_video"]) == [0, 1, 1, 1, 1, 1]
+    assert list(campaign["res_labels"]) == ["1080p", "480p", "720p"]
+    assert list(campaign["ad_video"]) == [1]
+    assert list(campaign["ad_pre_buffer"]) == [2.0]
+
+
+def test_video_metrics(campaign):
+    metrics = analysis.video_metrics(campaign)
+    assert list(metrics["samples"]) == [1, 5]
+    assert metrics["mean_buffer"] == pytest.approx([1.0, 8.6 / 5])
+    assert list(metrics["resolution_switches"]) == [0, 2]
+    # seconds played at 1080p, 480p and 720p
+    assert metrics["time_at_resolution"].tolist() == [[0.0, 0.0, 0.0], [0.0, 3.0, 2.0]]
+    assert list(metrics["low_buffer_runs"]) == [0, 2]
+    assert list(metrics["stalls"]) == [0, 2]
+    assert metrics["stall_seconds"] == pytest.approx([0.0, 2.5])
+    assert list(metrics["ads"]) == [0, 1]
+    # the ad was shown between the readings at 1 and 2 seconds played
+    assert np.isnan(metrics["mean_ad_buffer_delta"][0])
+    assert metrics["mean_ad_buffer_delta"][1] == pytest.approx(0.1 - 0.2)
+    # the buffer went from 2 seconds before the ad to 1 after it, over the 4 seconds of the ad
+    assert metrics["mean_ad_drain_rate"][1] == pytest.approx(0.25)
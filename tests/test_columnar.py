@@ -0,0 +1,37 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("orjson")
+
+import columnar
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_columns_round_trip(tmp_path, mmap):
+    readings = [(5.5, 0.0, "1280x720@30"), (4.25, None, None), (3.0, 2.0, "640x360@30")]
+    ads = {
+        "adA": {"buffer": [(1.0, 0.0, "640x360@30"), (2.0, 0.5, "640x360@30")]},
+        "adA_2": {"buffer": []},
+        "adB": {"buffer": [(3.0, 0.0, "1280x720@30")]},
+    }
+    columnar.write_video_columns(str(tmp_path), iter(readings), ads)
+    columns = columnar.load_video_columns(str(tmp_path), mmap=mmap)
+
+    assert columns["resolutions"] == [None, "1280x720@30", "640x360@30"]
+    assert columns["ads"] == ["adA", "adA_2", "adB"]
+    assert columns["buffer"].dtype == np.float32 and columns["res"].dtype == np.uint16
+    assert columns["buffer"].tolist() == [5.5, 4.25, 3.0]
+    assert columns["played"][[0, 2]].tolist() == [0.0, 2.0] and np.isnan(columns["played"][1])
+    assert [columns["resolutions"][code] for code in columns["res"]] == ["1280x720@30", None, "640x360@30"]
+
+    buffer, played, res = columnar.ad_trace(columns, "adA")
+    assert buffer.tolist() == [1.0, 2.0] and played.tolist() == [0.0, 0.5] and res.tolist() == [2, 2]
+    assert len(columnar.ad_trace(columns, "adA_2")[0]) == 0
+    assert columnar.ad_trace(columns, "adB")[0].tolist() == [3.0]
+
+
+def test_video_without_ads(tmp_path):
+    columnar.write_video_columns(str(tmp_path), [(1.0, 0.0, "1280x720@30")], {})
+    columns = columnar.load_video_columns(str(tmp_path))
+    assert columns["ads"] == [] and len(columns["ad_buffer"]) == 0
+    assert columns["buffer"].tolist() == [1.0]
@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+import manifest
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    manifest.prepare(connection, ["a", "b"])
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # manifest reads the time through time.time only
+    now = [1000.0]
+    monkeypatch.setattr(manifest.time, "time", lambda: now[0])
+    return now
+
+
+def state_of(connection, url):
+    return connection.execute(
+        "SELECT state, retries, next_attempt_at FROM manifest WHERE url = ?", (url,)
+    ).fetchone()
+
+
+def test_claim_marks_urls_in_progress_once(connection):
+    assert manifest.claim(connection) in ("a", "b")
+    assert manifest.claim(connection) in ("a", "b")
+    assert manifest.claim(connection) is None
+    assert state_of(connection, "a")[0] == "in_progress"
+    assert state_of(connection, "b")[0] == "in_progress"
+
+
+def test_prepare_puts_in_progress_urls_back_and_keeps_the_rest(connection):
+    url = manifest.claim(connection)
+    manifest.finish(connection, url)
+    manifest.claim(connection)
+    manifest.prepare(connection, ["a", "b", "c"])
+    assert state_of(connection, url)[0] == "done"
+    assert manifest.known(connection, ["a", "c", "d"]) == {"a", "c"}
+    assert sorted(manifest.claim(connection) for _ in range(2)) == sorted({"a", "b", "c"} - {url})
+
+
+def test_fail_backs_off_exponentially(connection, clock):
+    manifest.finish(connection, "b")
+    for retries in range(1, manifest.MAX_RETRIES + 1):
+        assert manifest.claim(connection) == "a"
+        manifest.fail(connection, "a", "timeout")
+        backoff = manifest.RETRY_BACKOFF * (1 << (retries - 1))
+        assert state_of(connection, "a") == ("failed", retries, clock[0] + backoff)
+        assert manifest.seconds_until_retry(connection) == backoff
+        # not claimable until its backoff has passed
+        clock[0] += backoff - 1
+        assert manifest.claim(connection) is None
+        clock[0] += 1
+
+
+def test_fail_gives_up_after_max_retries(connection, clock):
+    manifest.finish(connection, "b")
+    for _ in range(manifest.MAX_RETRIES + 1):
+        assert manifest.claim(connection) == "a"
+        manifest.fail(connection, "a", "timeout")
+        clock[0] += manifest.RETRY_BACKOFF * (1 << manifest.MAX_RETRIES)
+    assert manifest.claim(connection) is None
+    assert manifest.seconds_until_retry(connection) is None
+
+
+def test_pending_urls_come_before_failed_ones(connection, clock):
+    assert manifest.claim(connection) == "a"
+    manifest.fail(connection, "a", "timeout")
+    clock[0] += manifest.RETRY_BACKOFF
+    manifest.add(connection, ["c"])
+    assert manifest.claim(connection) == "b"
+    assert manifest.claim(connection) == "c"
+    assert manifest.claim(connection) == "a"
+
+
+def test_add_puts_skipped_urls_straight_in_as_skipped(connection):
+    manifest.add(connection, ["c", "d"], {"d": "too long"})
+    assert connection.execute("SELECT state, reason FROM manifest WHERE url = 'd'").fetchone() == ("skipped", "too long")
+    assert sorted(manifest.claim(connection) for _ in range(3)) == ["a", "b", "c"]
+    assert manifest.claim(connection) is None
@@ -0,0 +1,66 @@
+import pytest
+
+import network_profiles
+
+
+class FakeDriver:
+    # keeps the conditions set on it, along with the time they were set at
+    def __init__(self, clock, session_id="session"):
+        self.clock = clock
+        self.session_id = session_id
+        self.applied = []
+
+    def set_network_conditions(self, **conditions):
+        self.applied.append((self.clock[0], conditions["latency"]))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(network_profiles.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(network_profiles, "session_conditions", {})
+    return now
+
+
+def video_steps(waits, result="done"):
+    for wait in waits:
+        yield wait
+    return result
+
+
+def run(steps, clock):
+    # waits out every wait by moving the clock on, and returns the waits and the result
+    waits = []
+    try:
+        while True:
+            wait = next(steps)
+            waits.append(wait)
+            clock[0] += wait
+    except StopIteration as stop:
+        return waits, stop.value
+
+
+def test_waits_are_split_at_the_steps_of_the_trace(clock, monkeypatch):
+    driver = FakeDriver(clock)
+    trace = network_profiles.NetworkTrace([(45, 300, 0.25, 0.05), (0, 5, 9, 9), (30, 150, 1.6, 0.75)])
+    monkeypatch.setitem(network_profiles.session_traces, driver.session_id, trace)
+    waits, result = run(network_profiles.shape_steps(driver, video_steps([10, 50, 40])), clock)
+    assert result == "done"
+    assert waits == [10, 20, 15, 15, 40]
+    assert driver.applied == [(0.0, 5), (30.0, 150), (45.0, 300)]
+    assert network_profiles.download_limit(driver, 9) == 0.25
+
+
+def test_trace_starts_over_with_every_video(clock, monkeypatch):
+    driver = FakeDriver(clock)
+    trace = network_profiles.NetworkTrace([(0, 5, 9, 9), (30, 150, 1.6, 0.75)])
+    monkeypatch.setitem(network_profiles.session_traces, driver.session_id, trace)
+    run(network_profiles.shape_steps(driver, video_steps([40])), clock)
+    run(network_profiles.shape_steps(driver, video_steps([10])), clock)
+    assert [latency for _, latency in driver.applied] == [5, 150, 5]
+
+
+def test_sessions_without_a_trace_are_left_alone(clock):
+    driver = FakeDriver(clock, "untraced")
+    assert run(network_profiles.shape_steps(driver, video_steps([10, 50])), clock) == ([10, 50], "done")
+    assert driver.applied == []
@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("selenium")
+
+from CollectionScript import AdTransitions, PageSampler, record_ad_buffer
+from fakes import FakeDriver, event, run, sample, snapshot
+
+
+def drained(samples):
+    sampler = PageSampler(FakeDriver([snapshot(samples)]))
+    sampler.snapshot()
+    return sampler
+
+
+def test_take_hands_out_leading_runs_in_order():
+    sampler = drained([sample(0, False), sample(1, False), sample(2, True), sample(3, False)])
+    assert [s["t"] for s in sampler.take(ad=True)] == []
+    assert [s["t"] for s in sampler.take(ad=False)] == [0, 1]
+    assert [s["t"] for s in sampler.take(ad=True)] == [2]
+    assert [s["t"] for s in sampler.take(ad=False)] == [3]
+
+
+def test_main_readings_skip_orphaned_ad_samples_once_no_ad_is_showing():
+    samples = [sample(0, False, 3.0, 1.0), sample(1, True, 2.0), sample(2, False, None, 2.0), sample(3, False, 4.0, 3.0)]
+    sampler = drained(samples)
+    assert sampler.take_main_readings(ad_playing=True) == [(3.0, 1.0, "720p")]
+    assert sampler.take_main_readings(ad_playing=False) == [(4.0, 3.0, "720p")]
+    assert sampler.orphaned == 1
+    assert sampler.pending == []
+
+
+def test_ad_readings_stop_at_the_next_ad_of_a_pod():
+    sampler = drained([sample(t, True, video_time=t / 1000) for t in (0, 500, 1000, 1500)])
+    assert [played for _, played, _ in sampler.take_ad_readings(until=1000)] == [0.0, 0.5]
+    assert [played for _, played, _ in sampler.take_ad_readings()] == [1.0, 1.5]
+
+
+def test_ad_readings_drop_main_samples_taken_before_the_ad():
+    sampler = drained([sample(0, False), sample(500, False), sample(1000, True, video_time=0.0)])
+    # without the start of the ad the page-load samples stand in front of it
+    assert sampler.take_ad_readings() == []
+    assert sampler.take_ad_readings(since=1000) == [(1.0, 0.0, "720p")]
+
+
+def test_pre_roll_ad_keeps_its_readings():
+    # the sampler is installed before playback, so the page load is sampled before the pre-roll starts
+    page_load = [sample(t, False, buffer=None) for t in (0, 250, 500, 750)]
+    ad_start = event("ad_start", 1000, "adA")
+    ad_end = event("ad_end", 2500, "main")
+    driver = FakeDriver([
+        snapshot([sample(t, True, 2.0, video_time=(t - 1000) / 1000) for t in (1750, 2000, 2250)], ad_events=[ad_end]),
+    ])
+    sampler = PageSampler(driver)
+    sampler.pending = page_load + [sample(t, True, 1.0, video_time=(t - 1000) / 1000) for t in (1000, 1250, 1500)]
+    transitions = AdTransitions(driver, "main")
+    ad_id, _, readings, _, boundaries = run(record_ad_buffer(
+        driver, "main", snapshot(ad_showing=True, ad_events=[ad_start], video_id="adA"), sampler, transitions
+    ))
+    assert ad_id == "adA"
+    assert [played for _, played, _ in readings] == [0.0, 0.25, 0.5, 0.75, 1.0, 1.25]
+    assert boundaries["start_t"] == 1000 and boundaries["end_t"] == 2500
+    # the page-load samples are not counted as orphaned ad samples afterwards
+    assert sampler.take_main_readings(ad_playing=False) == []
+    assert sampler.orphaned == 0
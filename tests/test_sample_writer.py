@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("orjson")
+
+from sample_writer import SampleWriter, read_records
+
+
+def attempt(new_dir, buffers):
+    writer = SampleWriter(str(new_dir))
+    writer.write("video", movie_id="x", duration=60)
+    for buffer in buffers:
+        writer.write("buffer", buffer=buffer, played=0.0)
+    writer.close()
+    return writer
+
+
+def test_a_new_attempt_starts_after_the_earlier_ones(tmp_path):
+    first = attempt(tmp_path, [1.0, 2.0])
+    second = attempt(tmp_path, [3.0])
+    assert first.start == 0 and second.start > 0
+    assert [r["buffer"] for r in read_records(second.path, "buffer")] == [1.0, 2.0, 3.0]
+    assert [r["buffer"] for r in read_records(second.path, "buffer", second.start)] == [3.0]
+
+
+def test_a_line_cut_short_by_a_crash_is_closed_off(tmp_path):
+    first = attempt(tmp_path, [1.0])
+    with open(first.path, "ab") as f:
+        f.write(b'{"kind":"buffer","buf')
+    second = attempt(tmp_path, [2.0])
+    # the partial line is skipped, and does not swallow the first record of the new attempt
+    assert [r["kind"] for r in read_records(second.path)] == ["video", "buffer", "video", "buffer"]
+    assert [r["kind"] for r in read_records(second.path, start=second.start)] == ["video", "buffer"]
+
+
+def test_records_are_flushed_every_few_writes(tmp_path):
+    writer = SampleWriter(str(tmp_path), flush_every=2, fsync_interval=3600)
+    writer.write("buffer", buffer=1.0, played=0.0)
+    assert list(read_records(writer.path)) == []
+    writer.write("buffer", buffer=2.0, played=1.0)
+    assert [r["buffer"] for r in read_records(writer.path)] == [1.0, 2.0]
+    writer.close()
@@ -0,0 +1,43 @@
+import pytest
+
+import url_sources
+
+URL = url_sources.WATCH_URL + "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("entry", [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://m.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=42",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?si=AbCdEfGh",
+    "youtu.be/dQw4w9WgXcQ?t=42",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ?start=3",
+    "  dQw4w9WgXcQ\n",
+    {"url": "https://youtu.be/dQw4w9WgXcQ/"},
+    {"movie_id": "dQw4w9WgXcQ"},
+    {"id": "dQw4w9WgXcQ"},
+])
+def test_to_url_gives_the_same_url_for_every_entry_of_a_video(entry):
+    assert url_sources.to_url(entry) == URL
+
+
+@pytest.mark.parametrize("entry", [
+    "", "   ", "# a comment", None, {}, {"title": "x"},
+    "https://www.youtube.com/watch?feature=share",
+    "https://www.youtube.com/watch?v=",
+])
+def test_to_url_rejects_entries_without_a_video(entry):
+    assert url_sources.to_url(entry) is None
+
+
+def test_parse_line_reads_json_objects():
+    assert url_sources.parse_line('{"movie_id": "dQw4w9WgXcQ"}\n') == URL
+    assert url_sources.parse_line("{not json\n") is None
+
+
+def test_dedupe_by_movie_id():
+    urls = [url_sources.to_url(entry) for entry in ("https://m.youtube.com/watch?v=a", "a", "b")]
+    seen = set()
+    assert list(url_sources.dedupe(urls, seen)) == [url_sources.WATCH_URL + "a", url_sources.WATCH_URL + "b"]
+    assert list(url_sources.dedupe([url_sources.WATCH_URL + "b"], seen)) == []
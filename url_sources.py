@@ -0,0 +1,151 @@
+import os
+import glob
+import time
+from urllib.parse import urlparse, parse_qs
+
+import orjson
+
+# urls are rebuilt from bare video ids with this prefix
+WATCH_URL = "https://www.youtube.com/watch?v="
+# seconds between two looks at a watched directory for new files (or new lines)
+POLL_INTERVAL = 5.0
+# files of a watched directory that are read
+WATCH_PATTERNS = ("*.txt", "*.jsonl")
+
+
+def movie_id_of(entry):
+    '''
+    This function returns the video id of an entry: the v parameter of a watch
+    url (wherever it is in the query), the last part of the path of any other
+    url (youtu.be/<id>?si=..., /embed/<id>?start=3), or the entry itself for a
+    bare id. a watch url without a v parameter has no id
+    '''
+    parsed = urlparse(entry)
+    ids = parse_qs(parsed.query).get("v")
+    if ids and ids[0].strip():
+        return ids[0].strip()
+    if parsed.scheme or "/" in entry or parsed.query:
+        movie_id = parsed.path.rstrip("/").split("/")[-1]
+        return movie_id if movie_id and movie_id != "watch" else None
+    return entry
+
+
+def to_url(entry):
+    '''
+    This function turns one entry of a source into a watch url. an entry is
+    either a url, a bare video id, or (in jsonl files) an object with a "url"
+    or a "movie_id" / "id". every entry of the same video gives the same url
+    (WATCH_URL + its id), whatever its host or its other parameters. returns
+    None for an entry that is neither
+    '''
+    if isinstance(entry, dict):
+        entry = entry.get("url") or entry.get("movie_id") or entry.get("id")
+    if not entry:
+        return None
+    entry = str(entry).strip()
+    if not entry or entry.startswith("#"):
+        return None
+    movie_id = movie_id_of(entry)
+    if not movie_id:
+        return None
+    return WATCH_URL + movie_id
+
+
+def parse_line(line):
+    # a line of a newline-separated file, or of a jsonl file
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            return to_url(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            return None
+    return to_url(line)
+
+
+def file_source(path):
+    # yields the urls of a file (one url, video id or json object per line) one at a time.
+    # a named pipe works too: its urls are read as they are written to it
+    with open(path) as f:
+        for line in f:
+            url = parse_line(line)
+            if url is not None:
+                yield url
+
+
+def directory_source(path, poll_interval=POLL_INTERVAL, follow=True):
+    '''
+    This function yields the urls of every file in a directory, and keeps watching
+    it for new files and for lines appended to the files it has already read. only
+    complete lines are read, so a file that is still being written is picked up
+    where it was left. with follow off it stops once every file has been read
+    '''
+    # how far every file has been read, in bytes
+    offsets = {}
+    while True:
+        found = False
+        paths = sorted(
+            {name for pattern in WATCH_PATTERNS for name in glob.glob(os.path.join(path, pattern))},
+            key=os.path.getmtime,
+        )
+        for name in paths:
+            with open(name, "rb") as f:
+                f.seek(offsets.get(name, 0))
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # the rest of this line has not been written yet
+                        break
+                    offsets[name] = offsets.get(name, 0) + len(line)
+                    url = parse_line(line.decode("utf-8", errors="replace"))
+                    if url is not None:
+                        found = True
+                        yield url
+        if not follow:
+            return
+        if not found:
+            time.sleep(poll_interval)
+
+
+def queue_source(queue):
+    # yields the entries put on a local queue (queue.Queue or multiprocessing) until it gets None
+    while True:
+        entry = queue.get()
+        if entry is None:
+            return
+        url = to_url(entry)
+        if url is not None:
+            yield url
+
+
+def open_source(spec, follow=False):
+    # a directory is watched (if follow is on), anything else is read as a file of urls
+    if os.path.isdir(spec):
+        return directory_source(spec, follow=follow)
+    return file_source(spec)
+
+
+def dedupe(urls, seen=None):
+    '''
+    This function yields the urls whose movie_id it has not seen before. seen can
+    be a set shared by several calls. campaigns with a store are deduplicated by
+    its manifest instead (see CollectionScript.prepare_campaign), which does not
+    have to keep every movie_id in memory
+    '''
+    if seen is None:
+        seen = set()
+    for url in urls:
+        movie_id = movie_id_of(url)
+        if movie_id not in seen:
+            seen.add(movie_id)
+            yield url
+
+
+def batches(urls, size):
+    # groups an iterable of urls into lists of at most size urls
+    batch = []
+    for url in urls:
+        batch.append(url)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
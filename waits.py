@@ -0,0 +1,83 @@
+import time
+
+# longest a single wait call keeps chromedriver busy, in seconds. a wait is split into
+# slices of this length so that collect_video_steps can yield to its caller in between
+WAIT_SLICE = 0.5
+
+# this JS snippet (run with execute_async_script) resolves as soon as the named
+# condition holds, or with false after arguments[1] milliseconds. instead of polling
+# it re-checks the condition whenever the DOM changes (a MutationObserver on the whole
+# document, which sees the player's class list toggling "ad-showing", "playing-mode"
+# etc.) and whenever the video element fires a media event. arguments[2] is the xpath
+# of the "element" condition
+WAIT_SCRIPT = """
+var condition = arguments[0];
+var timeoutMs = arguments[1];
+var xpath = arguments[2];
+var done = arguments[arguments.length - 1];
+var conditions = {
+    element: function () {
+        return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null;
+    },
+    player_ready: function () {
+        var player = document.getElementById('movie_player');
+        return !!(player && typeof player.getPlayerState === 'function' && player.getPlayerState() !== undefined);
+    },
+    ad_showing: function () {
+        return document.getElementsByClassName('ad-showing').length > 0;
+    },
+    ad_or_playing: function () {
+        if (document.getElementsByClassName('ad-showing').length > 0) { return true; }
+        var player = document.getElementById('movie_player');
+        return player.getPlayerState() === 1 && player.getCurrentTime() > 0;
+    },
+    video_time: function () {
+        var video = document.getElementsByClassName('video-stream html5-main-video')[0];
+        return !!video && !isNaN(video.currentTime);
+    }
+};
+var check = function () {
+    try { return conditions[condition](); } catch (e) { return false; }
+};
+if (check()) { done(true); return; }
+var finished = false;
+var observer = null;
+var events = ['playing', 'timeupdate', 'loadedmetadata', 'play'];
+var finish = function (result) {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    events.forEach(function (name) { document.removeEventListener(name, onChange, true); });
+    done(result);
+};
+var onChange = function () { if (check()) { finish(true); } };
+observer = new MutationObserver(onChange);
+observer.observe(document, {attributes: true, childList: true, subtree: true});
+events.forEach(function (name) { document.addEventListener(name, onChange, true); });
+setTimeout(function () { finish(check()); }, timeoutMs);
+"""
+
+
+def wait_for(driver, condition, timeout, xpath=None):
+    '''
+    This function waits until the named condition of WAIT_SCRIPT holds in the page,
+    for at most timeout seconds, and returns whether it does. it is a generator
+    (used with "yield from" inside collect_video_steps) that yields 0 between the
+    slices of the wait, so the page is never polled in a tight loop and an async
+    caller gets control back at least every WAIT_SLICE seconds
+    '''
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if driver.execute_async_script(
+            WAIT_SCRIPT, condition, int(min(remaining, WAIT_SLICE) * 1000), xpath
+        ):
+            return True
+        yield 0
+
+
+def wait_for_element(driver, xpath, timeout):
+    # waits until an element matching the xpath is in the page
+    return (yield from wait_for(driver, "element", timeout, xpath))